@@ -115,7 +115,7 @@ setup(
         'pip_pkg': InstallCommandBase,
     },
     install_requires=[
-        'tensorflow_hub>=0.2',
+        'tensorflow_hub>=0.7',
         'tensorflow_probability>=0.7',
     ],
     extras_require={
@@ -28,7 +28,6 @@ from six.moves import xrange  # pylint: disable=redefined-builtin
 
 import tensorflow as tf
 import tensorflow_gan as tfgan
-import tensorflow_hub as tfhub
 import tensorflow_probability as tfp
 
 ds = tfp.distributions
@@ -59,7 +58,7 @@ def mnist_score(images, num_batches=1):
     The classifier score, a floating-point scalar.
   """
   images.shape.assert_is_compatible_with([None, 28, 28, 1])
-  mnist_classifier_fn = tfhub.load(MNIST_MODULE)
+  mnist_classifier_fn = tfgan.eval.load_tfhub_module(MNIST_MODULE)
   score = tfgan.eval.classifier_score(images, mnist_classifier_fn, num_batches)
   score.shape.assert_is_compatible_with([])
 
@@ -84,7 +83,7 @@ def mnist_frechet_distance(real_images, generated_images, num_batches=1):
   """
   real_images.shape.assert_is_compatible_with([None, 28, 28, 1])
   generated_images.shape.assert_is_compatible_with([None, 28, 28, 1])
-  mnist_classifier_fn = tfhub.load(MNIST_MODULE)
+  mnist_classifier_fn = tfgan.eval.load_tfhub_module(MNIST_MODULE)
   frechet_distance = tfgan.eval.frechet_classifier_distance(
       real_images, generated_images, mnist_classifier_fn, num_batches)
   frechet_distance.shape.assert_is_compatible_with([])
@@ -104,7 +103,7 @@ def mnist_cross_entropy(images, one_hot_labels):
   Returns:
     A scalar Tensor representing the cross entropy of the image minibatch.
   """
-  logits = tfhub.load(MNIST_MODULE)(images)
+  logits = tfgan.eval.load_tfhub_module(MNIST_MODULE)(images)
   return tf.compat.v1.losses.softmax_cross_entropy(
       one_hot_labels, logits, loss_collection=None)
 
@@ -591,3 +591,90 @@ def train(model, **kwargs):
       scaffold=scaffold,
       save_checkpoint_secs=600,
       save_summaries_steps=(kwargs['save_summaries_num_images']))
+
+
+def compute_sliced_wasserstein_distance(model, **kwargs):
+  """Computes the sliced Wasserstein distance of the last checkpoint of a stage.
+
+  Real and fake images (from the EMA smoothed generator) are drawn a batch at a
+  time, and the patches of each Laplacian level are kept in a fixed-size
+  reservoir. The distances are computed from the reservoirs at the end, so the
+  number of images is not limited by the batch size or by memory.
+
+  Args:
+    model: An model object having all information of progressive GAN model, e.g.
+      the return of build_model().
+    **kwargs: A dictionary of
+        'train_log_dir': A string of root directory of training logs.
+        'master': Name of the TensorFlow master to use.
+        'latent_vector_size': An integer of latent vector size.
+        'swd_num_images': The number of real and fake images to sample.
+        'swd_patches_per_image': The number of patches per image per level.
+        'swd_reservoir_size': The number of patches kept per level.
+        'swd_spill_dir': If not empty, a local directory in which the
+          reservoirs are memory-mapped.
+
+  Returns:
+    A list of the distances between real and fake patches for each level of the
+    Laplacian pyramid, from the highest resolution to the lowest.
+  """
+  num_images = kwargs['swd_num_images']
+  patches_per_image = kwargs['swd_patches_per_image']
+  reservoir_size = kwargs['swd_reservoir_size']
+  spill_dir = kwargs['swd_spill_dir']
+  logdir = make_train_sub_dir(model.stage_id, **kwargs)
+
+  with tf.compat.v1.variable_scope(
+      model.gan_model.generator_scope,
+      reuse=True,
+      custom_getter=make_var_scope_custom_getter_for_ema(model.generator_ema)):
+    fake_images = model.gan_model.generator_fn(
+        make_latent_vectors(model.batch_size, **kwargs))
+  fake_images.set_shape(model.gan_model.real_data.shape)
+  real_patches = tfgan.eval.sliced_wasserstein_patches(
+      model.gan_model.real_data, patches_per_image=patches_per_image)
+  fake_patches = tfgan.eval.sliced_wasserstein_patches(
+      fake_images, patches_per_image=patches_per_image)
+
+  def _make_reservoir(name, level):
+    spill_path = None
+    if spill_dir:
+      spill_path = os.path.join(
+          spill_dir, 'swd_stage_{:05d}_{}_level_{}.npy'.format(
+              model.stage_id, name, level))
+    return tfgan.eval.PatchReservoir(
+        reservoir_size, 7 * 7 * model.gan_model.real_data.shape[-1],
+        spill_path=spill_path)
+
+  real_reservoirs = [
+      _make_reservoir('real', i) for i in range(len(real_patches))]
+  fake_reservoirs = [
+      _make_reservoir('fake', i) for i in range(len(fake_patches))]
+
+  saver = tf.compat.v1.train.Saver()
+  with tf.compat.v1.Session(kwargs['master']) as sess:
+    saver.restore(sess, tf.train.latest_checkpoint(logdir))
+    current_image_id = sess.run(model.current_image_id)
+    for _ in range(-(-num_images // model.batch_size)):
+      real_values, fake_values = sess.run([real_patches, fake_patches])
+      for reservoir, patches in zip(real_reservoirs + fake_reservoirs,
+                                    real_values + fake_values):
+        reservoir.update(patches)
+
+  distances = [
+      tfgan.eval.sliced_wasserstein_distance_from_samples(
+          real.samples, fake.samples)
+      for real, fake in zip(real_reservoirs, fake_reservoirs)
+  ]
+  logging.info('stage_id=%d, sliced Wasserstein distance per level: %s',
+               model.stage_id, distances)
+
+  writer = tf.compat.v1.summary.FileWriter(logdir)
+  writer.add_summary(
+      tf.compat.v1.Summary(value=[
+          tf.compat.v1.Summary.Value(
+              tag='sliced_wasserstein/level_{}'.format(i), simple_value=d)
+          for i, d in enumerate(distances)
+      ]), current_image_id)
+  writer.close()
+  return distances
@@ -117,6 +117,26 @@ flags.DEFINE_integer(
     'The Task ID. This value is used when training with multiple workers to '
     'identify each worker.')
 
+flags.DEFINE_integer(
+    'swd_num_images', 0,
+    'If positive, compute the sliced Wasserstein distance over this many real '
+    'and fake images at the end of each stage. Use 8192 to compare with the '
+    'paper.')
+
+flags.DEFINE_integer('swd_patches_per_image', 64,
+                     'Number of patches per image per Laplacian level for '
+                     'the sliced Wasserstein distance.')
+
+flags.DEFINE_integer(
+    'swd_reservoir_size', 8192 * 64,
+    'Number of patches per Laplacian level kept in memory (or in '
+    '--swd_spill_dir) for the sliced Wasserstein distance.')
+
+flags.DEFINE_string(
+    'swd_spill_dir', '',
+    'If set, a local directory in which the sliced Wasserstein patch '
+    'reservoirs are memory-mapped instead of held in memory.')
+
 FLAGS = flags.FLAGS
 
 
@@ -166,6 +186,8 @@ def main(_):
       model = train.build_model(stage_id, batch_size, real_images, **config)
       train.add_model_summaries(model, **config)
       train.train(model, **config)
+      if FLAGS.swd_num_images > 0:
+        train.compute_sliced_wasserstein_distance(model, **config)
 
 
 if __name__ == '__main__':
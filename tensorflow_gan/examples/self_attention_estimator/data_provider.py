@@ -20,8 +20,12 @@ from __future__ import division
 from __future__ import print_function
 
 import functools
+import json
+import os
+import uuid
 
 from absl import flags
+import numpy as np
 import tensorflow as tf  # tf
 import tensorflow_datasets as tfds
 
@@ -29,13 +33,21 @@ from tensorflow_gan.examples import compat_utils
 
 import pdb
 
+_METADATA_FILE = 'metadata.json'
+_CLASS_DIR = 'by_class'
+_CLASS_INDEX_FILE = 'index.json'
+
+# Materialised uint8 images and int32 labels, by (dataset, split, image size).
+_in_memory_splits = {}
+
 def allowed_labels_predicate(x, allowed_labels=tf.constant([0, 1])):
     label = x['label']
     isallowed = tf.equal(allowed_labels, tf.cast(label, tf.int32))
     reduced = tf.reduce_sum(tf.cast(isallowed, tf.float32))
     return tf.greater(reduced, tf.constant(0.))
 
-def provide_dataset(batch_size, shuffle_buffer_size, split='train', restrict_classes=None):
+def provide_dataset(batch_size, shuffle_buffer_size, split='train',
+                    restrict_classes=None, num_epochs=None):
   """Provides dataset of ImageNet digits that were preprocessed by the Red Team.
 
   Args:
@@ -44,30 +56,232 @@ def provide_dataset(batch_size, shuffle_buffer_size, split='train', restrict_cla
       means more likely randomization.
     split: A tfds split. If 'train', dataset is shuffled. Otherwise, it's
       deterministic.
+    restrict_classes: Optional list of labels to keep, for intra-fid. If the
+      preprocessed cache of the train split has a class index, see
+      `write_class_index`, only the files of these classes are read.
+    num_epochs: If `None`, repeat forever. Otherwise make exactly this many
+      deterministic passes over the split and keep the last partial batch.
   Returns:
     A dataset of num_batches batches of size batch_size of images and labels.
+    If --preprocessed_data_dir holds a cache of the split at --image_size, see
+    `write_preprocessed_dataset`, the images are read from it instead of being
+    decoded and resized again. With --in_memory_dataset the split is
+    materialised once per process, see `provide_in_memory_dataset`. With
+    --uint8_infeed the images are uint8, or packed into int32 for TPUs, and
+    `decode_images` converts them to float on the accelerator.
   """
   shuffle = (split not in ['test', 'validation'])
   if restrict_classes is not None: # things for intra-fid
     shuffle = False
     split = 'train'
-  dataset = _load_dataset(split, flags.FLAGS.dataset_name, flags.FLAGS.data_dir,
-                                   shuffle_files=shuffle)
+  if num_epochs is not None:
+    shuffle = False
+  image_dtype = _infeed_image_dtype()
+  if flags.FLAGS.in_memory_dataset:
+    return provide_in_memory_dataset(
+        batch_size, split, shuffle=shuffle, restrict_classes=restrict_classes,
+        num_epochs=num_epochs, image_dtype=image_dtype)
+  preprocessed_dir = _find_preprocessed_dataset(split)
+  if preprocessed_dir is not None:
+    if restrict_classes is not None and has_class_index(preprocessed_dir):
+      dataset = load_preprocessed_classes(
+          preprocessed_dir, restrict_classes,
+          cycle_length=flags.FLAGS.tfdf_num_parallel_calls)
+      restrict_classes = None
+    else:
+      dataset = load_preprocessed_dataset(
+          preprocessed_dir, shuffle_files=shuffle,
+          seed=flags.FLAGS.data_shuffle_seed)
+    if image_dtype != tf.float32:
+      preprocess_fn = _split_record
+    else:
+      preprocess_fn = _normalize_preprocessed_record
+  else:
+    dataset = _load_dataset(split, flags.FLAGS.dataset_name,
+                            flags.FLAGS.data_dir, shuffle_files=shuffle)
+    if image_dtype != tf.float32:
+      preprocess_fn = lambda record: _split_record(  # pylint: disable=g-long-lambda
+          _uint8_record_fn(flags.FLAGS.image_size)(record))
+    else:
+      preprocess_fn = _preprocess_dataset_record_fn(flags.FLAGS.image_size)
   if restrict_classes is not None:
     predicate = functools.partial(allowed_labels_predicate, allowed_labels=tf.constant(restrict_classes))
     dataset = dataset.filter(predicate)
   if shuffle:
     dataset = dataset.apply(
-        tf.data.experimental.shuffle_and_repeat(shuffle_buffer_size))
+        tf.data.experimental.shuffle_and_repeat(
+            shuffle_buffer_size, seed=flags.FLAGS.data_shuffle_seed))
   else:
-    dataset = dataset.repeat()
-  dataset = (dataset.map(_preprocess_dataset_record_fn(flags.FLAGS.image_size),
+    dataset = dataset.repeat(num_epochs)
+  dataset = (dataset.map(preprocess_fn,
                          num_parallel_calls=flags.FLAGS.tfdf_num_parallel_calls)
-             .batch(batch_size, drop_remainder=True))
+             .batch(batch_size, drop_remainder=num_epochs is None))
+  if image_dtype == tf.int32:
+    dataset = dataset.map(lambda images, labels: (  # pylint: disable=g-long-lambda
+        pack_uint8_images(images), labels))
   dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
   return dataset
 
 
+def provide_in_memory_dataset(batch_size, split, shuffle,
+                              restrict_classes=None, num_epochs=None,
+                              image_dtype=tf.float32):
+  """Provides batches of a split held in memory as uint8.
+
+  The split is decoded, cropped and resized once, see
+  `materialize_split`. The dataset only shuffles and batches indices and
+  gathers each batch from the uint8 arrays with a `numpy_function`, so there
+  is no per-image decoding and the shuffle is over the whole split. The
+  arrays stay out of the GraphDef, which the Estimator writes to graph.pbtxt
+  and to every checkpoint, but the input pipeline must run in this process,
+  not on a remote TPU worker.
+
+  Args:
+    batch_size: The number of images in each batch.
+    split: A tfds split.
+    shuffle: Whether to shuffle and repeat forever.
+    restrict_classes: Optional list of labels to keep, for intra-fid.
+    num_epochs: If `shuffle` is `False`, the number of passes over the split,
+      or `None` to repeat forever.
+    image_dtype: tf.float32 for images in [-1, 1], tf.uint8, or tf.int32 for
+      uint8 images packed by `pack_uint8_images`.
+
+  Returns:
+    A dataset of batches of images and int32 labels, like `provide_dataset`.
+  """
+  images, labels = materialize_split(split)
+  if restrict_classes is not None:
+    keep = np.isin(labels, restrict_classes)
+    images = images[keep]
+    labels = labels[keep]
+  num_examples = labels.shape[0]
+  dataset = tf.data.Dataset.range(num_examples)
+  if shuffle:
+    dataset = dataset.apply(tf.data.experimental.shuffle_and_repeat(
+        num_examples, seed=flags.FLAGS.data_shuffle_seed))
+  else:
+    dataset = dataset.repeat(num_epochs)
+  dataset = dataset.batch(batch_size, drop_remainder=num_epochs is None)
+
+  def _gather(indices):
+    batch_images, batch_labels = tf.compat.v1.numpy_function(
+        lambda i: (images[i], labels[i]), [indices], [tf.uint8, tf.int32])
+    batch_images.set_shape(indices.shape.concatenate(images.shape[1:]))
+    batch_labels.set_shape(indices.shape)
+    if image_dtype == tf.float32:
+      batch_images = decode_images(batch_images)
+    elif image_dtype == tf.int32:
+      batch_images = pack_uint8_images(batch_images)
+    return batch_images, batch_labels
+
+  dataset = dataset.map(_gather,
+                        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def materialize_split(split, batch_size=1024):
+  """Returns a whole split cropped and resized to --image_size, as uint8.
+
+  The split is read from the preprocessed cache if there is one, otherwise
+  from tfds, and kept for the lifetime of the process, so the train and eval
+  input functions of every `train` and `evaluate` call share one copy.
+
+  Args:
+    split: A tfds split.
+    batch_size: The number of images read per session call.
+
+  Returns:
+    A tuple of a uint8 array of shape [n, image_size, image_size, 3] and an
+    int32 array of shape [n] of labels, in the order of the split.
+  """
+  image_size = flags.FLAGS.image_size
+  key = (flags.FLAGS.dataset_name, split, image_size)
+  if key in _in_memory_splits:
+    return _in_memory_splits[key]
+  tf.compat.v1.logging.info('Loading split %s of %s into memory.' % (
+      split, flags.FLAGS.dataset_name))
+  with tf.Graph().as_default():
+    preprocessed_dir = _find_preprocessed_dataset(split)
+    if preprocessed_dir is not None:
+      ds = load_preprocessed_dataset(preprocessed_dir)
+    else:
+      ds = _load_dataset(split, flags.FLAGS.dataset_name,
+                         flags.FLAGS.data_dir).map(
+                             _uint8_record_fn(image_size),
+                             num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    ds = ds.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE)
+    record = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    images = []
+    labels = []
+    with tf.compat.v1.Session() as sess:
+      while True:
+        try:
+          record_np = sess.run(record)
+        except tf.errors.OutOfRangeError:
+          break
+        images.append(record_np['image'])
+        labels.append(record_np['label'].astype(np.int32))
+  _in_memory_splits[key] = (np.concatenate(images), np.concatenate(labels))
+  tf.compat.v1.logging.info('Loaded %i images of split %s into memory.' % (
+      _in_memory_splits[key][1].shape[0], split))
+  return _in_memory_splits[key]
+
+
+def _infeed_image_dtype():
+  """Returns the dtype of the images `provide_dataset` emits."""
+  if not flags.FLAGS.uint8_infeed:
+    return tf.float32
+  # TPU infeed has no uint8.
+  return tf.int32 if flags.FLAGS.use_tpu_estimator else tf.uint8
+
+
+def pack_uint8_images(images):
+  """Packs every four bytes of a batch of uint8 images into one int32.
+
+  TPU infeed has no uint8, so this keeps the transfer at one byte per
+  channel. `decode_images` unpacks the bytes on the device.
+
+  Args:
+    images: A uint8 tensor of shape [batch, height, width, 3], with
+      `height * width * 3` divisible by 4.
+
+  Returns:
+    An int32 tensor of shape [batch, height * width * 3 / 4].
+  """
+  batch_size = (tf.compat.dimension_value(images.shape[0]) or
+                tf.shape(input=images)[0])
+  num_values = images.shape[1:].num_elements()
+  return tf.bitcast(tf.reshape(images, [batch_size, num_values // 4, 4]),
+                    tf.int32)
+
+
+def decode_images(images):
+  """Returns float32 images in [-1, 1] from any output of `provide_dataset`.
+
+  uint8 images, and uint8 images packed by `pack_uint8_images`, are converted
+  where this runs, i.e. on the accelerator in the model function. Float
+  images are returned as they are, so this applies to generated images too.
+
+  Args:
+    images: A batch of float32 or uint8 images, or packed int32 images of
+      --image_size.
+
+  Returns:
+    A float32 tensor of shape [batch, height, width, 3].
+  """
+  if images.dtype == tf.int32:
+    image_size = flags.FLAGS.image_size
+    batch_size = (tf.compat.dimension_value(images.shape[0]) or
+                  tf.shape(input=images)[0])
+    # The first byte of each int32 is the least significant one.
+    images = tf.bitwise.bitwise_and(
+        tf.bitwise.right_shift(images[..., None], [0, 8, 16, 24]), 0xFF)
+    images = tf.reshape(images, [batch_size, image_size, image_size, 3])
+  elif images.dtype != tf.uint8:
+    return images
+  return tf.cast(images, tf.float32) * (2. / 255) - 1.
+
+
 def provide_data(batch_size,
                  num_batches,
                  shuffle_buffer_size,
@@ -90,6 +304,7 @@ def provide_data(batch_size,
                             split)
   iterator = tf.compat.v1.data.make_one_shot_iterator(dataset)
   images, labels = iterator.get_next()
+  images = decode_images(images)
   images = tf.reshape(
       images, shape=[num_batches, batch_size, flags.FLAGS.image_size, flags.FLAGS.image_size, 3])
   labels = tf.reshape(labels, shape=[num_batches, batch_size, 1])
@@ -105,38 +320,337 @@ def _load_dataset(split, data_name=None, data_dir=None, shuffle_files=False):
                    shuffle_files=shuffle_files)
 
 
+def preprocessed_dataset_dir(root_dir, dataset_name, split, image_size):
+  """Returns the directory of the preprocessed cache of a split.
+
+  Args:
+    root_dir: The directory holding the caches of all datasets.
+    dataset_name: A tfds dataset name, e.g. 'imagenet2012'.
+    split: A tfds split.
+    image_size: The size the images were resized to.
+
+  Returns:
+    A directory path below `root_dir`.
+  """
+  return os.path.join(root_dir, '{}_{}_{}px'.format(
+      dataset_name.replace('/', '-'), split, image_size))
+
+
+def _find_preprocessed_dataset(split):
+  """Returns the cache directory of `split`, or `None` if there is none."""
+  root_dir = flags.FLAGS.preprocessed_data_dir
+  if root_dir is None:
+    return None
+  dataset_dir = preprocessed_dataset_dir(
+      root_dir, flags.FLAGS.dataset_name, split, flags.FLAGS.image_size)
+  if not tf.io.gfile.exists(os.path.join(dataset_dir, _METADATA_FILE)):
+    tf.compat.v1.logging.warning(
+        'No preprocessed cache in %s, decoding %s from tfds.' % (
+            dataset_dir, split))
+    return None
+  return dataset_dir
+
+
+def _shard_path(dataset_dir, shard_index, num_shards):
+  return os.path.join(dataset_dir, 'data-{:05d}-of-{:05d}.tfrecord'.format(
+      shard_index, num_shards))
+
+
+def _class_path(dataset_dir, label):
+  return os.path.join(dataset_dir, _CLASS_DIR,
+                      'class-{:05d}.tfrecord'.format(label))
+
+
+def _read_json(path):
+  with tf.io.gfile.GFile(path) as f:
+    return json.load(f)
+
+
+def _write_json(path, value):
+  tmp_path = '%s.tmp-%s' % (path, uuid.uuid4().hex)
+  with tf.io.gfile.GFile(tmp_path, 'w') as f:
+    json.dump(value, f)
+  tf.io.gfile.rename(tmp_path, path, overwrite=True)
+
+
+def _encode_example(image, label):
+  return tf.train.Example(features=tf.train.Features(feature={
+      'image': tf.train.Feature(
+          bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+      'label': tf.train.Feature(
+          int64_list=tf.train.Int64List(value=[int(label)])),
+  })).SerializeToString()
+
+
+def write_preprocessed_dataset(dataset_fn, dataset_dir, image_size,
+                               num_shards=64, batch_size=256):
+  """Writes center-cropped, resized uint8 images and labels as TFRecords.
+
+  Record `i` of the dataset goes to shard `i % num_shards`, so reading all shards
+  with a round-robin interleave yields the records in their original order.
+  `metadata.json` is written last and marks the cache as complete.
+
+  Args:
+    dataset_fn: A function without arguments returning a dataset of dicts with
+      a uint8 'image' of any size and a 'label', e.g. a tfds split read in
+      order. It is called in a new graph.
+    dataset_dir: The directory to write to, see `preprocessed_dataset_dir`.
+    image_size: The size to resize the images to.
+    num_shards: The number of TFRecord files.
+    batch_size: The number of images resized per session call.
+
+  Returns:
+    The number of records written.
+  """
+  tf.io.gfile.makedirs(dataset_dir)
+  num_examples = 0
+  num_batches = 0
+  with tf.Graph().as_default():
+    ds = dataset_fn().map(_uint8_record_fn(image_size),
+                          num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    ds = ds.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE)
+    record = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    images, labels = record['image'], record['label']
+    writers = [tf.io.TFRecordWriter(_shard_path(dataset_dir, i, num_shards))
+               for i in range(num_shards)]
+    try:
+      with tf.compat.v1.Session() as sess:
+        while True:
+          try:
+            images_np, labels_np = sess.run([images, labels])
+          except tf.errors.OutOfRangeError:
+            break
+          for image, label in zip(images_np, labels_np):
+            writers[num_examples % num_shards].write(
+                _encode_example(image, label))
+            num_examples += 1
+          num_batches += 1
+          if num_batches % 100 == 0:
+            tf.compat.v1.logging.info('Preprocessed %i images into %s.' % (
+                num_examples, dataset_dir))
+    finally:
+      for writer in writers:
+        writer.close()
+  _write_json(os.path.join(dataset_dir, _METADATA_FILE),
+              {'num_examples': num_examples, 'num_shards': num_shards,
+               'image_size': image_size})
+  return num_examples
+
+
+def load_preprocessed_dataset(dataset_dir, shuffle_files=False, seed=None):
+  """Reads a cache written by `write_preprocessed_dataset`.
+
+  Args:
+    dataset_dir: The directory of the cache.
+    shuffle_files: If `True`, read the shards in a random order. Otherwise the
+      records come in the order they were written.
+    seed: The seed of the shard order, if `shuffle_files`.
+
+  Returns:
+    A dataset of dicts with a uint8 'image' of shape
+    [image_size, image_size, 3] and an int64 'label'.
+  """
+  metadata = _read_json(os.path.join(dataset_dir, _METADATA_FILE))
+  files = tf.data.Dataset.from_tensor_slices(_shard_paths(dataset_dir,
+                                                          metadata))
+  if shuffle_files:
+    files = files.shuffle(metadata['num_shards'], seed=seed)
+  dataset = files.interleave(
+      tf.data.TFRecordDataset, cycle_length=metadata['num_shards'],
+      block_length=1, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  return dataset.map(_parse_example_fn(metadata['image_size']),
+                     num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+
+def _shard_paths(dataset_dir, metadata):
+  return [_shard_path(dataset_dir, i, metadata['num_shards'])
+          for i in range(metadata['num_shards'])]
+
+
+def _parse_label(serialized):
+  return tf.io.parse_single_example(serialized, {
+      'label': tf.io.FixedLenFeature([], tf.int64)})['label']
+
+
+def _parse_example_fn(image_size):
+  """Returns a function parsing the examples of `_encode_example`."""
+
+  def _parse(serialized):
+    features = tf.io.parse_single_example(serialized, {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    })
+    image = tf.reshape(tf.io.decode_raw(features['image'], tf.uint8),
+                       [image_size, image_size, 3])
+    return {'image': image, 'label': features['label']}
+
+  return _parse
+
+
+def write_class_index(dataset_dir, num_classes, max_open_files=256,
+                      batch_size=1024):
+  """Regroups a preprocessed cache into one TFRecord file per class.
+
+  The records of class `c` are copied, still encoded, to
+  `by_class/class-<c>.tfrecord` next to the round-robin shards, and
+  `by_class/index.json` stores the number of records of every class and their
+  offsets in the class-ordered concatenation. The cache is read once per group
+  of `max_open_files` classes, which is cheap since its images are already
+  decoded and resized.
+
+  Args:
+    dataset_dir: The directory of a cache written by
+      `write_preprocessed_dataset`.
+    num_classes: The number of classes in the dataset.
+    max_open_files: The most class files to write at the same time.
+    batch_size: The number of records read per session call.
+
+  Returns:
+    An int64 array of shape [num_classes] with the records per class.
+
+  Raises:
+    ValueError: If some records have labels outside of [0, num_classes).
+  """
+  metadata = _read_json(os.path.join(dataset_dir, _METADATA_FILE))
+  tf.io.gfile.makedirs(os.path.join(dataset_dir, _CLASS_DIR))
+  class_counts = np.zeros([num_classes], dtype=np.int64)
+  for first_class in range(0, num_classes, max_open_files):
+    last_class = min(first_class + max_open_files, num_classes)
+    with tf.Graph().as_default():
+      ds = tf.data.TFRecordDataset(_shard_paths(dataset_dir, metadata))
+      ds = ds.map(lambda serialized: (serialized, _parse_label(serialized)))
+      ds = ds.filter(lambda _, label: tf.logical_and(
+          label >= first_class, label < last_class))
+      ds = ds.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE)
+      records, labels = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+      writers = {c: tf.io.TFRecordWriter(_class_path(dataset_dir, c))
+                 for c in range(first_class, last_class)}
+      try:
+        with tf.compat.v1.Session() as sess:
+          while True:
+            try:
+              records_np, labels_np = sess.run([records, labels])
+            except tf.errors.OutOfRangeError:
+              break
+            for record, label in zip(records_np, labels_np):
+              writers[label].write(record)
+            class_counts[first_class:last_class] += np.bincount(
+                labels_np - first_class, minlength=last_class - first_class)
+      finally:
+        for writer in writers.values():
+          writer.close()
+    tf.compat.v1.logging.info('Indexed classes [%i, %i) of %s.' % (
+        first_class, last_class, dataset_dir))
+  if np.sum(class_counts) != metadata['num_examples']:
+    raise ValueError('Only %i of the %i records of %s have labels in [0, %i).'
+                     % (np.sum(class_counts), metadata['num_examples'],
+                        dataset_dir, num_classes))
+  class_offsets = np.concatenate([[0], np.cumsum(class_counts)[:-1]])
+  _write_json(os.path.join(dataset_dir, _CLASS_DIR, _CLASS_INDEX_FILE),
+              {'class_counts': class_counts.tolist(),
+               'class_offsets': class_offsets.tolist()})
+  return class_counts
+
+
+def has_class_index(dataset_dir):
+  """Whether `write_class_index` has finished for a preprocessed cache."""
+  return tf.io.gfile.exists(
+      os.path.join(dataset_dir, _CLASS_DIR, _CLASS_INDEX_FILE))
+
+
+def load_preprocessed_classes(dataset_dir, classes, cycle_length=16):
+  """Reads only the records of some classes from a class-indexed cache.
+
+  Args:
+    dataset_dir: The directory of a cache with a class index, see
+      `write_class_index`.
+    classes: The labels to read.
+    cycle_length: The most class files read in parallel. The records of up to
+      this many classes are interleaved deterministically.
+
+  Returns:
+    A dataset of dicts like `load_preprocessed_dataset`, with the records of
+    `classes` only.
+
+  Raises:
+    ValueError: If a class is not in the index.
+  """
+  metadata = _read_json(os.path.join(dataset_dir, _METADATA_FILE))
+  index = _read_json(os.path.join(dataset_dir, _CLASS_DIR, _CLASS_INDEX_FILE))
+  class_counts = index['class_counts']
+  missing = [c for c in classes if not 0 <= c < len(class_counts)]
+  if missing:
+    raise ValueError('Classes %s are not in the index of %s.' % (
+        missing, dataset_dir))
+  files = [_class_path(dataset_dir, c) for c in classes if class_counts[c]]
+  cycle_length = max(1, min(cycle_length, len(files)))
+  dataset = tf.data.Dataset.from_tensor_slices(files).interleave(
+      tf.data.TFRecordDataset, cycle_length=cycle_length, block_length=1,
+      num_parallel_calls=cycle_length)
+  return dataset.map(_parse_example_fn(metadata['image_size']),
+                     num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+
+def _split_record(record):
+  return record['image'], tf.cast(record['label'], tf.int32)
+
+
+def _normalize_preprocessed_record(record):
+  image = tf.cast(record['image'], tf.float32) * (2. / 255) - 1.
+  return image, tf.cast(record['label'], tf.int32)
+
+
+def _crop_and_resize_record_image(image, image_size):
+  """Takes the largest central square and resamples it to image_size.
+
+  Returns:
+    A float32 image of shape [image_size, image_size, 3] in [0, 255].
+  """
+  # Based on
+  # https://github.com/openai/improved-gan/blob/master/imagenet/convert_imagenet_to_records.py
+  image_shape = tf.cast(tf.shape(input=image), tf.float32)
+  box_size = tf.math.minimum(image_shape[0], image_shape[1])
+  # Since we assume the box is centered we have:
+  # 2 * box_x_min + box_size == box_width,
+  # 2 * box_y_min + box_size == box_height.
+  # tf.math.ceil is used for consistency with the improved-gan implementation.
+  box_y_min = tf.math.ceil(0.5 * (image_shape[0] - box_size))
+  box_x_min = tf.math.ceil(0.5 * (image_shape[1] - box_size))
+  box_y_max = box_y_min + box_size - 1
+  box_x_max = box_x_min + box_size - 1
+  # Normalize with the inverse of the trasform done by crop_and_resize.
+  normalized_y_min = box_y_min / (image_shape[0] - 1)
+  normalized_x_min = box_x_min / (image_shape[1] - 1)
+  normalized_y_max = box_y_max / (image_shape[0] - 1)
+  normalized_x_max = box_x_max / (image_shape[1] - 1)
+  image = compat_utils.crop_and_resize([image],
+                                       boxes=[[
+                                           normalized_y_min, normalized_x_min,
+                                           normalized_y_max, normalized_x_max
+                                       ]],
+                                       box_ind=[0],
+                                       crop_size=[image_size, image_size])
+  # crop_and_resize returns a tensor of type tf.float32.
+  return tf.squeeze(image, axis=0)
+
+
+def _uint8_record_fn(image_size):
+  """Returns a function cropping and resizing records to uint8 images."""
+
+  def _process_record(record):
+    image = _crop_and_resize_record_image(record['image'], image_size)
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0., 255.), tf.uint8)
+    return {'image': image, 'label': tf.cast(record['label'], tf.int64)}
+
+  return _process_record
+
+
 def _preprocess_dataset_record_fn(image_size):
   """Returns function for processing the elements of the imagenet dataset."""
 
   def _process_record(record):
     """Takes the largest central square and resamples to image_size."""
-    # Based on
-    # https://github.com/openai/improved-gan/blob/master/imagenet/convert_imagenet_to_records.py
-    image = record['image']
-    image_shape = tf.cast(tf.shape(input=image), tf.float32)
-    box_size = tf.math.minimum(image_shape[0], image_shape[1])
-    # Since we assume the box is centered we have:
-    # 2 * box_x_min + box_size == box_width,
-    # 2 * box_y_min + box_size == box_height.
-    # tf.math.ceil is used for consistency with the improved-gan implementation.
-    box_y_min = tf.math.ceil(0.5 * (image_shape[0] - box_size))
-    box_x_min = tf.math.ceil(0.5 * (image_shape[1] - box_size))
-    box_y_max = box_y_min + box_size - 1
-    box_x_max = box_x_min + box_size - 1
-    # Normalize with the inverse of the trasform done by crop_and_resize.
-    normalized_y_min = box_y_min / (image_shape[0] - 1)
-    normalized_x_min = box_x_min / (image_shape[1] - 1)
-    normalized_y_max = box_y_max / (image_shape[0] - 1)
-    normalized_x_max = box_x_max / (image_shape[1] - 1)
-    image = compat_utils.crop_and_resize([image],
-                                         boxes=[[
-                                             normalized_y_min, normalized_x_min,
-                                             normalized_y_max, normalized_x_max
-                                         ]],
-                                         box_ind=[0],
-                                         crop_size=[image_size, image_size])
-    # crop_and_resize returns a tensor of type tf.float32.
-    image = tf.squeeze(image, axis=0)
+    image = _crop_and_resize_record_image(record['image'], image_size)
     image = image * (2. / 255) - 1.
     label = tf.cast(record['label'], tf.int32)
     return image, label
@@ -109,6 +109,151 @@ class DataProviderTest(tf.test.TestCase, parameterized.TestCase):
     self.assertAllEqual(processed_record[0][1:-1, 1:-1, :],
                         tf.ones([image_size - 2, image_size - 2, 3]))
 
+  @parameterized.parameters(True, False)
+  def test_preprocessed_dataset_round_trip(self, shuffle_files):
+    if tf.executing_eagerly():
+      # The cache is written with a session.
+      return
+    rs = np.random.RandomState(0)
+    images = rs.randint(0, 256, size=[10, 12, 16, 3]).astype(np.uint8)
+    labels = np.arange(10, dtype=np.int64) % 4
+    dataset_dir = data_provider.preprocessed_dataset_dir(
+        self.get_temp_dir(), 'fake/8x8', 'train', 8)
+    num_examples = data_provider.write_preprocessed_dataset(
+        lambda: tf.data.Dataset.from_tensor_slices(
+            {'image': images, 'label': labels}),
+        dataset_dir, image_size=8, num_shards=3, batch_size=4)
+    self.assertEqual(10, num_examples)
+    self.assertLen(tf.io.gfile.glob(dataset_dir + '/*.tfrecord'), 3)
+
+    expected_fn = data_provider._preprocess_dataset_record_fn(image_size=8)
+    ds = data_provider.load_preprocessed_dataset(
+        dataset_dir, shuffle_files=shuffle_files)
+    ds = ds.map(data_provider._normalize_preprocessed_record).batch(10)
+    cached_images, cached_labels = (
+        tf.compat.v1.data.make_one_shot_iterator(ds).get_next())
+    expected_images = tf.stack([
+        expected_fn({'image': tf.constant(image), 'label': 0})[0]
+        for image in images])
+    with self.session() as sess:
+      cached_images, cached_labels, expected_images = sess.run(
+          [cached_images, cached_labels, expected_images])
+    self.assertEqual(tf.int32, cached_labels.dtype)
+    if shuffle_files:
+      # Match every cached image to the closest expected one.
+      order = [np.argmin(np.max(np.abs(cached_images - image), axis=(1, 2, 3)))
+               for image in expected_images]
+      cached_images = cached_images[order]
+      cached_labels = cached_labels[order]
+    self.assertAllEqual(labels, cached_labels)
+    # The cache only adds the uint8 rounding error.
+    self.assertAllClose(expected_images, cached_images, atol=1. / 255, rtol=0)
+
+  def test_load_preprocessed_classes(self):
+    if tf.executing_eagerly():
+      return
+    labels = np.array([3, 0, 1, 3, 3, 1, 0, 3], dtype=np.int64)
+    images = np.tile(labels[:, None, None, None], [1, 4, 4, 3]).astype(np.uint8)
+    dataset_dir = data_provider.preprocessed_dataset_dir(
+        self.get_temp_dir(), 'fake', 'train', 4)
+    data_provider.write_preprocessed_dataset(
+        lambda: tf.data.Dataset.from_tensor_slices(
+            {'image': images, 'label': labels}),
+        dataset_dir, image_size=4, num_shards=3)
+    self.assertFalse(data_provider.has_class_index(dataset_dir))
+    # Two passes over the cache, for classes [0, 3) and [3, 5).
+    class_counts = data_provider.write_class_index(
+        dataset_dir, num_classes=5, max_open_files=3)
+    self.assertAllEqual([2, 2, 0, 4, 0], class_counts)
+    self.assertTrue(data_provider.has_class_index(dataset_dir))
+
+    ds = data_provider.load_preprocessed_classes(
+        dataset_dir, [1, 2, 3], cycle_length=2).batch(10)
+    record = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    with self.session() as sess:
+      record = sess.run(record)
+    self.assertAllEqual([1, 1, 3, 3, 3, 3], np.sort(record['label']))
+    self.assertAllEqual(record['label'], record['image'][:, 0, 0, 0])
+
+    with self.assertRaisesRegexp(ValueError, 'not in the index'):
+      data_provider.load_preprocessed_classes(dataset_dir, [5])
+
+  def test_class_index_needs_all_labels(self):
+    if tf.executing_eagerly():
+      return
+    dataset_dir = data_provider.preprocessed_dataset_dir(
+        self.get_temp_dir(), 'fake', 'test', 4)
+    data_provider.write_preprocessed_dataset(
+        lambda: tf.data.Dataset.from_tensor_slices({
+            'image': np.zeros([3, 4, 4, 3], dtype=np.uint8),
+            'label': np.array([0, 1, 7], dtype=np.int64)}),
+        dataset_dir, image_size=4, num_shards=2)
+    with self.assertRaisesRegexp(ValueError, 'Only 2 of the 3'):
+      data_provider.write_class_index(dataset_dir, num_classes=2)
+
+  @mock.patch.object(data_provider, 'materialize_split', autospec=True)
+  def test_provide_in_memory_dataset(self, mock_split):
+    if tf.executing_eagerly():
+      return
+    labels = np.array([0, 1, 2, 1, 0, 1], dtype=np.int32)
+    images = np.tile(labels[:, None, None, None] * 51,
+                     [1, 4, 4, 3]).astype(np.uint8)
+    mock_split.return_value = (images, labels)
+    ds = data_provider.provide_in_memory_dataset(
+        2, 'train', shuffle=False, restrict_classes=[1, 2], num_epochs=1)
+    batch = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    batches = []
+    with self.session() as sess:
+      while True:
+        try:
+          batches.append(sess.run(batch))
+        except tf.errors.OutOfRangeError:
+          break
+    batch_images = np.concatenate([b[0] for b in batches])
+    batch_labels = np.concatenate([b[1] for b in batches])
+    self.assertEqual([2, 2], [len(b[1]) for b in batches])
+    self.assertAllEqual([1, 2, 1, 1], batch_labels)
+    self.assertEqual(np.float32, batch_images.dtype)
+    self.assertAllClose(batch_labels * (102. / 255) - 1.,
+                        batch_images[:, 0, 0, 0])
+
+  @mock.patch.object(data_provider, 'materialize_split', autospec=True)
+  def test_in_memory_dataset_not_in_graph(self, mock_split):
+    if tf.executing_eagerly():
+      return
+    images = np.zeros([100, 64, 64, 3], dtype=np.uint8)
+    mock_split.return_value = (images, np.zeros([100], dtype=np.int32))
+    with tf.Graph().as_default() as g:
+      ds = data_provider.provide_in_memory_dataset(
+          10, 'train', shuffle=False, image_dtype=tf.uint8)
+      batch, _ = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+      self.assertEqual([10, 64, 64, 3], batch.shape.as_list())
+      self.assertLess(g.as_graph_def().ByteSize(), images.nbytes // 10)
+
+  @parameterized.parameters(tf.uint8, tf.int32)
+  @mock.patch.object(data_provider, 'materialize_split', autospec=True)
+  def test_uint8_infeed(self, image_dtype, mock_split):
+    if tf.executing_eagerly():
+      return
+    rs = np.random.RandomState(0)
+    images = rs.randint(0, 256, size=[4, 8, 8, 3]).astype(np.uint8)
+    mock_split.return_value = (images, np.zeros([4], dtype=np.int32))
+    ds = data_provider.provide_in_memory_dataset(
+        4, 'train', shuffle=False, num_epochs=1, image_dtype=image_dtype)
+    batch, _ = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    self.assertEqual(image_dtype, batch.dtype)
+    if image_dtype == tf.int32:
+      batch.shape.assert_is_compatible_with([4, 8 * 8 * 3 // 4])
+    with mock.patch.object(data_provider.flags, 'FLAGS') as mock_flags:
+      mock_flags.image_size = 8
+      decoded = data_provider.decode_images(batch)
+    floats = tf.random.normal([4, 8, 8, 3])
+    with self.session() as sess:
+      decoded, floats_np, passed_floats = sess.run(
+          [decoded, floats, data_provider.decode_images(floats)])
+    self.assertAllClose(images * (2. / 255) - 1., decoded)
+    self.assertAllEqual(floats_np, passed_floats)
+
   @parameterized.parameters(
       {'nrows': 128, 'ncols': 128},
       {'nrows': 234, 'ncols': 100},
@@ -23,6 +23,7 @@ import functools
 
 import tensorflow as tf
 
+from tensorflow_gan.examples.self_attention_estimator import data_provider
 from tensorflow_gan.examples.self_attention_estimator import eval_lib
 import tensorflow_gan as tfgan  # tf
 from tensorflow_gan.python.losses import losses_impl as tfgan_losses
@@ -59,12 +60,16 @@ def get_tpu_run_config_from_hparams(hparams):
 
 
 def get_run_config_from_hparams(hparams):
-  mirrored_strategy = tf.distribute.MirroredStrategy()
+  train_distribute = None
+  if not flags.FLAGS.checkpoint_input_pipeline:
+    # The saveable iterator of --checkpoint_input_pipeline is returned as
+    # tensors, which distributed training does not accept from an input_fn.
+    train_distribute = tf.distribute.MirroredStrategy()
   return tf.estimator.RunConfig(
       model_dir=hparams.model_dir,
       keep_checkpoint_max=flags.FLAGS.keep_checkpoint_max,
       save_checkpoints_steps=hparams.train_steps_per_eval,
-      train_distribute=mirrored_strategy)
+      train_distribute=train_distribute)
 
 
 def get_tpu_estimator(generator, discriminator, hparams, config):
@@ -122,7 +127,7 @@ def get_gpu_estimator(generator, discriminator, hparams, config):
     # Generate image summaries.
     real_data = gan_model.real_data
     generated_data = gan_model.generated_data
-    real_images = (
+    real_images = data_provider.decode_images(
         real_data['images'] if isinstance(real_data, dict) else real_data)
     gen_images = (
         generated_data['images']
@@ -180,8 +185,8 @@ def prepare_metric_arguments(generator_inputs, generated_data, real_data,
   """
   del generator_inputs
 
-  real_images = (real_data['images'] if isinstance(real_data, dict) else
-                 real_data)
+  real_images = data_provider.decode_images(
+      real_data['images'] if isinstance(real_data, dict) else real_data)
   gen_images = (generated_data['images'] if isinstance(generated_data, dict)
                 else generated_data)
   # labels
@@ -189,15 +194,11 @@ def prepare_metric_arguments(generator_inputs, generated_data, real_data,
                 None)
   gen_labels = (generated_data['labels'] if isinstance(generated_data, dict)
                 else None)
-  # Get logits and pools for real and generated images.
-  real_logits, real_pools = eval_lib.get_activations(
-      lambda: real_images, num_batches=1, get_logits=True)
+  # Get logits and pools for generated images, and for real images unless
+  # their statistics are cached.
   fake_logits, fake_pools = eval_lib.get_activations(
       lambda: gen_images, num_batches=1, get_logits=True)
-
-  return {
-      'real_logits': real_logits,
-      'real_pools': real_pools,
+  metric_arguments = {
       'fake_logits': fake_logits,
       'fake_pools': fake_pools,
       'real_labels': real_labels,
@@ -206,57 +207,152 @@ def prepare_metric_arguments(generator_inputs, generated_data, real_data,
       'real_disc_logits': discriminator_real_classifier_outputs,
       'fake_disc_logits': discriminator_gen_classifier_outputs,
   }
+  if not _use_real_statistics():
+    real_logits, real_pools = eval_lib.get_activations(
+        lambda: real_images, num_batches=1, get_logits=True)
+    metric_arguments['real_logits'] = real_logits
+    metric_arguments['real_pools'] = real_pools
+
+  return metric_arguments
 
 
-def get_metrics(real_logits, real_pools, fake_logits, fake_pools,
-                real_labels, fake_labels, real_disc_out,
-                real_disc_logits, fake_disc_logits, hparams):
+def _use_real_statistics():
+  """Whether real Inception statistics come from `--real_stats_dir`."""
+  # Intra-FID by chunks still needs the real activations of each batch.
+  return (flags.FLAGS.real_stats_dir is not None and
+          flags.FLAGS.mode != 'intra_fid_eval')
+
+
+def get_metrics(fake_logits, fake_pools, real_labels, fake_labels,
+                real_disc_out, real_disc_logits, fake_disc_logits, hparams,
+                real_logits=None, real_pools=None):
   """Return metrics for SAGAN experiment on TPU, CPU, or GPU.
 
   When training on TPUs, this function should be executed on the CPU.
 
   Args:
-    real_logits: The real_logits object retured by prepare_metric_arguments.
-    real_pools: The real_pools object retured by prepare_metric_arguments.
     fake_logits: The fake_logits object retured by prepare_metric_arguments.
     fake_pools: The fake_pools object retured by prepare_metric_arguments.
     hparams: An hparams object.
+    real_logits: The real_logits object retured by prepare_metric_arguments.
+      `None` if the real statistics are read from `--real_stats_dir`.
+    real_pools: The real_pools object retured by prepare_metric_arguments.
+      `None` if the real statistics are read from `--real_stats_dir`.
 
   Returns:
     A metric dictionary.
   """
-  del hparams
   real_labels = tf.cast(real_labels, tf.int64)
-  metric_dict = {
-      'eval/real_incscore':
-          tfgan.eval.classifier_score_from_logits_streaming(real_logits),
-      'eval/incscore':
-          tfgan.eval.classifier_score_from_logits_streaming(fake_logits),
-      'eval/fid':
-          tfgan.eval.frechet_classifier_distance_from_activations_streaming(
-              real_pools, fake_pools),
-  }
+  classwise = flags.FLAGS.classwise_eval_metrics and fake_labels is not None
+  accumulator_dtype = tf.as_dtype(flags.FLAGS.fid_accumulator_dtype)
+  if real_pools is None:
+    real_stats = eval_lib.maybe_load_real_statistics()
+    metric_dict = {
+        'eval/real_incscore':
+            (tf.constant(float(real_stats['inception_score']),
+                         dtype=fake_logits.dtype), tf.no_op()),
+        'eval/fid':
+            tfgan.eval.frechet_classifier_distance_from_statistics_streaming(
+                tf.constant(real_stats['mean']),
+                tf.constant(real_stats['covariance']), fake_pools,
+                accumulator_dtype=accumulator_dtype),
+    }
+  else:
+    metric_dict = {
+        'eval/real_incscore':
+            tfgan.eval.classifier_score_from_logits_streaming(real_logits),
+        'eval/fid':
+            tfgan.eval.frechet_classifier_distance_from_activations_streaming(
+                real_pools, fake_pools, accumulator_dtype=accumulator_dtype),
+    }
+    if flags.FLAGS.eval_kid:
+      kid, kid_std = (
+          tfgan.eval.kernel_classifier_distance_and_std_from_activations_streaming(
+              real_pools, fake_pools))
+      metric_dict['eval/kid'] = kid
+      metric_dict['eval/kid_std'] = kid_std
   # inception has 1008 outputs: https://github.com/tensorflow/tensorflow/issues/4128
   # for imagenet_resized should use logits 1:1001 and compare to fake_labels
 
+  if classwise:
+    metric_dict.update(_classwise_metrics(
+        fake_logits, fake_labels, fake_disc_logits, hparams.num_classes))
+  else:
+    metric_dict['eval/incscore'] = (
+        tfgan.eval.classifier_score_from_logits_streaming(fake_logits))
   if flags.FLAGS.extra_eval_metrics:
-    metric_dict['eval/generator_self_acc'] = tfgan_eval.accuracy_score_from_logits_streaming(fake_disc_logits, fake_labels)
+    if not classwise:
+      metric_dict['eval/generator_self_acc'] = tfgan_eval.accuracy_score_from_logits_streaming(fake_disc_logits, fake_labels)
     metric_dict['eval/discriminator_val_acc'] = tfgan_eval.accuracy_score_from_logits_streaming(real_disc_logits, real_labels)
     metric_dict['eval/val_real'] = tfgan_eval.percent_real_streaming(real_disc_out)
-    if 'imagenet_resized' in flags.FLAGS.dataset_name: 
+    if 'imagenet_resized' in flags.FLAGS.dataset_name and not classwise:
       metric_dict['eval/generator_inception_acc'] = tfgan_eval.accuracy_score_from_logits_streaming(fake_logits[:,1:1001], fake_labels)
   if flags.FLAGS.mode == 'intra_fid_eval':
     nclass = flags.FLAGS.intra_fid_eval_chunk_size
     metric_dict = {
       'eval/intra_fid':
           tfgan_eval.intra_class_frechet_classifier_distance_from_activations_streaming(
-            real_pools, fake_pools, real_labels, fake_labels, nclass)
+            real_pools, fake_pools, real_labels, fake_labels, nclass,
+            accumulator_dtype=accumulator_dtype)
     }
     
 
   return metric_dict
 
 
+def _classwise_metrics(fake_logits, fake_labels, fake_disc_logits, nclass):
+  """Inception score and accuracies of generated images, overall and per class.
+
+  All values come from the sums of one
+  `classwise_classifier_metrics_streaming`, which replaces the separate
+  'eval/incscore', 'eval/generator_self_acc' and 'eval/generator_inception_acc'
+  accumulators. The per-class values are also written as a text table, with
+  the classes of lowest score first, so that collapsed classes are easy to
+  find in TensorBoard.
+  """
+  # The Inception logits of imagenet_resized label `c` are at `c + 1`.
+  label_offset = 1 if 'imagenet_resized' in flags.FLAGS.dataset_name else None
+  metrics = tfgan_eval.classwise_classifier_metrics_streaming(
+      fake_logits, fake_labels, nclass, label_offset=label_offset,
+      discriminator_logits=fake_disc_logits)
+  metric_dict = {'eval/incscore': metrics['inception_score']}
+  columns = [('class_counts', 'count'),
+             ('class_inception_score', 'incscore')]
+  for name, metric in (('generator_inception_acc', 'top1_accuracy'),
+                       ('generator_inception_top5_acc', 'top5_accuracy'),
+                       ('generator_self_acc', 'discriminator_accuracy')):
+    if metric in metrics:
+      metric_dict['eval/' + name] = metrics[metric]
+      columns.append(('class_' + metric, name))
+
+  # Classes without samples rank last.
+  class_scores = metrics['class_inception_score'][0]
+  ranked_scores = tf.compat.v1.where(
+      tf.math.is_nan(class_scores),
+      tf.fill(tf.shape(input=class_scores), float('inf')), class_scores)
+  metric_dict['eval/min_class_incscore'] = (
+      tf.reduce_min(input_tensor=ranked_scores),
+      metrics['class_inception_score'][1])
+  # Each row is a class and its mode under the classifier, sorted by score.
+  order = tf.argsort(ranked_scores)
+  cells = [tf.strings.as_string(order),
+           tf.strings.as_string(tf.gather(tf.argmax(
+               input=metrics['class_marginals'][0], axis=1), order))]
+  for key, _ in columns:
+    values = tf.gather(metrics[key][0], order)
+    if key == 'class_counts':
+      cells.append(tf.strings.as_string(tf.cast(values, tf.int64)))
+    else:
+      cells.append(tf.strings.as_string(values, precision=3))
+  header = tf.constant([['class', 'classifier mode'] +
+                        [title for _, title in columns]])
+  table = tf.concat([header, tf.stack(cells, axis=1)], axis=0)
+  metric_dict['eval/classwise'] = (
+      tf.compat.v1.summary.text('classwise_metrics', table),
+      metrics['class_counts'][1])
+  return metric_dict
+
+
 def _generator_summary_ops(generated_images, real_images):
   """Creates a dictionary of image summaries."""
   real_img_summ = tf.compat.v1.summary.image('real_images', real_images)
@@ -19,7 +19,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+from concurrent import futures
+import hashlib
+import io
 import os
+import shutil
+import tempfile
 import numpy as np
 import PIL
 
@@ -30,7 +36,8 @@ import tensorflow_gan as tfgan  # tf
 from absl import flags
 
 
-def get_activations(get_images_fn, num_batches, get_logits=False):
+def get_activations(get_images_fn, num_batches, get_logits=False,
+                    num_splits=None):
   """Get Inception activations.
 
   Use TF-GAN utility to avoid holding images or Inception activations in
@@ -40,14 +47,26 @@ def get_activations(get_images_fn, num_batches, get_logits=False):
     get_images_fn: A function that takes no arguments and returns images.
     num_batches: The number of batches to fetch at a time.
     get_logits: If `True`, return (logits, pools). Otherwise just return pools.
+    num_splits: If `num_batches` is 1, split the batch into this many equal
+      parts that Inception runs in a map, which
+      `tfgan.eval.configure_classifier_execution` can parallelize. Defaults
+      to --classifier_num_splits.
 
   Returns:
     1 or 2 Tensors of Inception activations.
   """
+  if num_batches == 1 and num_splits is None:
+    num_splits = flags.FLAGS.classifier_num_splits
+  if num_batches == 1 and num_splits > 1:
+    # The parts of the batch are the inputs of the map.
+    sample_fn = lambda images: images
+    sample_inputs = tf.split(get_images_fn(), num_splits)
+  else:
+    sample_fn = lambda _: get_images_fn()
+    sample_inputs = [1.0] * num_batches  # dummy inputs to sample_fn
   # Image resizing happens inside the Inception SavedModel.
   outputs = tfgan.eval.sample_and_run_inception(
-      sample_fn=lambda _: get_images_fn(),
-      sample_inputs=[1.0] * num_batches)  # dummy inputs to sample_fn
+      sample_fn=sample_fn, sample_inputs=sample_inputs)
   if get_logits:
     return outputs['logits'], outputs['pool_3']
   else:
@@ -95,10 +114,442 @@ def get_real_activations(batch_size,
     dimension (batch_size * num_batches).
   """
   ds = data_provider.provide_dataset(batch_size, shuffle_buffer_size, split)
-  ds = ds.map(lambda img, lbl: img)  # Remove labels.
+  ds = ds.map(lambda img, lbl: data_provider.decode_images(img))  # Remove labels.
   return get_activations_from_dataset(ds, num_batches, get_logits)
 
 
+# Bump whenever the layout of the real statistics cache changes.
+REAL_STATISTICS_VERSION = 1
+
+
+def real_statistics_path(stats_dir, dataset_name, split, image_size,
+                         classifier_handle=tfgan.eval.INCEPTION_TFHUB):
+  """Returns the `.npz` path of cached real statistics for a configuration.
+
+  The file name is keyed by everything that changes the real activations: the
+  dataset, the split, the image size and the classifier module, plus the cache
+  layout version.
+
+  Args:
+    stats_dir: Directory holding the cache.
+    dataset_name: A tfds dataset name, e.g. 'imagenet_resized/64x64'.
+    split: The tfds split the statistics are computed over.
+    image_size: The size the real images are resized to.
+    classifier_handle: The TF-Hub handle of the classifier.
+
+  Returns:
+    A path ending in `.npz`.
+  """
+  handle_digest = hashlib.sha1(classifier_handle.encode('utf-8')).hexdigest()
+  fname = '{}_{}_{}px_{}_v{}.npz'.format(
+      dataset_name.replace('/', '-'), split, image_size, handle_digest[:12],
+      REAL_STATISTICS_VERSION)
+  return os.path.join(stats_dir, fname)
+
+
+def _sidecar_path(stats_path, suffix):
+  return stats_path[:-len('.npz')] + suffix
+
+
+def initialize_session(sess):
+  """Runs the global, local and table initializers in `sess`."""
+  sess.run([
+      tf.compat.v1.global_variables_initializer(),
+      tf.compat.v1.local_variables_initializer(),
+      tf.compat.v1.tables_initializer(),
+  ])
+
+
+class ActivationShardWriter(object):
+  """Writes named arrays, e.g. pool_3 and labels, as row-aligned `.npy` shards.
+
+  Rows are buffered and written every `shard_size` rows to
+  `{prefix}{name}_shard_{index:05d}.npy`, so shards of different arrays with
+  the same index hold the same examples. Shards are plain `.npy` files that
+  `np.load(..., mmap_mode='r')` can memory-map, and `prefix` may be any path
+  `tf.io.gfile` can write to.
+  """
+
+  def __init__(self, prefix, shard_size):
+    self.prefix = prefix
+    self.shard_size = shard_size
+    self.files = collections.defaultdict(list)
+    self._buffers = collections.defaultdict(list)
+    self._buffered = 0
+
+  def append(self, **arrays):
+    """Adds a batch of rows, one keyword argument per array."""
+    for name, array in arrays.items():
+      self._buffers[name].append(np.asarray(array))
+    self._buffered += np.asarray(next(iter(arrays.values()))).shape[0]
+    if self._buffered >= self.shard_size:
+      self.flush()
+
+  def flush(self):
+    """Writes all buffered rows as one more shard of each array."""
+    if not self._buffered:
+      return
+    for name, arrays in self._buffers.items():
+      fname = '{}{}_shard_{:05d}.npy'.format(
+          self.prefix, name, len(self.files[name]))
+      with tf.io.gfile.GFile(fname, 'wb') as f:
+        np.save(f, np.concatenate(arrays, axis=0))
+      self.files[name].append(fname)
+    self._buffers = collections.defaultdict(list)
+    self._buffered = 0
+
+
+def compute_real_statistics(batch_size, split, num_classes, scratch_prefix,
+                            save_activations=False,
+                            activations_shard_size=50000):
+  """Streams a real split through Inception once and accumulates statistics.
+
+  Args:
+    batch_size: The number of images to run through Inception at a time.
+    split: The tfds split to read. It is read exactly once, in order.
+    num_classes: The number of classes in the dataset.
+    scratch_prefix: A local path prefix for the memory-mapped per-class
+      covariances and the optional activation shards.
+    save_activations: If `True`, also write pool_3 activations and labels as
+      `.npy` shards of `activations_shard_size` rows next to `scratch_prefix`.
+    activations_shard_size: The number of rows per activation shard.
+
+  Returns:
+    A dict of statistics, see
+    `tfgan.eval.ClasswiseStreamingMoments.finalize`, with the real
+    `inception_score` and, if `save_activations`, the list of shard files
+    under 'pool_3_files' and 'labels_files'.
+  """
+  with tf.Graph().as_default():
+    ds = data_provider.provide_dataset(
+        batch_size, shuffle_buffer_size=1, split=split, num_epochs=1)
+    images, labels = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    logits, pools = get_activations(
+        lambda: data_provider.decode_images(images), num_batches=1,
+        get_logits=True)
+    moments = None
+    sum_p = 0.
+    sum_plogp = 0.
+    shards = ActivationShardWriter(scratch_prefix + '_', activations_shard_size)
+    with tf.compat.v1.Session() as sess:
+      initialize_session(sess)
+      num_batches = 0
+      while True:
+        try:
+          logits_np, pools_np, labels_np = sess.run([logits, pools, labels])
+        except tf.errors.OutOfRangeError:
+          break
+        if moments is None:
+          moments = tfgan.eval.ClasswiseStreamingMoments(
+              num_classes, pools_np.shape[1],
+              scatter_path=scratch_prefix + '_class_covariance.npy')
+        moments.update(pools_np, labels_np)
+        logits_np = logits_np.astype(np.float64)
+        log_p = logits_np - np.max(logits_np, axis=1, keepdims=True)
+        log_p -= np.log(np.sum(np.exp(log_p), axis=1, keepdims=True))
+        p = np.exp(log_p)
+        sum_p += np.sum(p, axis=0)
+        sum_plogp += np.sum(p * log_p)
+        if save_activations:
+          shards.append(pool_3=pools_np, labels=labels_np.astype(np.int32))
+        num_batches += 1
+        if num_batches % 100 == 0:
+          tf.compat.v1.logging.info('Accumulated real statistics over %i batches.'
+                                    % num_batches)
+    shards.flush()
+  if moments is None:
+    raise ValueError('Split %s of %s is empty.' % (
+        split, flags.FLAGS.dataset_name))
+  statistics = moments.finalize()
+  q = sum_p / statistics['num_examples']
+  statistics['inception_score'] = np.exp(
+      sum_plogp / statistics['num_examples'] - np.sum(q * np.log(q)))
+  if save_activations:
+    statistics['pool_3_files'] = shards.files['pool_3']
+    statistics['labels_files'] = shards.files['labels']
+  return statistics
+
+
+def save_real_statistics(path, statistics, dataset_name, split, image_size,
+                         classifier_handle=tfgan.eval.INCEPTION_TFHUB):
+  """Writes statistics from `compute_real_statistics` to `path`.
+
+  The global moments, per-class means and counts and the real Inception score
+  go into the versioned `.npz`. The per-class covariances and any activation
+  shards are written as `.npy` files next to it so they can be memory-mapped.
+  """
+  out_dir = os.path.dirname(path)
+  if not tf.io.gfile.exists(out_dir):
+    tf.io.gfile.makedirs(out_dir)
+  def _copy(src, suffix):
+    dst = _sidecar_path(path, suffix)
+    if os.path.abspath(src) != os.path.abspath(dst):
+      tf.io.gfile.copy(src, dst, overwrite=True)
+  _copy(statistics['class_covariances'].filename, '_class_covariance.npy')
+  for key in ['pool_3', 'labels']:
+    for i, src in enumerate(statistics.get(key + '_files', [])):
+      _copy(src, '_{}_shard_{:05d}.npy'.format(key, i))
+  buf = io.BytesIO()
+  np.savez(
+      buf,
+      version=REAL_STATISTICS_VERSION,
+      dataset_name=dataset_name,
+      split=split,
+      image_size=image_size,
+      classifier_handle=classifier_handle,
+      num_examples=statistics['num_examples'],
+      mean=statistics['mean'],
+      covariance=statistics['covariance'],
+      class_counts=statistics['class_counts'],
+      class_means=statistics['class_means'],
+      inception_score=statistics['inception_score'],
+      num_activation_shards=len(statistics.get('pool_3_files', [])))
+  with tf.io.gfile.GFile(path, 'wb') as f:
+    f.write(buf.getvalue())
+  tf.compat.v1.logging.info('Wrote real statistics to: %s', path)
+
+
+_LOADED_REAL_STATISTICS = {}
+
+
+def load_real_statistics(path):
+  """Loads statistics written by `save_real_statistics`.
+
+  Loaded statistics are kept for the lifetime of the process, so repeated
+  graph constructions do not reread them. Remote files are copied to a local
+  temporary directory first so the per-class covariances can be memory-mapped.
+
+  Args:
+    path: The `.npz` path, see `real_statistics_path`.
+
+  Returns:
+    A dict with the fields of the `.npz`, plus 'class_covariances' as a
+    read-only memory map of shape [num_classes, dim, dim].
+
+  Raises:
+    ValueError: If the cache was written with another layout version.
+  """
+  if path in _LOADED_REAL_STATISTICS:
+    return _LOADED_REAL_STATISTICS[path]
+  with tf.io.gfile.GFile(path, 'rb') as f:
+    npz = np.load(io.BytesIO(f.read()))
+    statistics = {k: npz[k] for k in npz.files}
+  if int(statistics['version']) != REAL_STATISTICS_VERSION:
+    raise ValueError('Real statistics %s have version %i, expected %i.' % (
+        path, int(statistics['version']), REAL_STATISTICS_VERSION))
+  cov_path = _sidecar_path(path, '_class_covariance.npy')
+  if not os.path.exists(cov_path):
+    local_path = os.path.join(tempfile.mkdtemp(), 'class_covariance.npy')
+    tf.io.gfile.copy(cov_path, local_path)
+    cov_path = local_path
+  statistics['class_covariances'] = np.load(cov_path, mmap_mode='r')
+  _LOADED_REAL_STATISTICS[path] = statistics
+  return statistics
+
+
+def iterate_real_activations(path):
+  """Yields the real pool_3 activations saved with the statistics at `path`.
+
+  Args:
+    path: The `.npz` path, see `real_statistics_path`.
+
+  Yields:
+    One float32 array of shape [n, dim] per saved shard, in order.
+
+  Raises:
+    ValueError: If the statistics were saved without activations.
+  """
+  num_shards = int(load_real_statistics(path)['num_activation_shards'])
+  if not num_shards:
+    raise ValueError(
+        'Real statistics %s were saved without activations, rerun '
+        '--mode=precompute_real_stats with --real_stats_save_activations.' %
+        path)
+  for i in range(num_shards):
+    yield load_npy_shards(
+        [_sidecar_path(path, '_pool_3_shard_{:05d}.npy'.format(i))])
+
+
+def load_npy_shards(paths):
+  """Reads `.npy` shards, e.g. from `ActivationShardWriter`, into one array."""
+  shards = []
+  for shard_path in paths:
+    with tf.io.gfile.GFile(shard_path, 'rb') as f:
+      shards.append(np.load(io.BytesIO(f.read())))
+  return np.concatenate(shards, axis=0)
+
+
+_REAL_NEAREST_NEIGHBOR_INDEXES = {}
+
+
+def real_nearest_neighbor_index(path, k):
+  """Returns the persisted k-NN index of the real activations saved with `path`.
+
+  The first call for a split copies the activation shards into one
+  `<stats>_knn_activations.npy` next to the statistics, and the first call for
+  each `k` adds `<stats>_knn_radii_k<k>.npy`. Later eval runs memory-map both,
+  so the real-real distances are computed once per split and `k` rather than
+  once per run. Remote statistics are indexed in a local temporary directory
+  and the new files copied back. The index is also kept for the lifetime of
+  the process.
+
+  Args:
+    path: The `.npz` path, see `real_statistics_path`.
+    k: The number of nearest neighbours defining each ball.
+
+  Returns:
+    A `tfgan.eval.NearestNeighborIndex` backed by read-only memory maps.
+  """
+  if (path, k) in _REAL_NEAREST_NEIGHBOR_INDEXES:
+    return _REAL_NEAREST_NEIGHBOR_INDEXES[(path, k)]
+  prefix = _sidecar_path(path, '_knn_')
+  local_prefix = local_scratch_prefix(path) + '_knn_'
+  filenames = ['activations.npy', 'radii_k%i.npy' % k]
+  if local_prefix != prefix:
+    for filename in filenames:
+      if tf.io.gfile.exists(prefix + filename):
+        tf.io.gfile.copy(prefix + filename, local_prefix + filename)
+  if not os.path.exists(local_prefix + filenames[0]):
+    tf.compat.v1.logging.info('Writing the real k-NN index to %s' % prefix)
+    statistics = load_real_statistics(path)
+    tfgan.eval.write_nearest_neighbor_activations(
+        local_prefix, iterate_real_activations(path),
+        int(statistics['num_examples']), statistics['mean'].shape[0])
+  index = tfgan.eval.NearestNeighborIndex.load(local_prefix, k)
+  if local_prefix != prefix:
+    for filename in filenames:
+      if not tf.io.gfile.exists(prefix + filename):
+        tf.io.gfile.copy(local_prefix + filename, prefix + filename)
+  _REAL_NEAREST_NEIGHBOR_INDEXES[(path, k)] = index
+  return index
+
+
+def maybe_load_real_statistics(split=None):
+  """Returns the cached real statistics for the flag configuration, or None.
+
+  Statistics are looked up in `--real_stats_dir` for `split`, by default the
+  validation split, of `--dataset_name` at `--image_size`. Returns `None` if
+  the flag is unset.
+  """
+  if flags.FLAGS.real_stats_dir is None:
+    return None
+  return load_real_statistics(real_statistics_path(
+      flags.FLAGS.real_stats_dir, flags.FLAGS.dataset_name,
+      split or flags.FLAGS.dataset_val_split_name, flags.FLAGS.image_size))
+
+
+def local_scratch_prefix(path):
+  """Returns a local prefix for the sidecar files of the `.npz` at `path`.
+
+  If `path` is on the local filesystem the sidecars are written in place,
+  otherwise into a fresh temporary directory that `save_real_statistics` copies
+  from.
+  """
+  if '://' not in path:
+    out_dir = os.path.dirname(path)
+    if out_dir and not tf.io.gfile.exists(out_dir):
+      tf.io.gfile.makedirs(out_dir)
+    return _sidecar_path(path, '')
+  return os.path.join(tempfile.mkdtemp(), os.path.basename(path)[:-len('.npz')])
+
+
+def remove_scratch_prefix(scratch_prefix, path):
+  """Removes the temporary directory created by `local_scratch_prefix`."""
+  if scratch_prefix != _sidecar_path(path, ''):
+    shutil.rmtree(os.path.dirname(scratch_prefix), ignore_errors=True)
+
+
+def write_eval_summaries(output_dir, step, values):
+  """Writes eval results as TensorBoard summaries at `step`.
+
+  Args:
+    output_dir: The summary directory, e.g. `model_dir/eval_continuous`.
+    step: The global step of the evaluated checkpoint.
+    values: A dict from tag to a python/numpy scalar or to a serialized
+      `Summary` proto, as produced by `tf.compat.v1.summary.image`.
+  """
+  writer = tf.compat.v1.summary.FileWriter(output_dir)
+  summary = tf.compat.v1.Summary()
+  for tag, value in values.items():
+    if isinstance(value, bytes):
+      writer.add_summary(tf.compat.v1.Summary.FromString(value), step)
+    elif np.ndim(value) == 0:
+      summary.value.add(tag=tag, simple_value=float(value))
+  writer.add_summary(summary, step)
+  writer.close()
+
+
+class WarmEvaluator(object):
+  """Evaluates a sequence of checkpoints with one graph and one session.
+
+  `estimator.evaluate` rebuilds the graph, reloads the Inception module and
+  recreates the input pipeline for every checkpoint. This builds the eval graph
+  of a GANEstimator once, and for each checkpoint only restores the generator
+  and discriminator weights, resets the streaming metrics and rewinds the
+  input pipeline.
+  """
+
+  def __init__(self, estimator, input_fn, num_eval_steps, name):
+    """Builds the eval graph.
+
+    Args:
+      estimator: A tfgan.estimator.GANEstimator.
+      input_fn: The `(mode, params)` input_fn passed to `estimator.evaluate`.
+      num_eval_steps: The number of batches to evaluate per checkpoint.
+      name: The eval name, summaries go to `model_dir/eval_<name>`.
+    """
+    self._num_eval_steps = num_eval_steps
+    self._output_dir = os.path.join(estimator.model_dir, 'eval_' + name)
+    self._graph = tf.Graph()
+    with self._graph.as_default():
+      global_step = tf.compat.v1.train.get_or_create_global_step()
+      ds = input_fn(tf.estimator.ModeKeys.EVAL, estimator.params)
+      self._iterator = tf.compat.v1.data.make_initializable_iterator(ds)
+      features, labels = self._iterator.get_next()
+      spec = estimator.model_fn(features, labels, tf.estimator.ModeKeys.EVAL,
+                                estimator.config)
+      self._values = {k: v[0] for k, v in spec.eval_metric_ops.items()}
+      self._values['global_step'] = global_step
+      self._update_op = tf.group(
+          *[v[1] for v in spec.eval_metric_ops.values()])
+      model_variables = (
+          tf.compat.v1.get_collection(
+              tf.compat.v1.GraphKeys.GLOBAL_VARIABLES, 'Generator') +
+          tf.compat.v1.get_collection(
+              tf.compat.v1.GraphKeys.GLOBAL_VARIABLES, 'Discriminator'))
+      self._saver = tf.compat.v1.train.Saver(
+          var_list=model_variables + [global_step])
+      self._reset_ops = [self._iterator.initializer,
+                         tf.compat.v1.local_variables_initializer()]
+      self._sess = tf.compat.v1.Session(config=estimator.config.session_config)
+      initialize_session(self._sess)
+    self._graph.finalize()
+
+  def evaluate(self, checkpoint_path):
+    """Evaluates one checkpoint and writes its summaries.
+
+    Args:
+      checkpoint_path: The checkpoint to restore.
+
+    Returns:
+      A dict of the eval metric values, including 'global_step'.
+    """
+    self._saver.restore(self._sess, checkpoint_path)
+    self._sess.run(self._reset_ops)
+    for _ in range(self._num_eval_steps):
+      self._sess.run(self._update_op)
+    results = self._sess.run(self._values)
+    write_eval_summaries(self._output_dir, results['global_step'], results)
+    tf.compat.v1.logging.info('Eval results at step %i: %s' % (
+        results['global_step'],
+        ', '.join('%s = %s' % (k, v) for k, v in sorted(results.items())
+                  if not isinstance(v, bytes))))
+    return results
+
+  def close(self):
+    self._sess.close()
+
+
 def print_debug_statistics(image, labels, dbg_messge_prefix, on_tpu):
   """Adds a Print directive to an image tensor which prints debug statistics."""
   if on_tpu:
@@ -137,9 +588,36 @@ def log_and_summarize_variables(var_list, dbg_messge, on_tpu):
       for var in sigma_ratio_vars:
         tf.compat.v1.summary.scalar('sigma_ratio_vars/' + var.name, var)
 
+def predict_batches(estimator, input_fn, checkpoint_path=None):
+  """Yields whole batches of generated images from `estimator.predict`.
+
+  Args:
+    estimator: An object of type tfgan.estimator.GANEstimator or
+      tfgan.estimator.TPUGANEstimator for performing the predictions.
+    input_fn: An input_fn function to be used by `estimator.predict`.
+    checkpoint_path: The checkpoint to use, or `None` for the latest.
+
+  Yields:
+    Numpy arrays of generated images of shape [batch_size, H, W, 3].
+  """
+  predictions = estimator.predict(
+      input_fn, checkpoint_path=checkpoint_path, yield_single_examples=False)
+  for batch in predictions:
+    if isinstance(estimator, tfgan.estimator.TPUGANEstimator):
+      batch = batch['generated_data']
+    if isinstance(batch, dict):  # --gen_images_with_margins
+      batch = batch['images']
+    yield batch
+
+
 def predict_and_write_images(estimator, input_fn, model_dir, filename_suffix):
   """Generates images and write them to the model dir.
 
+  Predictions are fetched a batch at a time. Tiling, uint8 conversion and
+  encoding of each grid happen on a pool of `--image_export_workers` threads,
+  with at most twice as many grids in flight, so memory stays flat however many
+  grids are written.
+
   Args:
     estimator: An object of type tfgan.estimator.GANEstimator or
       tfgan.estimator.TPUGANEstimator for performing the predictions.
@@ -147,6 +625,9 @@ def predict_and_write_images(estimator, input_fn, model_dir, filename_suffix):
     model_dir: The model directory (the images will be saved inside an 'images'
       subdirectory).
     filename_suffix: A suffix to append to the image file names.
+
+  Raises:
+    ValueError: If the predictions run out before all grids are filled.
   """
   # Generate images.
   side = 8
@@ -154,28 +635,56 @@ def predict_and_write_images(estimator, input_fn, model_dir, filename_suffix):
   if flags.FLAGS.mode == 'gen_images' and flags.FLAGS.n_images_per_side_to_gen_per_tile is not None:
     side = flags.FLAGS.n_images_per_side_to_gen_per_tile
     number = flags.FLAGS.num_classes
-  image_iterator = estimator.predict(input_fn)
-  for n in range(number):
-    if isinstance(estimator, tfgan.estimator.TPUGANEstimator):
-      predictions = np.array(
-          [next(image_iterator)['generated_data'] for _ in range(side*side)])
-    else:
-      predictions = np.array([next(image_iterator) for _ in range(side*side)])
-    
-    # Write images to disk.
-    output_dir = os.path.join(model_dir, 'images')
-    if not tf.io.gfile.exists(output_dir):
-      tf.io.gfile.makedirs(output_dir)
-    # Generate a grid of images and write it to disk.
-    image_grid = tfgan.eval.python_image_grid(predictions, grid_shape=(side, side))
-    grid_fname = os.path.join(output_dir, 'grid_{:04d}_{}.png'.format(n, filename_suffix) )
-    _write_image_to_disk(image_grid, grid_fname)
-
-
-def _write_image_to_disk(image, filename):
-  with tf.io.gfile.GFile(filename, 'w') as f:
-    # Convert tiled_image from float32 in [-1, 1] to unit8 [0, 255].
-    img_np = (255 / 2.0) * (image + 1.0)
-    pil_image = PIL.Image.fromarray(img_np.astype(np.uint8))
-    pil_image.convert('RGB').save(f, 'PNG')
+  grid_size = side * side
+  image_format = flags.FLAGS.image_export_format
+
+  output_dir = os.path.join(model_dir, 'images')
+  if not tf.io.gfile.exists(output_dir):
+    tf.io.gfile.makedirs(output_dir)
+
+  num_workers = flags.FLAGS.image_export_workers
+  pending = collections.deque()
+  buffered = []
+  num_buffered = 0
+  n = 0
+  with futures.ThreadPoolExecutor(max_workers=num_workers) as pool:
+    for batch in predict_batches(estimator, input_fn):
+      buffered.append(batch)
+      num_buffered += batch.shape[0]
+      while num_buffered >= grid_size and n < number:
+        images = np.concatenate(buffered, axis=0)
+        buffered = [images[grid_size:]]
+        num_buffered -= grid_size
+        grid_fname = os.path.join(output_dir, 'grid_{:04d}_{}.{}'.format(
+            n, filename_suffix, image_format))
+        # Bound the number of grids held in memory.
+        if len(pending) >= 2 * num_workers:
+          pending.popleft().result()
+        pending.append(pool.submit(
+            _write_grid_to_disk, images[:grid_size], side, grid_fname,
+            image_format))
+        n += 1
+      if n >= number:
+        break
+    for future in pending:
+      future.result()
+  if n < number:
+    raise ValueError('The predictions ran out after %i of %i grids of %i '
+                     'images.' % (n, number, grid_size))
+
+
+def _write_grid_to_disk(images, side, filename, image_format):
+  # Generate a grid of images and write it to disk.
+  image_grid = tfgan.eval.python_image_grid(images, grid_shape=(side, side))
+  _write_image_to_disk(image_grid, filename, image_format)
+
+
+def _write_image_to_disk(image, filename, image_format='png'):
+  # Convert tiled_image from float32 in [-1, 1] to unit8 [0, 255].
+  img_np = (255 / 2.0) * (image + 1.0)
+  pil_image = PIL.Image.fromarray(img_np.astype(np.uint8))
+  buf = io.BytesIO()
+  pil_image.convert('RGB').save(buf, image_format.upper())
+  with tf.io.gfile.GFile(filename, 'wb') as f:
+    f.write(buf.getvalue())
   tf.compat.v1.logging.info('Wrote output to: %s', filename)
@@ -19,7 +19,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
 import numpy as np
+from PIL import Image
 import tensorflow as tf
 
 from tensorflow_gan.examples.self_attention_estimator import eval_lib
@@ -47,6 +50,92 @@ class EvalLibTest(tf.test.TestCase):
         batch_size=4, num_batches=3)
     real_pools.shape.assert_is_compatible_with([4 * 3, 2048])
 
+  @mock.patch.object(eval_lib.tfgan.eval, 'sample_and_run_inception',
+                     autospec=True)
+  def test_get_activations_num_splits(self, mock_inception):
+    mock_inception.return_value = {'logits': None, 'pool_3': None}
+    images = tf.zeros([6, 8, 8, 3])
+    eval_lib.get_activations(lambda: images, num_batches=1, num_splits=3)
+    kwargs = mock_inception.call_args[1]
+    self.assertLen(kwargs['sample_inputs'], 3)
+    for part in kwargs['sample_inputs']:
+      self.assertEqual([2, 8, 8, 3], part.shape.as_list())
+    self.assertIs(images, kwargs['sample_fn'](images))
+
+  def test_activation_shard_writer(self):
+    writer = eval_lib.ActivationShardWriter(
+        self.get_temp_dir() + '/', shard_size=4)
+    for i in range(5):
+      writer.append(pool_3=np.full([2, 3], i), labels=np.full([2], i))
+    writer.flush()
+
+    self.assertLen(writer.files['pool_3'], 3)
+    self.assertLen(writer.files['labels'], 3)
+    pools = np.concatenate([np.load(f) for f in writer.files['pool_3']])
+    labels = np.concatenate([np.load(f) for f in writer.files['labels']])
+    self.assertAllEqual(np.repeat(np.arange(5), 2), labels)
+    self.assertAllEqual(labels, pools[:, 0])
+    self.assertAllEqual([4, 3], np.load(writer.files['pool_3'][0]).shape)
+
+  @mock.patch.object(eval_lib, 'predict_batches', autospec=True)
+  def test_predict_and_write_images_runs_out(self, mock_predict):
+    # One batch of 16 images, not enough for one 8x8 grid.
+    mock_predict.return_value = iter([np.zeros([16, 4, 4, 3])])
+    with mock.patch.object(eval_lib.flags, 'FLAGS') as mock_flags:
+      mock_flags.mode = 'train'
+      mock_flags.image_export_format = 'png'
+      mock_flags.image_export_workers = 1
+      with self.assertRaisesRegexp(ValueError, 'after 0 of 1 grids'):
+        eval_lib.predict_and_write_images(
+            None, None, self.get_temp_dir(), 'suffix')
+
+  def test_write_grid_to_disk(self):
+    for image_format in ['png', 'jpeg']:
+      fname = os.path.join(self.get_temp_dir(), 'grid.' + image_format)
+      eval_lib._write_grid_to_disk(
+          np.zeros([4, 8, 8, 3]), 2, fname, image_format)
+      with Image.open(fname) as image:
+        self.assertEqual(image_format.upper(), image.format)
+        self.assertEqual((16, 16), image.size)
+
+  def test_write_eval_summaries(self):
+    out_dir = os.path.join(self.get_temp_dir(), 'eval_continuous')
+    image_summary = tf.compat.v1.Summary(value=[
+        tf.compat.v1.Summary.Value(tag='generated')]).SerializeToString()
+    eval_lib.write_eval_summaries(
+        out_dir, 7, {'eval/fid': np.float32(1.5), 'eval/images': image_summary})
+
+    tags = {}
+    for event_file in tf.io.gfile.glob(os.path.join(out_dir, 'events*')):
+      for event in tf.compat.v1.train.summary_iterator(event_file):
+        for value in event.summary.value:
+          self.assertEqual(7, event.step)
+          tags[value.tag] = value.simple_value
+    self.assertAllClose(1.5, tags['eval/fid'])
+    self.assertIn('generated', tags)
+
+  def test_real_statistics_round_trip(self):
+    out_dir = self.get_temp_dir()
+    path = eval_lib.real_statistics_path(out_dir, 'imagenet2012', 'validation',
+                                         32)
+    prefix = eval_lib.local_scratch_prefix(path)
+    rs = np.random.RandomState(0)
+    moments = eval_lib.tfgan.eval.ClasswiseStreamingMoments(
+        2, 4, scatter_path=prefix + '_class_covariance.npy')
+    moments.update(rs.normal(size=[10, 4]), np.arange(10) % 2)
+    statistics = moments.finalize()
+    statistics['inception_score'] = 1.5
+    eval_lib.save_real_statistics(path, statistics, 'imagenet2012',
+                                  'validation', 32)
+    eval_lib.remove_scratch_prefix(prefix, path)
+
+    loaded = eval_lib.load_real_statistics(path)
+    self.assertEqual(10, loaded['num_examples'])
+    self.assertAllClose(statistics['covariance'], loaded['covariance'])
+    self.assertAllClose(statistics['class_covariances'],
+                        loaded['class_covariances'])
+    self.assertAllClose(1.5, loaded['inception_score'])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -36,6 +36,69 @@ def make_z_normal(num_batches, batch_size, z_dim):
   z = tf.random.normal(shape, name='z0', dtype=tf.float32)
   return z
 
+def make_sample_seeds(seed, first_sample, batch_size):
+  """Make the seeds of one batch for the counter-based stateless RNG.
+
+  Row `i` of the batch is `[seed, first_sample + i]`, so any slice of the
+  batch, e.g. the part a TPU core receives, knows the index of its first
+  sample. The seeds are int32 so they can be fed to a TPU, and the sample
+  index wraps around after 2**32 samples.
+
+  Args:
+    seed: The user seed, an int or int32 scalar tensor.
+    first_sample: The int64 index of the first sample of the batch.
+    batch_size: The number of samples in the batch.
+  Returns:
+    seeds: An int32 tensor of shape [batch_size, 2].
+  """
+  sample_index = (tf.cast(first_sample, tf.int64) +
+                  tf.range(batch_size, dtype=tf.int64))
+  return tf.stack([
+      tf.fill([batch_size], tf.cast(seed, tf.int32)),
+      tf.cast(sample_index, tf.int32)
+  ], axis=1)
+
+def make_z_stateless(seeds, z_dim):
+  """Make the noise of a block of samples with the counter-based stateless RNG.
+
+  The whole block is drawn by one stateless op seeded by its first row, so
+  the noise of a sample is regenerated by drawing its block again, on the
+  host or on the device.
+
+  Args:
+    seeds: An int32 tensor of shape [batch_size, 2], see `make_sample_seeds`.
+    z_dim: The dimension of the z (noise) vector.
+  Returns:
+    z: A float32 tensor of shape [batch_size, z_dim].
+  """
+  return tf.random.stateless_normal(
+      [_num_rows(seeds), z_dim], seed=_stateless_stream_seed(seeds[0], 0),
+      name='z0')
+
+def make_class_labels_stateless(seeds, num_classes):
+  """Generate uniform class labels for a block of samples.
+
+  Args:
+    seeds: An int32 tensor of shape [batch_size, 2], see `make_sample_seeds`.
+      The labels are independent of the noise sampled from the same seeds.
+    num_classes: The number of classes.
+  Returns:
+    An int32 tensor of shape [batch_size].
+  """
+  return tf.random.stateless_uniform(
+      [_num_rows(seeds)], seed=_stateless_stream_seed(seeds[0], 1), minval=0,
+      maxval=num_classes, dtype=tf.int32)
+
+def _num_rows(tensor):
+  """The static number of rows of `tensor` if known, as on TPU."""
+  return (tf.compat.dimension_value(tensor.shape[0]) or
+          tf.shape(input=tensor)[0])
+
+def _stateless_stream_seed(seed, stream):
+  """Derives the seed of one of two independent streams from a seed."""
+  seed = tf.cast(seed, tf.int64)
+  return tf.stack([2 * seed[0] + stream, seed[1]])
+
 def make_one_batch_constant_labels(batch_size, y):
   """Generate class labels for generation."""
   gen_class_logits = y*tf.ones((batch_size,), dtype=tf.int32)
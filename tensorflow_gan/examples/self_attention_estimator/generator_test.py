@@ -49,6 +49,28 @@ class GeneratorTest(tf.test.TestCase):
     self.assertAllInRange(images_np, -1.0, 1.0)
     self.assertIsInstance(var_list, list)
 
+  def test_stateless_inputs_depend_only_on_seed(self):
+    seeds = [generator.make_sample_seeds(7, 3, 500),
+             generator.make_sample_seeds(7, 3, 500),
+             generator.make_sample_seeds(7, 4, 500),
+             generator.make_sample_seeds(8, 3, 500)]
+    zs = [generator.make_z_stateless(seed, 8) for seed in seeds]
+    labels = [generator.make_class_labels_stateless(seed, 10)
+              for seed in seeds]
+    with self.cached_session() as sess:
+      seeds, zs, labels = sess.run([seeds, zs, labels])
+    self.assertEqual(np.int32, seeds[0].dtype)
+    self.assertAllEqual([7, 3], seeds[0][0])
+    self.assertEqual((500, 8), zs[0].shape)
+    self.assertAllEqual(zs[0], zs[1])
+    self.assertAllEqual(labels[0], labels[1])
+    # A block is seeded by the index of its first sample and the user seed.
+    self.assertNotAllClose(zs[0], zs[2])
+    self.assertNotAllClose(zs[0], zs[3])
+    self.assertLen(np.unique(zs[0][:, 0]), 500)
+    self.assertAllInRange(labels[0], 0, 9)
+    self.assertLen(np.unique(labels[0]), 10)
+
   def test_usample_shapes(self):
     """Tests that upsampling has the desired effect on shape."""
     image = tf.random.normal([10, 32, 32, 3])
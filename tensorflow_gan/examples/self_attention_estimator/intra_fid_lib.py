@@ -0,0 +1,540 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Single-pass intra-FID evaluation for the self-attention GAN.
+
+Instead of one `estimator.evaluate` per chunk of classes, the real data is read
+once and the generator is sampled once in class order. Every activation is
+routed to the moments of its class, and the per-class Frechet distances are
+computed at the end, a batch of classes at a time. The same class-ordered
+generation pass can also be dumped to disk for offline metrics.
+
+The classes can be split into contiguous ranges evaluated by independent
+processes, or shards. Every shard writes the per-class statistics and FIDs of
+its classes to a shard directory, and `reduce_intra_fid_shards` merges them.
+`run_shard_processes` runs the shards as local subprocesses.
+
+Per-class FIDs are kept in an `IntraFidTable`, a CSV that is rewritten after
+every batch of classes, so an interrupted evaluation can resume with the
+classes that are missing from it.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from concurrent import futures
+import csv
+import io
+import os
+import queue
+import subprocess
+import sys
+
+import numpy as np
+
+import tensorflow as tf
+from tensorflow_gan.examples.self_attention_estimator import eval_lib
+from tensorflow_gan.examples.self_attention_estimator import generator as gen_module
+import tensorflow_gan as tfgan  # tf
+
+from absl import flags
+
+# The split the real per-class statistics are computed over. Chunked intra FID
+# reads it since `provide_dataset` forces it for `restrict_classes`, and the
+# validation split has too few images per class for full-rank covariances.
+REAL_SPLIT = 'train'
+
+
+def class_ordered_input_fn(mode, params, num_classes, images_per_class,
+                           first_class=0, seed=None):
+  """A predict input_fn that samples `images_per_class` images of each class.
+
+  Labels go through the classes in order, `images_per_class` at a time, and
+  then start over, so the label of the i-th prediction is
+  `first_class + (i // images_per_class) % num_classes`. The noise and labels
+  of each batch are sampled in one map over a counter, with the noise of batch
+  `b` drawn in one stateless op from `(seed, b * batch_size)`, so a fixed seed
+  gives the same samples in every run.
+
+  Args:
+    mode: The estimator mode, must be PREDICT.
+    params: The estimator params.
+    num_classes: The number of classes to sample.
+    images_per_class: The number of images to sample per class.
+    first_class: The label of the first class to sample.
+    seed: The seed of the noise, or `None` for a random one.
+
+  Returns:
+    A dataset of {'z': noise, 'labels': labels} batches.
+  """
+  del mode
+  if params['tpu_params'].use_tpu_estimator:
+    bs = params['batch_size']
+  else:
+    bs = params['predict_batch_size']
+
+  if seed is None:
+    seed = np.random.randint(1 << 30)
+
+  def _make_inputs(batch_index):
+    z = gen_module.make_z_stateless(
+        gen_module.make_sample_seeds(seed, batch_index * bs, bs),
+        params['z_dim'])
+    sample_index = batch_index * bs + tf.range(bs, dtype=tf.int64)
+    labels = first_class + (sample_index // images_per_class) % num_classes
+    return {'z': z, 'labels': tf.cast(labels, tf.int32)}
+
+  return tf.data.experimental.Counter().map(_make_inputs)
+
+
+class HostInception(object):
+  """Runs Inception on host-side image batches in a graph of its own.
+
+  The graph is separate from the estimator's, so it can be fed with the output
+  of `estimator.predict` while the predictions are still being generated.
+  """
+
+  def __init__(self, image_size):
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      self.images = tf.compat.v1.placeholder(
+          tf.float32, [None, image_size, image_size, 3])
+      self.logits, self.pools = eval_lib.get_activations(
+          lambda: self.images, num_batches=1, get_logits=True)
+      self.sess = tf.compat.v1.Session()
+      eval_lib.initialize_session(self.sess)
+
+  def run(self, images):
+    """Returns the (logits, pool_3) activations of a batch of images."""
+    return self.sess.run([self.logits, self.pools],
+                         feed_dict={self.images: images})
+
+  def close(self):
+    self.sess.close()
+
+
+def generate_class_ordered_activations(estimator, num_classes,
+                                       images_per_class, checkpoint_path=None,
+                                       first_class=0):
+  """Samples the generator once in class order and runs Inception on host.
+
+  Args:
+    estimator: A GANEstimator or TPUGANEstimator whose generator is conditioned
+      on {'z', 'labels'} features.
+    num_classes: The number of classes.
+    images_per_class: The number of images to generate per class.
+    checkpoint_path: The checkpoint to evaluate, or `None` for the latest.
+    first_class: The label of the first class to generate.
+
+  Yields:
+    Batches of (logits, pool_3, labels) numpy arrays, in total
+    `num_classes * images_per_class` rows. Labels are in
+    [first_class, first_class + num_classes).
+  """
+  def input_fn(mode, params):
+    return class_ordered_input_fn(
+        mode, params, num_classes, images_per_class, first_class,
+        flags.FLAGS.generator_input_seed)
+
+  inception = HostInception(flags.FLAGS.image_size)
+  total = num_classes * images_per_class
+  seen = 0
+  for images in eval_lib.predict_batches(estimator, input_fn,
+                                         checkpoint_path):
+    images = images[:total - seen]
+    labels = first_class + (np.arange(seen, seen + images.shape[0]) //
+                            images_per_class) % num_classes
+    logits, pools = inception.run(images)
+    yield logits, pools, labels
+    seen += images.shape[0]
+    if seen >= total:
+      break
+  inception.close()
+  tf.compat.v1.logging.info('Ran Inception on %i generated images.' % seen)
+
+
+def compute_generated_class_statistics(estimator, num_classes,
+                                       images_per_class, scratch_prefix,
+                                       checkpoint_path=None, first_class=0):
+  """Samples the generator once in class order and accumulates its moments.
+
+  Args:
+    estimator: A GANEstimator or TPUGANEstimator whose generator is conditioned
+      on {'z', 'labels'} features.
+    num_classes: The number of classes.
+    images_per_class: The number of images to generate per class.
+    scratch_prefix: A local path prefix for the memory-mapped per-class
+      covariances.
+    checkpoint_path: The checkpoint to evaluate, or `None` for the latest.
+    first_class: The label of the first class to generate. Row `i` of the
+      statistics is class `first_class + i`.
+
+  Returns:
+    A dict of statistics, see
+    `tfgan.eval.ClasswiseStreamingMoments.finalize`.
+  """
+  moments = None
+  for _, pools, labels in generate_class_ordered_activations(
+      estimator, num_classes, images_per_class, checkpoint_path,
+      first_class):
+    if moments is None:
+      moments = tfgan.eval.ClasswiseStreamingMoments(
+          num_classes, pools.shape[1],
+          scatter_path=scratch_prefix + '_class_covariance.npy')
+    moments.update(pools, labels - first_class)
+  return moments.finalize()
+
+
+def dump_generated_activations(estimator, num_classes, images_per_class,
+                               output_dir, shard_size, checkpoint_path=None):
+  """Writes Inception logits, pool_3 and labels of generated images to disk.
+
+  The arrays are written as row-aligned `.npy` shards named
+  `{logits,pool_3,labels}_shard_{index:05d}.npy` in `output_dir`, for
+  `tfgan.eval.numpy_metrics` and other offline metric jobs.
+
+  Args:
+    estimator: A GANEstimator or TPUGANEstimator whose generator is conditioned
+      on {'z', 'labels'} features.
+    num_classes: The number of classes.
+    images_per_class: The number of images to generate per class.
+    output_dir: The directory to write the shards to.
+    shard_size: The number of images per shard.
+    checkpoint_path: The checkpoint to evaluate, or `None` for the latest.
+
+  Returns:
+    A dict from array name to the list of its shard files.
+  """
+  if not tf.io.gfile.exists(output_dir):
+    tf.io.gfile.makedirs(output_dir)
+  writer = eval_lib.ActivationShardWriter(
+      os.path.join(output_dir, ''), shard_size)
+  for logits, pools, labels in generate_class_ordered_activations(
+      estimator, num_classes, images_per_class, checkpoint_path):
+    writer.append(logits=logits, pool_3=pools, labels=labels.astype(np.int32))
+  writer.flush()
+  tf.compat.v1.logging.info('Wrote generated activations to: %s' % output_dir)
+  return dict(writer.files)
+
+
+def intra_fid_from_statistics(real_statistics, generated_statistics,
+                              class_batch_size, trace_sqrt_method='svd',
+                              trace_sqrt_precision=tf.float64, classes=None,
+                              callback=None):
+  """Computes the Frechet distance of every class from per-class moments.
+
+  Args:
+    real_statistics: A dict with 'class_means', 'class_covariances' and
+      'class_counts', e.g. from `eval_lib.compute_real_statistics`.
+    generated_statistics: A dict with the same fields for generated images.
+    class_batch_size: The number of classes whose matrix square roots are
+      computed together.
+    trace_sqrt_method: 'svd' or 'eigh', see
+      `tfgan.eval.intra_class_frechet_classifier_distance_from_statistics`.
+    trace_sqrt_precision: tf.float32 or tf.float64, the dtype the matrix
+      square roots are computed in.
+    classes: If not None, only compute the FIDs of these classes, e.g. those
+      missing from an `IntraFidTable`.
+    callback: If not None, called with the classes and FIDs of every batch
+      once they are computed, e.g. `IntraFidTable.update`.
+
+  Returns:
+    A float64 array of shape [num_classes] with the FID of each class. Classes
+    with fewer than two real or generated samples, or not in `classes`, are
+    NaN.
+  """
+  num_classes, dim = real_statistics['class_means'].shape
+  fids = np.full([num_classes], np.nan, dtype=np.float64)
+  with tf.Graph().as_default():
+    m = tf.compat.v1.placeholder(tf.float64, [None, dim])
+    sigma = tf.compat.v1.placeholder(tf.float64, [None, dim, dim])
+    m_w = tf.compat.v1.placeholder(tf.float64, [None, dim])
+    sigma_w = tf.compat.v1.placeholder(tf.float64, [None, dim, dim])
+    fid = tfgan.eval.intra_class_frechet_classifier_distance_from_statistics(
+        m, sigma, m_w, sigma_w, trace_sqrt_method=trace_sqrt_method,
+        trace_sqrt_precision=trace_sqrt_precision)
+    valid = np.logical_and(real_statistics['class_counts'] > 1,
+                           generated_statistics['class_counts'] > 1)
+    if classes is None:
+      classes = np.arange(num_classes)
+    classes = np.asarray(classes, dtype=np.int64)
+    if callback is not None:
+      # Classes that have no FID are done without running anything.
+      callback(classes[~valid[classes]], fids[classes[~valid[classes]]])
+    classes = classes[valid[classes]]
+    with tf.compat.v1.Session() as sess:
+      for start in range(0, classes.shape[0], class_batch_size):
+        batch = classes[start:start + class_batch_size]
+        fids[batch] = sess.run(fid, feed_dict={
+            m: real_statistics['class_means'][batch],
+            sigma: real_statistics['class_covariances'][batch],
+            m_w: generated_statistics['class_means'][batch],
+            sigma_w: generated_statistics['class_covariances'][batch],
+        })
+        if callback is not None:
+          callback(batch, fids[batch])
+        tf.compat.v1.logging.info('Computed intra FID of %i/%i classes.' % (
+            start + batch.shape[0], classes.shape[0]))
+  return fids
+
+
+class IntraFidTable(object):
+  """Per-class FIDs that are written to a CSV file after every update.
+
+  The file has a header and one `class,fid` row per class with a result,
+  sorted by class. Classes without enough samples have a 'nan' FID and count
+  as done.
+  """
+
+  def __init__(self, path, resume=True):
+    """Reads the FIDs of an earlier run from `path` if `resume`."""
+    self.path = path
+    self.fids = {}
+    if resume and tf.io.gfile.exists(path):
+      with tf.io.gfile.GFile(path, 'r') as f:
+        for row in csv.DictReader(f):
+          self.fids[int(row['class'])] = float(row['fid'])
+      tf.compat.v1.logging.info('Resuming intra FID with %i classes from %s' % (
+          len(self.fids), path))
+
+  def done(self, classes):
+    """Whether all `classes` have a FID."""
+    return all(int(c) in self.fids for c in classes)
+
+  def missing(self, num_classes):
+    """Returns the classes in [0, num_classes) without a FID."""
+    return [c for c in range(num_classes) if c not in self.fids]
+
+  def update(self, classes, fids):
+    """Adds the FIDs of `classes` and rewrites the file."""
+    for c, fid in zip(classes, fids):
+      self.fids[int(c)] = float(fid)
+    out_dir = os.path.dirname(self.path)
+    if out_dir and not tf.io.gfile.exists(out_dir):
+      tf.io.gfile.makedirs(out_dir)
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(['class', 'fid'])
+    for c in sorted(self.fids):
+      writer.writerow([c, repr(self.fids[c])])
+    tmp_path = self.path + '.tmp'
+    with tf.io.gfile.GFile(tmp_path, 'w') as f:
+      f.write(buf.getvalue())
+    tf.io.gfile.rename(tmp_path, self.path, overwrite=True)
+
+  def to_array(self, num_classes):
+    """Returns the FIDs as a [num_classes] array, NaN where missing."""
+    fids = np.full([num_classes], np.nan, dtype=np.float64)
+    for c, fid in self.fids.items():
+      fids[c] = fid
+    return fids
+
+
+def save_class_statistics(prefix, statistics):
+  """Writes the per-class statistics of generated images to resume from.
+
+  The counts and means go into `prefix + '.npz'`, the memory-mapped
+  covariances are copied to `prefix + '_class_covariance.npy'`.
+  """
+  out_dir = os.path.dirname(prefix)
+  if out_dir and not tf.io.gfile.exists(out_dir):
+    tf.io.gfile.makedirs(out_dir)
+  covariance_path = prefix + '_class_covariance.npy'
+  src = statistics['class_covariances'].filename
+  if os.path.abspath(src) != os.path.abspath(covariance_path):
+    tf.io.gfile.copy(src, covariance_path, overwrite=True)
+  buf = io.BytesIO()
+  np.savez(buf, class_counts=statistics['class_counts'],
+           class_means=statistics['class_means'])
+  # The `.npz` goes last and marks the statistics as complete.
+  with tf.io.gfile.GFile(prefix + '.npz', 'wb') as f:
+    f.write(buf.getvalue())
+
+
+def load_class_statistics(prefix, scratch_prefix):
+  """Loads statistics written by `save_class_statistics`, or returns `None`.
+
+  Args:
+    prefix: The prefix the statistics were saved with.
+    scratch_prefix: A local path prefix to copy remote covariances to, so they
+      can be memory-mapped.
+
+  Returns:
+    A dict with 'class_counts', 'class_means' and memory-mapped
+    'class_covariances', or `None` if there are no complete statistics.
+  """
+  if not tf.io.gfile.exists(prefix + '.npz'):
+    return None
+  with tf.io.gfile.GFile(prefix + '.npz', 'rb') as f:
+    statistics = dict(np.load(io.BytesIO(f.read())))
+  covariance_path = prefix + '_class_covariance.npy'
+  if not os.path.exists(covariance_path):
+    local_path = scratch_prefix + '_class_covariance.npy'
+    tf.io.gfile.copy(covariance_path, local_path, overwrite=True)
+    covariance_path = local_path
+  statistics['class_covariances'] = np.load(covariance_path, mmap_mode='r')
+  return statistics
+
+
+def check_num_shards(num_classes, num_shards):
+  """Raises a ValueError unless every one of `num_shards` shards has a class."""
+  if not 1 <= num_shards <= num_classes:
+    raise ValueError('num_shards must be in [1, %i], the number of classes, '
+                     'got %i.' % (num_classes, num_shards))
+
+
+def shard_classes(num_classes, num_shards, shard_index):
+  """Returns the contiguous range of classes evaluated by one shard.
+
+  The ranges of all shards are disjoint, non-empty, cover all classes and
+  differ in size by at most one class.
+
+  Raises:
+    ValueError: If `num_shards` is larger than `num_classes`, or
+      `shard_index` is not in [0, num_shards).
+  """
+  check_num_shards(num_classes, num_shards)
+  if not 0 <= shard_index < num_shards:
+    raise ValueError('shard_index must be in [0, %i), got %i.' % (
+        num_shards, shard_index))
+  return range(num_classes * shard_index // num_shards,
+               num_classes * (shard_index + 1) // num_shards)
+
+
+def shard_path(shard_dir, num_shards, shard_index):
+  return os.path.join(shard_dir, 'intra_fid_shard_{:05d}_of_{:05d}.npz'.format(
+      shard_index, num_shards))
+
+
+def write_intra_fid_shard(path, classes, fids, generated_statistics):
+  """Writes the per-class results of one shard for `reduce_intra_fid_shards`.
+
+  The generated covariances are not kept: the matrix square roots, which
+  dominate the cost, are already reduced to `fids` in the shard.
+
+  Args:
+    path: The `.npz` path, see `shard_path`.
+    classes: The range of classes of the shard.
+    fids: The FID of each class of the shard.
+    generated_statistics: The statistics of the generated images of the
+      shard's classes, from `compute_generated_class_statistics`.
+  """
+  buf = io.BytesIO()
+  np.savez(
+      buf,
+      classes=np.arange(classes.start, classes.stop),
+      fids=fids,
+      class_counts=generated_statistics['class_counts'],
+      class_means=generated_statistics['class_means'])
+  tmp_path = path + '.tmp'
+  with tf.io.gfile.GFile(tmp_path, 'wb') as f:
+    f.write(buf.getvalue())
+  tf.io.gfile.rename(tmp_path, path, overwrite=True)
+  tf.compat.v1.logging.info('Wrote intra FID shard to: %s' % path)
+
+
+def reduce_intra_fid_shards(shard_dir, num_classes, num_shards):
+  """Merges the shards written by `write_intra_fid_shard`.
+
+  Args:
+    shard_dir: The directory the shards were written to.
+    num_classes: The total number of classes.
+    num_shards: The number of shards.
+
+  Returns:
+    A dict with the per-class 'fids', generated 'class_counts' and generated
+    'class_means' of all classes.
+
+  Raises:
+    IOError: If a shard is missing.
+    ValueError: If the shards do not cover every class exactly once.
+  """
+  merged = None
+  covered = np.zeros([num_classes], dtype=np.int64)
+  for shard_index in range(num_shards):
+    path = shard_path(shard_dir, num_shards, shard_index)
+    if not tf.io.gfile.exists(path):
+      raise IOError('Intra FID shard %i/%i is missing: %s' % (
+          shard_index, num_shards, path))
+    with tf.io.gfile.GFile(path, 'rb') as f:
+      shard = dict(np.load(io.BytesIO(f.read())))
+    if merged is None:
+      merged = {
+          'fids': np.full([num_classes], np.nan, dtype=np.float64),
+          'class_counts': np.zeros([num_classes], dtype=np.int64),
+          'class_means': np.zeros(
+              [num_classes, shard['class_means'].shape[1]], dtype=np.float64),
+      }
+    classes = shard['classes']
+    covered[classes] += 1
+    for key in merged:
+      merged[key][classes] = shard[key]
+  if np.any(covered != 1):
+    raise ValueError(
+        'Intra FID shards cover classes %s not exactly once.' %
+        np.flatnonzero(covered != 1).tolist())
+  return merged
+
+
+def run_shard_processes(module, args, num_shards, num_workers, devices=None):
+  """Runs every shard of an intra FID evaluation as a local subprocess.
+
+  Each shard runs `python -m <module>` with `args` and
+  `--num_shards=<num_shards> --shard_index=<index>` appended, at most
+  `num_workers` at a time. With `devices`, every running shard sees only one
+  of them as its GPU, and at most one shard runs per device, so that shards
+  never share an accelerator.
+
+  Args:
+    module: The name of the main module of the program. It is run with `-m`
+      since `sys.argv[0]` is not a runnable script when the program was
+      started with `python -m` or through a console script.
+    args: The flags of the current program, e.g. `sys.argv[1:]`.
+    num_shards: The number of shards.
+    num_workers: The number of shards to run at the same time.
+    devices: An optional list of the ids of the local GPUs to run shards on.
+
+  Raises:
+    RuntimeError: If a shard process fails.
+  """
+  free_devices = None
+  if devices:
+    num_workers = min(num_workers, len(devices))
+    free_devices = queue.Queue()
+    for device in devices:
+      free_devices.put(device)
+
+  def _run(shard_index):
+    command = [sys.executable, '-m', module] + list(args) + [
+        '--num_shards=%i' % num_shards, '--shard_index=%i' % shard_index,
+        '--intra_fid_local_workers=0']
+    env = dict(os.environ)
+    device = None if free_devices is None else free_devices.get()
+    if device is not None:
+      env['CUDA_VISIBLE_DEVICES'] = str(device)
+    tf.compat.v1.logging.info('Starting intra FID shard %i/%i.' % (
+        shard_index, num_shards))
+    try:
+      return shard_index, subprocess.call(command, env=env)
+    finally:
+      if device is not None:
+        free_devices.put(device)
+
+  with futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+    failed = [shard_index for shard_index, returncode in
+              executor.map(_run, range(num_shards)) if returncode]
+  if failed:
+    raise RuntimeError('Intra FID shards %s failed.' % failed)
@@ -0,0 +1,224 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for intra_fid_lib."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+
+import numpy as np
+from scipy import linalg as scp_linalg
+import tensorflow as tf
+
+from tensorflow_gan.examples.self_attention_estimator import intra_fid_lib
+import tensorflow_gan as tfgan  # tf
+
+mock = tf.compat.v1.test.mock
+
+_TPUParams = collections.namedtuple('TPUParams', ['use_tpu_estimator'])
+
+
+def _expected_fid(real, gen):
+  sigma = np.cov(real, rowvar=False)
+  sigma_v = np.cov(gen, rowvar=False)
+  sqcc = scp_linalg.sqrtm(np.dot(sigma, sigma_v))
+  mean = np.square(np.mean(real, axis=0) - np.mean(gen, axis=0)).sum()
+  return mean + np.trace(sigma + sigma_v - 2 * sqcc)
+
+
+def _class_statistics(activations, labels, num_classes):
+  moments = tfgan.eval.ClasswiseStreamingMoments(
+      num_classes, activations.shape[1])
+  moments.update(activations, labels)
+  return moments.finalize()
+
+
+class IntraFidLibTest(tf.test.TestCase):
+
+  def test_class_ordered_input_fn_labels(self):
+    params = {
+        'tpu_params': _TPUParams(use_tpu_estimator=False),
+        'predict_batch_size': 4,
+        'z_dim': 3,
+    }
+    ds = intra_fid_lib.class_ordered_input_fn(
+        tf.estimator.ModeKeys.PREDICT, params, num_classes=3,
+        images_per_class=2)
+    features = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    with self.cached_session() as sess:
+      labels = np.concatenate(
+          [sess.run(features['labels']) for _ in range(3)])
+    self.assertAllEqual([0, 0, 1, 1, 2, 2, 0, 0, 1, 1, 2, 2], labels)
+
+  def test_class_ordered_input_fn_first_class(self):
+    params = {
+        'tpu_params': _TPUParams(use_tpu_estimator=False),
+        'predict_batch_size': 4,
+        'z_dim': 3,
+    }
+    ds = intra_fid_lib.class_ordered_input_fn(
+        tf.estimator.ModeKeys.PREDICT, params, num_classes=2,
+        images_per_class=2, first_class=5)
+    features = tf.compat.v1.data.make_one_shot_iterator(ds).get_next()
+    with self.cached_session() as sess:
+      labels = np.concatenate(
+          [sess.run(features['labels']) for _ in range(2)])
+    self.assertAllEqual([5, 5, 6, 6, 5, 5, 6, 6], labels)
+
+  def test_class_ordered_input_fn_seed(self):
+    params = {
+        'tpu_params': _TPUParams(use_tpu_estimator=False),
+        'predict_batch_size': 4,
+        'z_dim': 3,
+    }
+
+    def _noise(seed):
+      ds = intra_fid_lib.class_ordered_input_fn(
+          tf.estimator.ModeKeys.PREDICT, params, num_classes=3,
+          images_per_class=2, seed=seed)
+      return tf.compat.v1.data.make_one_shot_iterator(ds).get_next()['z']
+
+    noise = [_noise(1), _noise(1), _noise(2)]
+    with self.cached_session() as sess:
+      first = sess.run(noise)
+      second = sess.run(noise)
+    self.assertAllEqual(first[0], first[1])
+    self.assertNotAllClose(first[0], first[2])
+    # Consecutive batches have different noise.
+    self.assertNotAllClose(first[0], second[0])
+    self.assertAllEqual(second[0], second[1])
+
+  def test_shard_classes(self):
+    shards = [intra_fid_lib.shard_classes(10, 3, i) for i in range(3)]
+    self.assertEqual([range(0, 3), range(3, 6), range(6, 10)], shards)
+    with self.assertRaises(ValueError):
+      intra_fid_lib.shard_classes(10, 3, 3)
+    # A shard without classes would have no statistics.
+    with self.assertRaisesRegexp(ValueError, 'num_shards'):
+      intra_fid_lib.shard_classes(2, 3, 0)
+
+  @mock.patch.object(intra_fid_lib.subprocess, 'call', autospec=True)
+  def test_run_shard_processes(self, mock_call):
+    mock_call.return_value = 0
+    intra_fid_lib.run_shard_processes(
+        'pkg.main', ['--mode=intra_fid_eval'], num_shards=3, num_workers=4,
+        devices=['2'])
+    self.assertEqual(3, mock_call.call_count)
+    for (command,), kwargs in mock_call.call_args_list:
+      self.assertEqual(['-m', 'pkg.main', '--mode=intra_fid_eval'],
+                       command[1:4])
+      # A single GPU runs one shard at a time.
+      self.assertEqual('2', kwargs['env']['CUDA_VISIBLE_DEVICES'])
+    self.assertCountEqual(
+        ['--shard_index=%i' % i for i in range(3)],
+        [args[0][5] for args, _ in mock_call.call_args_list])
+
+  def test_reduce_intra_fid_shards(self):
+    rs = np.random.RandomState(0)
+    num_classes = 5
+    shard_dir = self.get_temp_dir()
+    expected_fids = rs.uniform(size=[num_classes])
+    means = rs.normal(size=[num_classes, 4])
+    for shard_index in range(2):
+      classes = intra_fid_lib.shard_classes(num_classes, 2, shard_index)
+      sl = slice(classes.start, classes.stop)
+      intra_fid_lib.write_intra_fid_shard(
+          intra_fid_lib.shard_path(shard_dir, 2, shard_index), classes,
+          expected_fids[sl],
+          {'class_counts': np.full([len(classes)], 3),
+           'class_means': means[sl]})
+
+    merged = intra_fid_lib.reduce_intra_fid_shards(shard_dir, num_classes, 2)
+    self.assertAllClose(expected_fids, merged['fids'])
+    self.assertAllClose(means, merged['class_means'])
+    self.assertAllEqual(np.full([num_classes], 3), merged['class_counts'])
+
+    with self.assertRaises(IOError):
+      intra_fid_lib.reduce_intra_fid_shards(shard_dir, num_classes, 3)
+    with self.assertRaisesRegexp(ValueError, 'exactly once'):
+      intra_fid_lib.reduce_intra_fid_shards(shard_dir, num_classes + 1, 2)
+
+  def test_intra_fid_from_statistics(self):
+    rs = np.random.RandomState(0)
+    num_classes = 3
+    real = rs.normal(size=[600, 8])
+    gen = rs.normal(loc=0.5, size=[600, 8])
+    real_labels = np.arange(600) % num_classes
+    gen_labels = np.arange(600) // 200
+    # The last class has a single generated sample and is skipped.
+    gen_labels[-199:] = 0
+
+    fids = intra_fid_lib.intra_fid_from_statistics(
+        _class_statistics(real, real_labels, num_classes),
+        _class_statistics(gen, gen_labels, num_classes),
+        class_batch_size=2)
+
+    for c in range(2):
+      self.assertAllClose(
+          _expected_fid(real[real_labels == c], gen[gen_labels == c]),
+          fids[c], rtol=1e-4)
+    self.assertTrue(np.isnan(fids[2]))
+
+  def test_resume_intra_fid(self):
+    rs = np.random.RandomState(0)
+    num_classes = 4
+    real = rs.normal(size=[400, 8])
+    gen = rs.normal(loc=0.5, size=[400, 8])
+    labels = np.arange(400) % num_classes
+    real_stats = _class_statistics(real, labels, num_classes)
+    gen_stats = _class_statistics(gen, labels, num_classes)
+    expected = intra_fid_lib.intra_fid_from_statistics(
+        real_stats, gen_stats, class_batch_size=2)
+
+    path = self.get_temp_dir() + '/resume/class_fids.csv'
+    table = intra_fid_lib.IntraFidTable(path)
+    fids = intra_fid_lib.intra_fid_from_statistics(
+        real_stats, gen_stats, class_batch_size=1, classes=[0, 2],
+        callback=table.update)
+    self.assertTrue(np.isnan(fids[1]))
+    self.assertAllClose(expected[[0, 2]], fids[[0, 2]])
+
+    # A new table resumes from the file and computes the missing classes.
+    table = intra_fid_lib.IntraFidTable(path)
+    self.assertTrue(table.done([0, 2]))
+    self.assertEqual([1, 3], table.missing(num_classes))
+    intra_fid_lib.intra_fid_from_statistics(
+        real_stats, gen_stats, class_batch_size=2,
+        classes=table.missing(num_classes), callback=table.update)
+    self.assertAllClose(expected, table.to_array(num_classes))
+    self.assertAllClose(
+        expected, intra_fid_lib.IntraFidTable(path).to_array(num_classes))
+    self.assertEqual({}, intra_fid_lib.IntraFidTable(path, resume=False).fids)
+
+  def test_save_and_load_class_statistics(self):
+    rs = np.random.RandomState(0)
+    prefix = self.get_temp_dir() + '/statistics/generated'
+    self.assertIsNone(intra_fid_lib.load_class_statistics(prefix, prefix))
+    moments = tfgan.eval.ClasswiseStreamingMoments(
+        3, 4, scatter_path=self.get_temp_dir() + '/scatter.npy')
+    moments.update(rs.normal(size=[30, 4]), np.arange(30) % 3)
+    statistics = moments.finalize()
+    intra_fid_lib.save_class_statistics(prefix, statistics)
+
+    loaded = intra_fid_lib.load_class_statistics(prefix, prefix)
+    for key in ('class_counts', 'class_means', 'class_covariances'):
+      self.assertAllClose(statistics[key], loaded[key])
+
+
+if __name__ == '__main__':
+  tf.test.main()
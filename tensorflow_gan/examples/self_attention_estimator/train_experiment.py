@@ -25,6 +25,9 @@ import os
 
 import collections
 import functools
+import shutil
+import sys
+import tempfile
 import time
 
 import tensorflow as tf  # tf
@@ -34,11 +37,17 @@ from tensorflow_gan.examples.self_attention_estimator import discriminator as di
 from tensorflow_gan.examples.self_attention_estimator import estimator_lib as est_lib
 from tensorflow_gan.examples.self_attention_estimator import eval_lib
 from tensorflow_gan.examples.self_attention_estimator import generator as gen_module
+from tensorflow_gan.examples.self_attention_estimator import intra_fid_lib
+import tensorflow_gan as tfgan  # tf
 
 from absl import flags
 
 import pdb
 
+# The entry point that intra FID shard subprocesses are started with.
+_MAIN_MODULE = (
+    'tensorflow_gan.examples.self_attention_estimator.train_experiment_main')
+
 HParams = collections.namedtuple(
     'HParams',
     [
@@ -82,7 +91,13 @@ TPUParams = collections.namedtuple(
 
 def _verify_dataset_shape(ds, z_dim):
   noise_shape = tf.TensorShape([None, z_dim])
+  if tf.compat.v1.data.get_output_types(ds)[0] == tf.int32:
+    # Noise seeds, see `_generator_inputs_fn`.
+    noise_shape = tf.TensorShape([None, 2])
   img_shape = tf.TensorShape([None, flags.FLAGS.image_size, flags.FLAGS.image_size, 3])
+  if tf.compat.v1.data.get_output_types(ds)[1]['images'] == tf.int32:
+    # Packed uint8 images, see `data_provider.pack_uint8_images`.
+    img_shape = tf.TensorShape([None, img_shape[1:].num_elements() // 4])
   lbl_shape = tf.TensorShape([None])
 
   ds_shape = tf.compat.v1.data.get_output_shapes(ds)
@@ -121,15 +136,34 @@ def train_eval_input_fn(mode, params, restrict_classes=None, shift_classes=0):
     _verify_dataset_shape(ds, params['z_dim'])
     return ds
 
-  num_towers = 1
+  seed = flags.FLAGS.generator_input_seed
+  if seed is None:
+    seed = np.random.randint(1 << 30)
+  on_device = flags.FLAGS.generator_inputs_on_device
+  # A TPU host splits its batch across its cores.
+  num_slices = getattr(
+      params.get('context'), 'num_of_replicas_per_host', None) or 1
 
-  def _make_noise(_):
-    noise = gen_module.make_z_normal(num_towers, bs, params['z_dim'])
-    return noise[0]  # one tower
+  if flags.FLAGS.mode == 'gen_images':
+    labels_todo = list(range(flags.FLAGS.num_classes))
+    # hack to print your favorite classes
+    # labels_todo = list(sorted([130,96,90,88,164,175,281,289,290,292,294,323,441,475,555,581,607,654,661,663,688,779] * 5))
 
-  noise_ds = tf.data.Dataset.from_tensors(0).repeat().map(_make_noise)
-  if mode == tf.estimator.ModeKeys.PREDICT and not flags.FLAGS.mode == 'gen_images':
-    return noise_ds
+    def _make_labels(batch_index, seeds):
+      if flags.FLAGS.gen_images_uniform_random_labels:
+        return gen_module.make_class_labels_stateless(
+            seeds, flags.FLAGS.num_classes)
+      label = tf.gather(tf.constant(labels_todo, dtype=tf.int32),
+                        batch_index % len(labels_todo))
+      return gen_module.make_one_batch_constant_labels(bs, label)
+
+    return _generator_inputs_dataset(params, mode, _generator_inputs_fn(
+        params['z_dim'], bs, seed, on_device, _make_labels, num_slices))
+
+  make_noise = _generator_inputs_fn(
+      params['z_dim'], bs, seed, on_device, num_slices=num_slices)
+  if mode == tf.estimator.ModeKeys.PREDICT:
+    return _generator_inputs_dataset(params, mode, make_noise)
 
   images_ds = data_provider.provide_dataset(
       bs,
@@ -149,35 +183,154 @@ def train_eval_input_fn(mode, params, restrict_classes=None, shift_classes=0):
     images_ds = images_ds.map(lambda img, lbl: {'images': img, 'labels': lbl})  # map to dict.
     
   
+  if (is_train and flags.FLAGS.checkpoint_input_pipeline and
+      not params['tpu_params'].use_tpu_estimator):
+    if flags.FLAGS.in_memory_dataset:
+      # The numpy_function of the in-memory split cannot be serialized.
+      raise ValueError('--checkpoint_input_pipeline does not support '
+                       '--in_memory_dataset.')
+    return _checkpointable_train_input(images_ds, make_noise)
+
+  noise_ds = _generator_inputs_dataset(params, mode, make_noise)
   ds = tf.data.Dataset.zip((noise_ds, images_ds))
   if restrict_classes is not None or flags.FLAGS.mode == 'intra_fid_eval':
     ds = ds.map(lambda noise_ds, images_ds: ({'z': noise_ds, 'labels': images_ds['labels']-shift_classes}, {'images': images_ds['images'], 'labels': images_ds['labels']-shift_classes}) )
-  elif flags.FLAGS.mode == 'gen_images':
-    
-    def _make_labels_for_class(y):
-      return gen_module.make_one_batch_constant_labels(bs, y)
-    labels_todo = list(range(flags.FLAGS.num_classes))
-    # hack to print your favorite classes
-    # labels_todo = list(sorted([130,96,90,88,164,175,281,289,290,292,294,323,441,475,555,581,607,654,661,663,688,779] * 5))
-    
-    # okay, this is a ugly papercut, but an easy one-line modification of the above
-    def _make_one_batch_unif_random_labels(index):
-      del index
-      return gen_module.make_class_labels(bs, flags.FLAGS.num_classes)
-    
-    if flags.FLAGS.gen_images_uniform_random_labels:
-      labs_ds = tf.data.Dataset.from_tensor_slices(labels_todo).repeat().map(_make_one_batch_unif_random_labels)
-    else:
-      labs_ds = tf.data.Dataset.from_tensor_slices(labels_todo).repeat().map(_make_labels_for_class)
-    
-    ds = tf.data.Dataset.zip((noise_ds, images_ds, labs_ds))
-    ds = ds.map(lambda noise_ds_, images_ds_, labs_ds_: {'z': noise_ds_, 'labels': labs_ds_} ) # fake data only
-    # ds = ds.map(lambda noise_ds_, images_ds_, labs_ds_: ({'z': noise_ds_, 'labels': labs_ds_}, images_ds_) )
   else:
     _verify_dataset_shape(ds, params['z_dim'])
   return ds
 
 
+def _first_batch_index(mode):
+  """Returns the index of the first batch drawn by an input_fn.
+
+  In training this is the global step of the restored graph, read when the
+  iterator is initialized, i.e. after the Estimator restored the checkpoint.
+  Every global step draws exactly one batch per host, also with
+  --tpu_gan_estimator_d_step or _g_step above 1, since the TPUGANEstimator
+  draws one batch of all its sub-steps and splits it. Alternating `train` and
+  `evaluate` with a fixed --generator_input_seed then does not replay the same
+  noise. Evaluation and prediction always start at batch 0.
+  """
+  global_step = tf.compat.v1.train.get_global_step()
+  if mode != tf.estimator.ModeKeys.TRAIN or global_step is None:
+    return 0
+  return tf.cast(global_step.read_value(), tf.int64)
+
+
+def _generator_inputs_fn(z_dim, batch_size, seed, on_device, labels_fn=None,
+                         num_slices=1):
+  """Returns a function making the generator inputs of a batch from its index.
+
+  The noise of each of the `num_slices` equal slices of a batch, i.e. of the
+  part of a host batch that one TPU core receives, is drawn by one stateless
+  op seeded by the seed and the index of its first sample, see
+  `generator.make_z_stateless`. So sample `i` is the same in every run with
+  the same seed and can be regenerated from its slice. With `on_device` only
+  the int32 seeds are fed and every core draws the noise of its slice from
+  them, the same noise as on the host, see `_sample_noise_on_device`.
+
+  Args:
+    z_dim: The dimension of the noise.
+    batch_size: The number of samples per batch.
+    seed: The user seed of the noise.
+    on_device: Whether to return the seeds instead of the noise.
+    labels_fn: An optional function of the int64 batch index and the int32
+      [batch_size, 2] seeds of a batch returning its labels.
+    num_slices: The number of slices the batch is split into on the device.
+
+  Returns:
+    A function of an int64 batch index returning the noise, or the seeds, of
+    the batch, or {'z': noise, 'labels': labels} if `labels_fn` is given.
+  """
+
+  def _make_inputs(batch_index):
+    seeds = gen_module.make_sample_seeds(
+        seed, batch_index * batch_size, batch_size)
+    if on_device:
+      noise = seeds
+    else:
+      noise = tf.concat([
+          gen_module.make_z_stateless(slice_seeds, z_dim)
+          for slice_seeds in tf.split(seeds, num_slices)
+      ], axis=0)
+    if labels_fn is None:
+      return noise
+    return {'z': noise, 'labels': labels_fn(batch_index, seeds)}
+
+  return _make_inputs
+
+
+def _generator_inputs_dataset(params, mode, make_inputs):
+  """Returns a dataset of generator inputs from a counter-based RNG.
+
+  Each batch is made in one map over a counter starting at
+  `_first_batch_index`. Every host of a TPU pod makes its own batches, with
+  interleaved batch indices.
+
+  Args:
+    params: The estimator params.
+    mode: The estimator mode.
+    make_inputs: A function of a batch index, see `_generator_inputs_fn`.
+
+  Returns:
+    A dataset of the outputs of `make_inputs`.
+  """
+  context = params.get('context')
+  num_hosts = getattr(context, 'num_hosts', None) or 1
+  host = getattr(context, 'current_host', None) or 0
+  counter = tf.data.experimental.Counter(_first_batch_index(mode))
+  return counter.map(
+      lambda batch_index: make_inputs(batch_index * num_hosts + host))
+
+
+def _sample_noise_on_device(noise, z_dim):
+  """Samples the noise of the seeds of --generator_inputs_on_device.
+
+  Args:
+    noise: A float32 batch of noise, returned as it is, or the int32
+      [batch_size, 2] seeds of `_generator_inputs_fn`.
+    z_dim: The dimension of the noise.
+
+  Returns:
+    A float32 tensor of shape [batch_size, z_dim], the same noise as the one
+    sampled on the host for this slice of the batch.
+  """
+  if noise.dtype != tf.int32:
+    return noise
+  return gen_module.make_z_stateless(noise, z_dim)
+
+
+def _checkpointable_train_input(images_ds, make_noise):
+  """Returns the next training batch of an iterator saved in checkpoints.
+
+  The state of the iterator, i.e. its position in the epoch and the contents
+  of the shuffle buffer, is registered as a saveable object, which the default
+  Saver of the Estimator writes to every checkpoint and restores at the start
+  of every `train` call. Alternating `train` and `evaluate` then continues the
+  epoch where it stopped instead of refilling the shuffle buffer. The noise is
+  made in the graph from the global step instead of in the dataset, since the
+  position of a counter inside a dataset is not saved, so it is the same as
+  the noise of the batch of that step of `_generator_inputs_dataset`. The
+  batch is returned as tensors rather than a dataset, so the Estimator must
+  train without a distribution strategy, see
+  `est_lib.get_run_config_from_hparams`.
+
+  Args:
+    images_ds: The dataset of dicts of images and labels.
+    make_noise: A function of a batch index, see `_generator_inputs_fn`.
+
+  Returns:
+    A tuple of the noise and the dict of images and labels of the next batch.
+  """
+  iterator = tf.compat.v1.data.make_one_shot_iterator(images_ds)
+  tf.compat.v1.add_to_collection(
+      tf.compat.v1.GraphKeys.SAVEABLE_OBJECTS,
+      tf.data.experimental.make_saveable_from_iterator(iterator))
+  global_step = tf.compat.v1.train.get_or_create_global_step()
+  noise = make_noise(tf.cast(global_step.read_value(), tf.int64))
+  return noise, iterator.get_next()
+
+
 def make_estimator(hparams):
   """Creates a TPU Estimator."""
   generator = _get_generator(hparams)
@@ -272,9 +425,182 @@ def gen_matrices(hparams):
 
 
 
+def dump_activations(hparams):
+  """What to run if `FLAGS.mode=='dump_activations'`.
+
+  Generates `--dump_activations_images_per_class` images of every class with
+  the latest checkpoint and writes their Inception logits, pool_3 features and
+  labels as `.npy` shards under `model_dir/activations/step_<N>`.
+
+  Args:
+    hparams: A hyperparameter object.
+  """
+  tf.compat.v1.logging.info('Dumping activations.')
+  generator = _get_generator_to_be_conditioned(hparams)
+  discriminator = _get_discriminator(hparams)
+  if hparams.tpu_params.use_tpu_estimator:
+    config = est_lib.get_tpu_run_config_from_hparams(hparams)
+    estimator = est_lib.get_tpu_estimator(generator, discriminator, hparams, config)
+  else:
+    config = est_lib.get_run_config_from_hparams(hparams)
+    estimator = est_lib.get_gpu_estimator(generator, discriminator, hparams, config)
+
+  ckpt_str = evaluation.latest_checkpoint(hparams.model_dir)
+  tf.compat.v1.logging.info('Dumping activations of checkpoint: %s' % ckpt_str)
+  output_dir = os.path.join(hparams.model_dir, 'activations',
+                            'step_%s' % ckpt_str.split('-')[-1])
+  files = intra_fid_lib.dump_generated_activations(
+      estimator, hparams.num_classes,
+      flags.FLAGS.dump_activations_images_per_class, output_dir,
+      flags.FLAGS.activations_shard_size, checkpoint_path=ckpt_str)
+  if flags.FLAGS.knn_metrics_k:
+    _run_nearest_neighbor_eval(hparams, files['pool_3'],
+                               int(ckpt_str.split('-')[-1]))
+
+
+def _run_nearest_neighbor_eval(hparams, pool_3_files, step):
+  """Writes k-NN precision, recall, density and coverage of dumped activations.
+
+  The real side comes from the activations saved with the statistics in
+  `--real_stats_dir`, whose k-NN index is persisted there between runs.
+  """
+  if flags.FLAGS.real_stats_dir is None:
+    raise ValueError('--knn_metrics_k needs real activations in '
+                     '--real_stats_dir.')
+  path = eval_lib.real_statistics_path(
+      flags.FLAGS.real_stats_dir, flags.FLAGS.dataset_name,
+      flags.FLAGS.dataset_val_split_name, flags.FLAGS.image_size)
+  index = eval_lib.real_nearest_neighbor_index(path, flags.FLAGS.knn_metrics_k)
+  fake = eval_lib.load_npy_shards(pool_3_files)
+  metrics = tfgan.eval.precision_recall_density_coverage(index, fake)
+  # Generated samples much closer to a real sample than its k-NN radius hint at
+  # memorised training images.
+  distances, nearest = tfgan.eval.nearest_neighbor_distances(index, fake)
+  metrics['nearest_real_distance_ratio'] = float(
+      np.median(distances / np.maximum(index.radii[nearest], 1e-12)))
+  tf.compat.v1.logging.info('k-NN metrics at step %i: %s' % (step, metrics))
+  eval_lib.write_eval_summaries(
+      os.path.join(hparams.model_dir, 'eval_knn'), step,
+      {'eval/' + name: value for name, value in metrics.items()})
+
+
+def precompute_real_stats(hparams):
+  """What to run if `FLAGS.mode=='precompute_real_stats'`.
+
+  Streams every split of `--real_stats_splits`, by default the validation
+  split, through Inception once and writes the global and per-class statistics
+  to `--real_stats_dir`, where eval picks them up.
+
+  Args:
+    hparams: A hyperparameter object.
+  """
+  if flags.FLAGS.real_stats_dir is None:
+    raise ValueError('--real_stats_dir is required to precompute statistics.')
+  for split in (flags.FLAGS.real_stats_splits or
+                [flags.FLAGS.dataset_val_split_name]):
+    _write_real_statistics(hparams, split)
+
+
+def _write_real_statistics(hparams, split):
+  """Writes the statistics of `split` to `--real_stats_dir`."""
+  path = eval_lib.real_statistics_path(
+      flags.FLAGS.real_stats_dir, flags.FLAGS.dataset_name, split,
+      flags.FLAGS.image_size)
+  tf.compat.v1.logging.info('Precomputing real statistics into: %s' % path)
+  scratch_prefix = eval_lib.local_scratch_prefix(path)
+  statistics = eval_lib.compute_real_statistics(
+      hparams.eval_batch_size, split, hparams.num_classes, scratch_prefix,
+      save_activations=flags.FLAGS.real_stats_save_activations,
+      activations_shard_size=flags.FLAGS.activations_shard_size)
+  eval_lib.save_real_statistics(
+      path, statistics, flags.FLAGS.dataset_name, split,
+      flags.FLAGS.image_size)
+  eval_lib.remove_scratch_prefix(scratch_prefix, path)
+  tf.compat.v1.logging.info(
+      'Real statistics over %i images, Inception score %.4f.' % (
+          statistics['num_examples'], statistics['inception_score']))
+  return path
+
+
+def _intra_fid_real_statistics_path(hparams):
+  """Returns the cached real statistics single pass intra FID compares with.
+
+  These are the statistics of the train split, see `intra_fid_lib.REAL_SPLIT`,
+  so results match the chunked intra FID. They are written to
+  `--real_stats_dir` first if they are missing.
+  """
+  path = eval_lib.real_statistics_path(
+      flags.FLAGS.real_stats_dir, flags.FLAGS.dataset_name,
+      intra_fid_lib.REAL_SPLIT, flags.FLAGS.image_size)
+  if not tf.io.gfile.exists(path):
+    _write_real_statistics(hparams, intra_fid_lib.REAL_SPLIT)
+  return path
+
+
+def preprocess_dataset(hparams):
+  """What to run if `FLAGS.mode=='preprocess_dataset'`.
+
+  Center-crops and resizes the train and validation splits to --image_size once
+  and writes them as uint8 TFRecords under `--preprocessed_data_dir`, where
+  `data_provider.provide_dataset` reads them instead of decoding the tfds
+  images on every epoch. The train split is also regrouped by class, so
+  intra FID reads only the classes it evaluates.
+
+  Args:
+    hparams: A hyperparameter object.
+  """
+  if flags.FLAGS.preprocessed_data_dir is None:
+    raise ValueError(
+        '--preprocessed_data_dir is required to preprocess the dataset.')
+  for split in sorted({'train', flags.FLAGS.dataset_val_split_name}):
+    dataset_dir = data_provider.preprocessed_dataset_dir(
+        flags.FLAGS.preprocessed_data_dir, flags.FLAGS.dataset_name, split,
+        flags.FLAGS.image_size)
+    tf.compat.v1.logging.info('Preprocessing split %s into: %s' % (
+        split, dataset_dir))
+    num_examples = data_provider.write_preprocessed_dataset(
+        functools.partial(
+            data_provider._load_dataset,  # pylint: disable=protected-access
+            split, flags.FLAGS.dataset_name, flags.FLAGS.data_dir),
+        dataset_dir, flags.FLAGS.image_size,
+        num_shards=flags.FLAGS.preprocessed_num_shards)
+    tf.compat.v1.logging.info('Preprocessed %i images of split %s.' % (
+        num_examples, split))
+    if split == 'train':
+      data_provider.write_class_index(dataset_dir, hparams.num_classes)
+
+
+def _local_gpus():
+  """Returns the visible GPUs as values of CUDA_VISIBLE_DEVICES."""
+  visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+  if visible is not None:
+    return [device for device in visible.split(',') if device.strip()]
+  return list(range(
+      len(tf.config.experimental.list_physical_devices('GPU'))))
+
+
 def run_intra_fid_eval(hparams):
   """..."""
   tf.compat.v1.logging.info('Intra FID evaluation.')
+  ckpt_str = (flags.FLAGS.intra_fid_checkpoint or
+              evaluation.latest_checkpoint(hparams.model_dir))
+  if flags.FLAGS.intra_fid_local_workers:
+    intra_fid_lib.check_num_shards(hparams.num_classes, flags.FLAGS.num_shards)
+    if flags.FLAGS.real_stats_dir is None:
+      raise ValueError('--intra_fid_local_workers needs --real_stats_dir.')
+    # Cache the real statistics once, before the shards read them.
+    _intra_fid_real_statistics_path(hparams)
+    # Fan the shards out to local processes, all on the same checkpoint.
+    num_workers = flags.FLAGS.intra_fid_local_workers
+    if hparams.tpu_params.use_tpu_estimator and num_workers > 1:
+      tf.compat.v1.logging.warning(
+          'Shards cannot share a TPU, running one intra FID shard at a time.')
+      num_workers = 1
+    intra_fid_lib.run_shard_processes(
+        _MAIN_MODULE, sys.argv[1:] + ['--intra_fid_checkpoint=%s' % ckpt_str],
+        flags.FLAGS.num_shards, num_workers, devices=_local_gpus())
+    _reduce_intra_fid_shards(hparams, ckpt_str)
+    return
   
   # modified body of make_estimator(hparams)
   generator = _get_generator_to_be_conditioned(hparams)
@@ -288,32 +614,204 @@ def run_intra_fid_eval(hparams):
     estimator = est_lib.get_gpu_estimator(generator, discriminator, hparams, config)
   
   
-  ckpt_str =  evaluation.latest_checkpoint(hparams.model_dir)
   tf.compat.v1.logging.info('Evaluating checkpoint: %s' % ckpt_str)
+  if flags.FLAGS.num_shards > 1:
+    _run_intra_fid_shard(estimator, hparams, ckpt_str)
+    return
+  if flags.FLAGS.intra_fid_eval_single_pass:
+    _run_single_pass_intra_fid_eval(estimator, hparams, ckpt_str)
+    return
   chunk_sz = flags.FLAGS.intra_fid_eval_chunk_size
   n_chunks = flags.FLAGS.num_classes // chunk_sz
+  table = intra_fid_lib.IntraFidTable(
+      _intra_fid_table_path(hparams, ckpt_str),
+      resume=flags.FLAGS.intra_fid_resume)
   for chunk_i in range(0, n_chunks):
     restrict_classes = list(range(chunk_i*chunk_sz, (chunk_i+1)*chunk_sz ))
+    if table.done(restrict_classes):
+      tf.compat.v1.logging.info('Skipping intra fid {}/{}, already computed.'.format(chunk_i, n_chunks))
+      continue
     limited_class_train_eval_input_fn = functools.partial(train_eval_input_fn, restrict_classes=restrict_classes, shift_classes=chunk_i*chunk_sz)
     eval_results = estimator.evaluate(
         limited_class_train_eval_input_fn,
         steps=hparams.num_eval_steps,
         name='eval_intra_fid')
+    table.update(restrict_classes, np.reshape(eval_results['eval/intra_fid'], [-1]))
     tf.compat.v1.logging.info('Finished intra fid {}/{} evaluation checkpoint: {}. IFID: {}'.format(chunk_i, n_chunks, ckpt_str, eval_results['eval/intra_fid']) )
+  _report_intra_fid(hparams, ckpt_str, table.to_array(n_chunks * chunk_sz))
+
+def _run_single_pass_intra_fid_eval(estimator, hparams, ckpt_str):
+  """Intra FID over all classes with one pass over the real and fake data.
+
+  Real per-class statistics are those of the train split, like in the chunked
+  evaluation. They are cached in `--real_stats_dir` if set, otherwise the
+  train split is read once. The generator is sampled once in class
+  order. Per-class FIDs are logged and their mean is written as a summary.
+
+  The generated statistics and the FIDs of every batch of classes are saved
+  next to the per-class table, so with `--intra_fid_resume` an interrupted
+  evaluation neither samples the generator again nor recomputes finished
+  classes.
+  """
+  scratch_dir = tempfile.mkdtemp()
+  if flags.FLAGS.real_stats_dir is not None:
+    real_stats = eval_lib.load_real_statistics(
+        _intra_fid_real_statistics_path(hparams))
+  else:
+    real_stats = eval_lib.compute_real_statistics(
+        hparams.eval_batch_size, intra_fid_lib.REAL_SPLIT,
+        hparams.num_classes, os.path.join(scratch_dir, 'real'))
+  table_path = _intra_fid_table_path(hparams, ckpt_str)
+  table = intra_fid_lib.IntraFidTable(
+      table_path, resume=flags.FLAGS.intra_fid_resume)
+  statistics_prefix = os.path.join(os.path.dirname(table_path), 'generated')
+  fake_stats = None
+  if flags.FLAGS.intra_fid_resume:
+    fake_stats = intra_fid_lib.load_class_statistics(
+        statistics_prefix, os.path.join(scratch_dir, 'generated'))
+  if fake_stats is None:
+    # Accumulate in place if the statistics are kept on the local disk.
+    scratch_prefix = (statistics_prefix if '://' not in statistics_prefix
+                      else os.path.join(scratch_dir, 'generated'))
+    if not tf.io.gfile.exists(os.path.dirname(statistics_prefix)):
+      tf.io.gfile.makedirs(os.path.dirname(statistics_prefix))
+    fake_stats = intra_fid_lib.compute_generated_class_statistics(
+        estimator, hparams.num_classes,
+        flags.FLAGS.intra_fid_images_per_class, scratch_prefix,
+        checkpoint_path=ckpt_str)
+    intra_fid_lib.save_class_statistics(statistics_prefix, fake_stats)
+  intra_fid_lib.intra_fid_from_statistics(
+      real_stats, fake_stats, flags.FLAGS.intra_fid_class_batch_size,
+      trace_sqrt_method=flags.FLAGS.intra_fid_trace_sqrt_method,
+      trace_sqrt_precision=tf.as_dtype(
+          flags.FLAGS.intra_fid_trace_sqrt_precision),
+      classes=table.missing(hparams.num_classes), callback=table.update)
+  shutil.rmtree(scratch_dir, ignore_errors=True)
+  _report_intra_fid(hparams, ckpt_str, table.to_array(hparams.num_classes))
+
+
+def _intra_fid_table_path(hparams, ckpt_str):
+  return os.path.join(hparams.model_dir, 'intra_fid',
+                      'step_%s' % ckpt_str.split('-')[-1], 'class_fids.csv')
+
+
+def _report_intra_fid(hparams, ckpt_str, fids):
+  """Writes the per-class FID table and logs and summarizes the mean."""
+  table = intra_fid_lib.IntraFidTable(
+      _intra_fid_table_path(hparams, ckpt_str), resume=False)
+  table.update(range(len(fids)), fids)
+  tf.compat.v1.logging.info('Wrote per-class intra FID to: %s' % table.path)
+  for label, fid in enumerate(fids):
+    tf.compat.v1.logging.info('Class %i intra FID: %.4f' % (label, fid))
+  intra_fid = np.nanmean(fids)
+  tf.compat.v1.logging.info(
+      'Finished single pass intra fid evaluation checkpoint: {}. IFID: {}'
+      .format(ckpt_str, intra_fid))
+  eval_lib.write_eval_summaries(
+      os.path.join(hparams.model_dir, 'eval_intra_fid'),
+      int(ckpt_str.split('-')[-1]), {'eval/intra_fid': intra_fid})
+
+
+def _intra_fid_shard_dir(hparams, ckpt_str):
+  return flags.FLAGS.intra_fid_shard_dir or os.path.join(
+      hparams.model_dir, 'intra_fid_shards',
+      'step_%s' % ckpt_str.split('-')[-1])
+
+
+def _run_intra_fid_shard(estimator, hparams, ckpt_str):
+  """Single pass intra FID of the classes of `--shard_index`.
+
+  The real per-class statistics of the train split must be cached in
+  `--real_stats_dir`, so the shards do not each read the whole split. The
+  FIDs and generated statistics of the shard's classes are written for
+  `_reduce_intra_fid_shards`.
+  """
+  path = None
+  if flags.FLAGS.real_stats_dir is not None:
+    path = eval_lib.real_statistics_path(
+        flags.FLAGS.real_stats_dir, flags.FLAGS.dataset_name,
+        intra_fid_lib.REAL_SPLIT, flags.FLAGS.image_size)
+  if path is None or not tf.io.gfile.exists(path):
+    raise ValueError('Sharded intra FID needs the statistics of the %s split '
+                     'in --real_stats_dir, see --mode=precompute_real_stats '
+                     'and --real_stats_splits.' % intra_fid_lib.REAL_SPLIT)
+  real_stats = eval_lib.load_real_statistics(path)
+  num_shards = flags.FLAGS.num_shards
+  shard_index = flags.FLAGS.shard_index
+  classes = intra_fid_lib.shard_classes(
+      hparams.num_classes, num_shards, shard_index)
+  tf.compat.v1.logging.info('Intra FID shard %i/%i: classes [%i, %i).' % (
+      shard_index, num_shards, classes.start, classes.stop))
+  scratch_dir = tempfile.mkdtemp()
+  fake_stats = intra_fid_lib.compute_generated_class_statistics(
+      estimator, len(classes), flags.FLAGS.intra_fid_images_per_class,
+      os.path.join(scratch_dir, 'generated'), checkpoint_path=ckpt_str,
+      first_class=classes.start)
+  shard_real_stats = {
+      key: real_stats[key][classes.start:classes.stop]
+      for key in ('class_means', 'class_covariances', 'class_counts')}
+  fids = intra_fid_lib.intra_fid_from_statistics(
+      shard_real_stats, fake_stats, flags.FLAGS.intra_fid_class_batch_size,
+      trace_sqrt_method=flags.FLAGS.intra_fid_trace_sqrt_method,
+      trace_sqrt_precision=tf.as_dtype(
+          flags.FLAGS.intra_fid_trace_sqrt_precision))
+  shard_dir = _intra_fid_shard_dir(hparams, ckpt_str)
+  if not tf.io.gfile.exists(shard_dir):
+    tf.io.gfile.makedirs(shard_dir)
+  intra_fid_lib.write_intra_fid_shard(
+      intra_fid_lib.shard_path(shard_dir, num_shards, shard_index), classes,
+      fids, fake_stats)
+  shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def _reduce_intra_fid_shards(hparams, ckpt_str):
+  """Merges the intra FID shards of a checkpoint and reports the result."""
+  merged = intra_fid_lib.reduce_intra_fid_shards(
+      _intra_fid_shard_dir(hparams, ckpt_str), hparams.num_classes,
+      flags.FLAGS.num_shards)
+  _report_intra_fid(hparams, ckpt_str, merged['fids'])
+
+
+def run_intra_fid_reduce(hparams):
+  """What to run if `FLAGS.mode=='intra_fid_reduce'`.
+
+  Merges the shards that `--mode=intra_fid_eval --num_shards=N
+  --shard_index=i` jobs wrote for `--intra_fid_checkpoint`, or for the latest
+  checkpoint, e.g. after running the shards on several machines.
+  """
+  ckpt_str = (flags.FLAGS.intra_fid_checkpoint or
+              evaluation.latest_checkpoint(hparams.model_dir))
+  _reduce_intra_fid_shards(hparams, ckpt_str)
+
 
 def run_continuous_eval(hparams):
   """What to run in continuous eval mode."""
   tf.compat.v1.logging.info('Continuous evaluation.')
   estimator = make_estimator(hparams)
   timeout = hparams.debug_params.continuous_eval_timeout_secs
+  warm_evaluator = None
+  if flags.FLAGS.warm_continuous_eval:
+    if isinstance(estimator, tfgan.estimator.TPUGANEstimator):
+      tf.compat.v1.logging.warning(
+          '--warm_continuous_eval needs a GANEstimator, falling back to '
+          'estimator.evaluate.')
+    else:
+      warm_evaluator = eval_lib.WarmEvaluator(
+          estimator, train_eval_input_fn, hparams.num_eval_steps,
+          name='eval_continuous')
   for ckpt_str in evaluation.checkpoints_iterator(
       hparams.model_dir, timeout=timeout):
     tf.compat.v1.logging.info('Evaluating checkpoint: %s' % ckpt_str)
-    estimator.evaluate(
-        train_eval_input_fn,
-        steps=hparams.num_eval_steps,
-        name='eval_continuous')
+    if warm_evaluator is not None:
+      warm_evaluator.evaluate(ckpt_str)
+    else:
+      estimator.evaluate(
+          train_eval_input_fn,
+          steps=hparams.num_eval_steps,
+          name='eval_continuous')
     tf.compat.v1.logging.info('Finished evaluating checkpoint: %s' % ckpt_str)
+  if warm_evaluator is not None:
+    warm_evaluator.close()
 
 
 # TODO(joelshor): Try to get this to work with
@@ -372,6 +870,7 @@ def _get_generator_to_be_conditioned(hparams):
   def generator(noise_and_lbls, mode):
     """TF-GAN compatible generator function."""
     noise, labs = noise_and_lbls['z'], noise_and_lbls['labels']
+    noise = _sample_noise_on_device(noise, hparams.z_dim)
     batch_size = tf.shape(input=noise)[0]
     is_train = (mode == tf.estimator.ModeKeys.TRAIN)
 
@@ -407,6 +906,7 @@ def _get_generator(hparams):
   """Returns a TF-GAN compatible generator function."""
   def generator(noise, mode):
     """TF-GAN compatible generator function."""
+    noise = _sample_noise_on_device(noise, hparams.z_dim)
     batch_size = tf.shape(input=noise)[0]
     is_train = (mode == tf.estimator.ModeKeys.TRAIN)
 
@@ -450,6 +950,7 @@ def _get_discriminator(hparams):
     """TF-GAN compatible discriminator."""
     del unused_conditioning, mode
     images, labels = images_and_lbls['images'], images_and_lbls['labels']
+    images = data_provider.decode_images(images)
     if hparams.debug_params.fake_nets:
       # Need discriminator variables and to depend on the generator.
       logits = tf.zeros(
@@ -56,13 +56,19 @@ flags.DEFINE_float('beta1', 0.0, 'Momentum term of adam. [0.0]')
 
 # ML Infra.
 flags.DEFINE_enum(
-    'mode', None, ['train', 'continuous_eval', 'train_and_eval', 'intra_fid_eval', 'gen_images', 'gen_matrices'],
+    'mode', None, ['train', 'continuous_eval', 'train_and_eval', 'intra_fid_eval', 'intra_fid_reduce', 'gen_images', 'gen_matrices', 'precompute_real_stats', 'dump_activations', 'preprocess_dataset'],
     'Mode to run in. `train` just trains the model. `continuous_eval` '
     'continuously looks for new checkpoints and computes eval metrics and '
     'writes sample outputs to disk. `train_and_eval` does both. '
     'gen_images will generate images from the GAN with one tile per class '
     'unless gen_images_uniform_random_labels=True, then images will have '
     'classes randomly uniformly sampled. '
+    '`precompute_real_stats` streams the validation split through Inception '
+    'once and caches its statistics in --real_stats_dir. '
+    '`dump_activations` writes Inception logits, pool_3 features and labels '
+    'of generated images of every class as .npy shards under model_dir. '
+    '`preprocess_dataset` writes the train and validation splits, cropped '
+    'and resized to image_size, as uint8 TFRecords to --preprocessed_data_dir. '
     'If not set, will deduce mode from the TF_CONFIG environment variable.')
 flags.DEFINE_integer('max_number_of_steps', 50000,
                      'The maximum number of train steps.')
@@ -112,6 +118,47 @@ flags.DEFINE_string('data_dir', None,
                     'A directory for a TFDS datset. If `None`, use default.')
 flags.DEFINE_string('dataset_name', 'imagenet2012',
                     'Which dataset to use. imagenet2012 is default.')
+flags.DEFINE_string('preprocessed_data_dir', None,
+                    'A directory of datasets cropped and resized to image_size '
+                    'by --mode=preprocess_dataset. If it holds the split being '
+                    'read, it is used instead of decoding the tfds images.')
+flags.DEFINE_integer('preprocessed_num_shards', 64,
+                     'The number of TFRecord files per preprocessed split.')
+flags.DEFINE_bool('in_memory_dataset', False,
+                  'Decode, crop and resize each split once and keep it in '
+                  'memory as uint8, for datasets like CIFAR and STL that fit '
+                  'in RAM. Batches are gathered from memory with a shuffle '
+                  'over the whole split. The input pipeline runs in this '
+                  'process, so it does not work with a remote TPU worker or '
+                  '--checkpoint_input_pipeline.')
+flags.DEFINE_bool('uint8_infeed', False,
+                  'Feed real images as uint8, packed four bytes per int32 '
+                  'on TPU, and convert them to float in [-1, 1] in the model '
+                  'function instead of on the host. Quarters the infeed '
+                  'bandwidth and the host memory of the input pipeline.')
+flags.DEFINE_integer('generator_input_seed', None,
+                     'If set, the seed of the counter-based RNG of the '
+                     'generator noise and sampled labels, so that sample i of '
+                     'training, gen_images, predict and intra FID is the same '
+                     'in every run.')
+flags.DEFINE_bool('generator_inputs_on_device', False,
+                  'Feed only the int32 seed of each sample of noise and '
+                  'sample the noise in the generator, on the accelerator, '
+                  'instead of in the input pipeline. The noise is the same '
+                  'either way.')
+flags.DEFINE_integer('data_shuffle_seed', None,
+                     'If set, the seed of the training data order, so that '
+                     'it is the same in every run.')
+flags.DEFINE_bool('checkpoint_input_pipeline', False,
+                  'Save the position and shuffle buffer of the training data '
+                  'iterator in every checkpoint and restore them with the '
+                  'model, so that train_and_eval continues the epoch instead '
+                  'of refilling the shuffle buffer after every eval. The '
+                  'shuffle buffer is stored in the checkpoint, so use it with '
+                  '--preprocessed_data_dir. Checkpoints written without it '
+                  'cannot be restored with it. GANEstimator only, and it '
+                  'trains on a single device since the iterator cannot be '
+                  'saved under MirroredStrategy.')
 flags.DEFINE_float('aux_cond_generator_weight', None,
                    'How to scale generator ACGAN loss relative to WGAN loss, default is None. Try 0.1')
 flags.DEFINE_float('aux_cond_discriminator_weight', None, 
@@ -143,20 +190,49 @@ flags.DEFINE_enum(
 flags.DEFINE_integer( 'tpu_gan_estimator_d_step', 1, 'For TPU execution only, control number of discriminator steps. This feature is unsupported on GPU.')
 flags.DEFINE_integer( 'tpu_gan_estimator_g_step', 1, 'For TPU execution only, control number of discriminator steps. This feature is unsupported on GPU.')
 flags.DEFINE_float('generator_margin_size', 1.0, 'Used in achingegan_generator_loss.')
+flags.DEFINE_bool('warm_continuous_eval', False, 'If mode is continuous_eval and the estimator is a GANEstimator, build the eval graph and Inception once and only restore new weights for each checkpoint.')
 flags.DEFINE_integer( 'intra_fid_eval_chunk_size', None, 'The number of classes for which to compute a FID score within the class. This allows processing batches of FID scores in parallel for speed improvements.')
+flags.DEFINE_bool('intra_fid_eval_single_pass', False, 'If mode is intra_fid_eval, read the real data and sample the generator once for all classes, instead of one evaluation per chunk of intra_fid_eval_chunk_size classes.')
+flags.DEFINE_integer('intra_fid_images_per_class', 50, 'If intra_fid_eval_single_pass, the number of images to generate per class.')
+flags.DEFINE_integer('intra_fid_class_batch_size', 16, 'If intra_fid_eval_single_pass, the number of classes whose covariance square roots are computed at once.')
+flags.DEFINE_integer('num_shards', 1, 'If mode is intra_fid_eval, split the classes into this many contiguous ranges evaluated by separate single-pass processes. Each shard writes its per-class results to --intra_fid_shard_dir, and --mode=intra_fid_reduce merges them. Needs --real_stats_dir.')
+flags.DEFINE_integer('shard_index', 0, 'The shard of the classes that this process evaluates, in [0, num_shards).')
+flags.DEFINE_integer('intra_fid_local_workers', 0, 'If positive, run all --num_shards intra FID shards as subprocesses of this one, this many at a time, and merge them. On a GPU host each shard gets one GPU of its own, so at most one shard per GPU runs at a time. With the TPU estimator shards run one at a time.')
+flags.DEFINE_string('intra_fid_shard_dir', None, 'Directory of the intra FID shards. Defaults to model_dir/intra_fid_shards/step_<step>.')
+flags.DEFINE_string('intra_fid_checkpoint', None, 'The checkpoint to compute intra FID for, instead of the latest. Local shard processes are pinned to the checkpoint of their parent.')
+flags.DEFINE_bool('intra_fid_resume', False, 'If mode is intra_fid_eval, keep the per-class FIDs already in model_dir/intra_fid/step_<step>/class_fids.csv, and the saved generated statistics of a single pass, and only evaluate the missing classes.')
+flags.DEFINE_enum('intra_fid_trace_sqrt_method', 'svd', ['svd', 'eigh'], 'If intra_fid_eval_single_pass, how Tr(sqrt(sigma sigma_w)) is computed. eigh needs one eigendecomposition per class instead of two SVDs.')
+flags.DEFINE_enum('intra_fid_trace_sqrt_precision', 'float64', ['float32', 'float64'], 'If intra_fid_eval_single_pass, the precision of the covariance square roots.')
 flags.DEFINE_integer( 'tfdf_num_parallel_calls', 16, '...')
 flags.DEFINE_integer( 'n_images_per_side_to_gen_per_tile', None, 'When exporting images, this is the number of images per side of the square exported. This is useful when exporting a collage of images per class. It should be set to the square root of the eval batch size.')
 flags.DEFINE_bool('gen_images_with_margins', False, 'When exporting images per class, if this option is true the images will be sorted by the size of their classification margin.')
+flags.DEFINE_enum('image_export_format', 'png', ['png', 'jpeg'], 'The format of exported image grids.')
+flags.DEFINE_integer('image_export_workers', 4, 'The number of threads that tile, encode and write exported image grids while predictions continue.')
 flags.DEFINE_bool('extra_eval_metrics', False, 'Perform extra eval metrics like accuracy.')
+flags.DEFINE_bool('classwise_eval_metrics', False, 'Compute the Inception score, Inception and discriminator accuracies of generated images from one per-class accumulator, and write a per-class table. Replaces the separate incscore and accuracy metrics.')
+flags.DEFINE_enum('fid_accumulator_dtype', 'float64', ['float64', 'float32'], 'The dtype of the running means and covariances of the streaming FID and intra-FID. float32 uses compensated sums, halves their memory and avoids float64 ops while accumulating.')
+flags.DEFINE_bool('eval_kid', False, 'Also report the streaming Kernel Inception Distance and its standard error, treating every eval batch as a block. Needs real activations, so it is skipped with --real_stats_dir.')
 flags.DEFINE_integer( 'keep_checkpoint_max', 5, 'Number of most recent checkpoints to keep. Others will be deleted.')
 flags.DEFINE_float('generator_confuse_margin_size', 0.1, 'Used in kplusonegan_confuse_generator_loss.')
 flags.DEFINE_bool('gen_images_uniform_random_labels', False, 'If mode is gen_images, do not do it classwise if this is true.')
+flags.DEFINE_string('real_stats_dir', None, 'Directory of cached real-image Inception statistics, written by --mode=precompute_real_stats. If set, eval only runs Inception on generated images.')
+flags.DEFINE_list('real_stats_splits', None, 'If mode is precompute_real_stats, the splits to cache statistics for. Defaults to --dataset_val_split_name. Add train for single-pass and sharded intra FID, which compare with the train split like the chunked intra FID.')
+flags.DEFINE_bool('real_stats_save_activations', False, 'If mode is precompute_real_stats, also save the real pool_3 activations and labels as .npy shards.')
+flags.DEFINE_integer('activations_shard_size', 50000, 'The number of rows per .npy shard when saving activations.')
+flags.DEFINE_integer('dump_activations_images_per_class', 50, 'If mode is dump_activations, the number of images to generate per class.')
+flags.DEFINE_integer('knn_metrics_k', 0, 'If positive and mode is dump_activations, also compute k-NN precision, recall, density and coverage with this k against the real activations saved in --real_stats_dir.')
+flags.DEFINE_string('tfhub_cache_dir', None, 'Directory of a content-addressed cache of TF-Hub modules, e.g. Inception. Modules are loaded from it and added to it on first use.')
+flags.DEFINE_bool('tfhub_offline', False, 'Only load TF-Hub modules that are already in --tfhub_cache_dir, for eval without network access.')
+flags.DEFINE_integer('classifier_num_splits', 1, 'Split every batch of images that eval runs Inception on into this many equal parts, run in a map, so that --classifier_parallel_iterations of them run at the same time. The eval, predict and real statistics batch sizes must be divisible by it.')
+flags.DEFINE_integer('classifier_parallel_iterations', 1, 'The number of parts of an Inception batch, see --classifier_num_splits, that may run at the same time during eval. More overlap uses more cores and more memory.')
+flags.DEFINE_integer('classifier_memory_budget_mb', None, 'If set, caps classifier_parallel_iterations so that the Inception inputs in flight fit in this many megabytes. Only has an effect with --classifier_num_splits above 1.')
 
 
 FLAGS = flags.FLAGS
 
 def main(_):
   from tensorflow_gan.examples.self_attention_estimator import train_experiment
+  import tensorflow_gan as tfgan  # tf
   
   # get TF logger
   log = logging.getLogger('tensorflow')
@@ -174,6 +250,14 @@ def main(_):
   fh.setFormatter(formatter)
   log.addHandler(fh)
     
+  if FLAGS.tfhub_cache_dir or FLAGS.tfhub_offline:
+    tfgan.eval.configure_tfhub_module_cache(FLAGS.tfhub_cache_dir,
+                                            FLAGS.tfhub_offline)
+  tfgan.eval.configure_classifier_execution(
+      parallel_iterations=FLAGS.classifier_parallel_iterations,
+      memory_budget_bytes=(None if FLAGS.classifier_memory_budget_mb is None
+                           else FLAGS.classifier_memory_budget_mb << 20))
+
   tpu_location = FLAGS.tpu
   if FLAGS.use_tpu:
     assert ',' not in tpu_location, 'Only using 1 TPU is supported'
@@ -214,12 +298,20 @@ def main(_):
     train_experiment.run_continuous_eval(hparams)
   elif FLAGS.mode == 'intra_fid_eval':
     train_experiment.run_intra_fid_eval(hparams)
+  elif FLAGS.mode == 'intra_fid_reduce':
+    train_experiment.run_intra_fid_reduce(hparams)
   elif FLAGS.mode == 'train_and_eval' or FLAGS.mode is None:
     train_experiment.run_train_and_eval(hparams)
   elif FLAGS.mode == 'gen_images':
     train_experiment.gen_images(hparams)
   elif FLAGS.mode == 'gen_matrices':
     train_experiment.gen_matrices(hparams)
+  elif FLAGS.mode == 'precompute_real_stats':
+    train_experiment.precompute_real_stats(hparams)
+  elif FLAGS.mode == 'dump_activations':
+    train_experiment.dump_activations(hparams)
+  elif FLAGS.mode == 'preprocess_dataset':
+    train_experiment.preprocess_dataset(hparams)
   else:
     raise ValueError('Mode not recognized: ', FLAGS.mode)
 
@@ -22,11 +22,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
+from absl.testing import flagsaver
 from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf  # tf
 
 from tensorflow_gan.examples.self_attention_estimator import train_experiment
+from tensorflow_gan.examples.self_attention_estimator import train_experiment_main  # pylint: disable=unused-import
 
 mock = tf.compat.v1.test.mock
 
@@ -125,6 +129,91 @@ class TrainExperimentTest(tf.test.TestCase, parameterized.TestCase):
         np.zeros([8, 128, 128, 3])).map(lambda x: (x, [1]))
     train_experiment.train_eval_input_fn(mode, params)
 
+  def test_checkpointable_train_input_resumes(self):
+    if tf.executing_eagerly():
+      return
+    make_noise = train_experiment._generator_inputs_fn(
+        z_dim=3, batch_size=4, seed=1, on_device=False)
+
+    def _next_batch():
+      images_ds = tf.data.Dataset.range(100).shuffle(50, seed=3).map(
+          lambda i: {'images': tf.fill([2], i), 'labels': i}).batch(4)
+      return train_experiment._checkpointable_train_input(
+          images_ds, make_noise)
+
+    prefix = os.path.join(self.get_temp_dir(), 'input')
+    with tf.Graph().as_default() as g:
+      _, batch = _next_batch()
+      assign_step = tf.compat.v1.train.get_global_step().assign(3)
+      saver = tf.compat.v1.train.Saver()
+      with self.session(graph=g) as sess:
+        sess.run(tf.compat.v1.global_variables_initializer())
+        for _ in range(3):
+          sess.run(batch)
+        sess.run(assign_step)
+        saver.save(sess, prefix)
+        expected = [sess.run(batch['labels']) for _ in range(2)]
+        expected_noise = sess.run(make_noise(tf.constant(3, dtype=tf.int64)))
+
+    # A new graph continues mid-epoch with the same shuffle buffer, and the
+    # noise of the restored step.
+    with tf.Graph().as_default() as g:
+      noise, batch = _next_batch()
+      saver = tf.compat.v1.train.Saver()
+      with self.session(graph=g) as sess:
+        saver.restore(sess, prefix)
+        actual = [sess.run(batch['labels']) for _ in range(2)]
+        self.assertAllEqual(expected_noise, sess.run(noise))
+    self.assertAllEqual(expected, actual)
+
+  def test_generator_inputs_on_device_match_host(self):
+    host_fn, device_fn = [
+        train_experiment._generator_inputs_fn(
+            z_dim=3, batch_size=6, seed=1, on_device=on_device, num_slices=2)
+        for on_device in (False, True)]
+    batch_index = tf.constant(2, dtype=tf.int64)
+    seeds = device_fn(batch_index)
+    self.assertEqual(tf.int32, seeds.dtype)
+    host_noise = host_fn(batch_index)
+    # Like two TPU cores, each with its half of the batch.
+    device_noise = tf.concat([
+        train_experiment._sample_noise_on_device(core_seeds, 3)
+        for core_seeds in tf.split(seeds, 2)], axis=0)
+    with self.cached_session() as sess:
+      seeds, host_noise, device_noise = sess.run(
+          [seeds, host_noise, device_noise])
+    self.assertAllEqual([[1, 12 + i] for i in range(6)], seeds)
+    self.assertAllEqual(host_noise, device_noise)
+    # The cores get different noise.
+    self.assertLen(np.unique(host_noise[:, 0]), 6)
+
+  def test_generator_inputs_resume_at_global_step(self):
+    if tf.executing_eagerly():
+      return
+    make_inputs = train_experiment._generator_inputs_fn(
+        z_dim=3, batch_size=4, seed=1, on_device=True)
+    # The second of two hosts of a TPU pod.
+    params = {'context': mock.Mock(num_hosts=2, current_host=1)}
+    with tf.Graph().as_default() as g:
+      global_step = tf.compat.v1.train.get_or_create_global_step()
+      next_inputs = {}
+      for mode in (tf.estimator.ModeKeys.TRAIN, tf.estimator.ModeKeys.EVAL):
+        iterator = tf.compat.v1.data.make_initializable_iterator(
+            train_experiment._generator_inputs_dataset(
+                params, mode, make_inputs))
+        next_inputs[mode] = (iterator.initializer, iterator.get_next())
+      with self.session(graph=g) as sess:
+        sess.run(global_step.assign(5))
+        seeds = {}
+        for mode, (initializer, next_seeds) in next_inputs.items():
+          sess.run(initializer)
+          seeds[mode] = [sess.run(next_seeds) for _ in range(2)]
+    # Batches 11 and 13 of the pod in training, 1 and 3 in evaluation.
+    self.assertAllEqual([1, 44], seeds[tf.estimator.ModeKeys.TRAIN][0][0])
+    self.assertAllEqual([1, 52], seeds[tf.estimator.ModeKeys.TRAIN][1][0])
+    self.assertAllEqual([1, 4], seeds[tf.estimator.ModeKeys.EVAL][0][0])
+    self.assertAllEqual([1, 12], seeds[tf.estimator.ModeKeys.EVAL][1][0])
+
   def test_make_estimator(self):
     train_experiment.make_estimator(self.hparams)
 
@@ -136,6 +225,48 @@ class TrainExperimentTest(tf.test.TestCase, parameterized.TestCase):
     estimator = train_experiment.make_estimator(self.hparams)
     estimator.train(train_experiment.train_eval_input_fn, steps=1)
 
+  @flagsaver.flagsaver(checkpoint_input_pipeline=True, image_size=32)
+  @mock.patch.object(
+      train_experiment.est_lib.eval_lib,
+      'get_real_activations',
+      new=_get_real_activations_mock)
+  @mock.patch.object(
+      train_experiment.data_provider, 'provide_dataset', autospec=True)
+  def test_estimator_train_checkpoint_input_pipeline(self, mock_dataset):
+    # Every `train` call builds a new graph, and a new dataset in it.
+    mock_dataset.side_effect = lambda *args, **kwargs: (
+        tf.data.Dataset.from_tensors(
+            (np.zeros([4, 32, 32, 3], np.float32), np.zeros([4], np.int32)))
+        .repeat())
+    hparams = self.hparams._replace(
+        debug_params=self.hparams.debug_params._replace(fake_data=False))
+    estimator = train_experiment.make_estimator(hparams)
+    self.assertIsNone(estimator.config.train_distribute)
+    estimator.train(train_experiment.train_eval_input_fn, steps=1)
+    # The second call restores the iterator from the checkpoint.
+    estimator.train(train_experiment.train_eval_input_fn, steps=1)
+    self.assertEqual(2, estimator.get_variable_value('global_step'))
+
+  @flagsaver.flagsaver(uint8_infeed=True, image_size=32)
+  @mock.patch.object(
+      train_experiment.est_lib.eval_lib,
+      'get_real_activations',
+      new=_get_real_activations_mock)
+  @mock.patch.object(
+      train_experiment.data_provider, 'provide_dataset', autospec=True)
+  def test_estimator_train_uint8_infeed_distributed(self, mock_dataset):
+    mock_dataset.side_effect = lambda *args, **kwargs: (
+        tf.data.Dataset.from_tensors(
+            (np.zeros([4, 32, 32, 3], np.uint8), np.zeros([4], np.int32)))
+        .repeat())
+    hparams = self.hparams._replace(
+        debug_params=self.hparams.debug_params._replace(fake_data=False))
+    estimator = train_experiment.make_estimator(hparams)
+    # The uint8 batches are distributed by the strategy and decoded in the
+    # model function of every replica.
+    self.assertIsInstance(estimator.config.train_distribute,
+                          tf.distribute.MirroredStrategy)
+    estimator.train(train_experiment.train_eval_input_fn, steps=1)
 
 
 if __name__ == '__main__':
@@ -16,7 +16,7 @@
 """TF-GAN evaluation module.
 
 This module supports techniques such as Inception Score, Frechet Inception
-distance, and Sliced Wasserstein distance.
+distance, Sliced Wasserstein distance, and k-NN precision and recall.
 """
 # pylint: disable=wildcard-import,g-bad-import-order
 
@@ -24,17 +24,26 @@ distance, and Sliced Wasserstein distance.
 from .classifier_metrics import *
 from .eval_utils import *
 from .inception_metrics import *
+from .nearest_neighbor_metrics import *
+from .numpy_metrics import *
 from .sliced_wasserstein import *
 from .summaries import *
+from .tfhub_modules import *
 
 # Collect list of exposed symbols.
 from .classifier_metrics import __all__ as classifier_metrics_symbols
 from .eval_utils import __all__ as eval_utils_symbols
 from .inception_metrics import __all__ as inception_metrics_symbols
+from .nearest_neighbor_metrics import __all__ as nearest_neighbor_metrics_symbols
+from .numpy_metrics import __all__ as numpy_metrics_symbols
 from .sliced_wasserstein import __all__ as sliced_wasserstein_symbols
 from .summaries import __all__ as summaries_symbols
+from .tfhub_modules import __all__ as tfhub_modules_symbols
 __all__ = classifier_metrics_symbols
 __all__ += eval_utils_symbols
 __all__ += inception_metrics_symbols
+__all__ += nearest_neighbor_metrics_symbols
+__all__ += numpy_metrics_symbols
 __all__ += sliced_wasserstein_symbols
 __all__ += summaries_symbols
+__all__ += tfhub_modules_symbols
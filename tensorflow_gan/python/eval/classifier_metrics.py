@@ -28,25 +28,102 @@ from tensorflow_gan.python.eval import eval_utils
 import tensorflow_probability as tfp
 
 __all__ = [
+    'configure_classifier_execution',
     'run_classifier_fn',
+    'run_classifier_fn_on_dataset',
     'sample_and_run_classifier_fn',
     'classifier_score',
     'classifier_score_streaming',
     'classifier_score_from_logits',
     'classifier_score_from_logits_streaming',
+    'classwise_classifier_metrics_streaming',
     'frechet_classifier_distance',
     'frechet_classifier_distance_streaming',
     'frechet_classifier_distance_from_activations',
     'frechet_classifier_distance_from_activations_streaming',
+    'frechet_classifier_distance_from_statistics_streaming',
+    'intra_class_frechet_classifier_distance_from_statistics',
     'mean_only_frechet_classifier_distance_from_activations',
     'diagonal_only_frechet_classifier_distance_from_activations',
     'kernel_classifier_distance',
     'kernel_classifier_distance_and_std',
     'kernel_classifier_distance_from_activations',
     'kernel_classifier_distance_and_std_from_activations',
+    'kernel_classifier_distance_and_std_from_activations_streaming',
 ]
 
 
+# How `tf.map_fn` runs classifier batches, see `configure_classifier_execution`.
+_classifier_execution = {
+    'parallel_iterations': 1,
+    'swap_memory': True,
+    'memory_budget_bytes': None,
+}
+
+
+def configure_classifier_execution(parallel_iterations=1, swap_memory=True,
+                                   memory_budget_bytes=None):
+  """Sets how classifier batches are run by the functions in this module.
+
+  With `num_batches > 1`, the classifier runs once per batch in a `tf.map_fn`.
+  By default the batches run one at a time, which keeps memory low but leaves
+  cores idle on multi-core CPU hosts. More parallel iterations let the batches
+  overlap, at the cost of holding several batches' activations at once.
+
+  Args:
+    parallel_iterations: The maximum number of classifier batches that run at
+      the same time.
+    swap_memory: Whether the `tf.map_fn` may swap tensors from GPU to host
+      memory.
+    memory_budget_bytes: If not `None`, caps the parallel iterations so that
+      the classifier inputs in flight fit in this many bytes. The cap applies
+      where the input batch shape is static; with `sample_and_run_classifier_fn`
+      the images are only known inside the loop and `parallel_iterations` is
+      used as is. Since the classifier's intermediate activations are a
+      multiple of its input, leave headroom.
+
+  Raises:
+    ValueError: If `parallel_iterations` is less than 1.
+  """
+  if parallel_iterations < 1:
+    raise ValueError('`parallel_iterations` must be at least 1, was %i.' %
+                     parallel_iterations)
+  _classifier_execution.update(
+      parallel_iterations=parallel_iterations,
+      swap_memory=swap_memory,
+      memory_budget_bytes=memory_budget_bytes)
+
+
+def _classifier_parallel_iterations(elems):
+  """The parallel iterations for mapping a classifier over stacked `elems`."""
+  parallel_iterations = _classifier_execution['parallel_iterations']
+  budget = _classifier_execution['memory_budget_bytes']
+  if budget is None or parallel_iterations == 1:
+    return parallel_iterations
+  batch_shape = elems.shape[1:]
+  if not batch_shape.is_fully_defined():
+    return parallel_iterations
+  batch_bytes = batch_shape.num_elements() * elems.dtype.size
+  return max(1, min(parallel_iterations, budget // max(batch_bytes, 1)))
+
+
+def _map_classifier_fn(fn, elems, dtype=None, name='RunClassifier',
+                       static_batch_shape=True):
+  """Runs `fn` on every batch of the stacked `elems` with `tf.map_fn`."""
+  if static_batch_shape:
+    parallel_iterations = _classifier_parallel_iterations(elems)
+  else:
+    parallel_iterations = _classifier_execution['parallel_iterations']
+  return tf.map_fn(
+      fn=fn,
+      elems=elems,
+      dtype=dtype,
+      parallel_iterations=parallel_iterations,
+      back_prop=False,
+      swap_memory=_classifier_execution['swap_memory'],
+      name=name)
+
+
 def run_classifier_fn(input_tensor,
                       classifier_fn,
                       num_batches=1,
@@ -81,16 +158,11 @@ def run_classifier_fn(input_tensor,
       specified, or is incorrect.
   """
   if num_batches > 1:
-    # Compute the classifier splits using the memory-efficient `map_fn`.
+    # Compute the classifier splits using `map_fn`, see
+    # `configure_classifier_execution`.
     input_list = tf.split(input_tensor, num_or_size_splits=num_batches)
-    classifier_outputs = tf.map_fn(
-        fn=classifier_fn,
-        elems=tf.stack(input_list),
-        dtype=dtypes,
-        parallel_iterations=1,
-        back_prop=False,
-        swap_memory=True,
-        name=name)
+    classifier_outputs = _map_classifier_fn(
+        classifier_fn, tf.stack(input_list), dtype=dtypes, name=name)
     classifier_outputs = tf.nest.map_structure(
         lambda x: tf.concat(tf.unstack(x), 0), classifier_outputs)
   else:
@@ -99,6 +171,36 @@ def run_classifier_fn(input_tensor,
   return classifier_outputs
 
 
+def run_classifier_fn_on_dataset(dataset, classifier_fn, num_parallel_calls=None,
+                                 prefetch_buffer_size=None):
+  """Streams the batches of a `tf.data.Dataset` through a classifier.
+
+  Unlike `run_classifier_fn`, the inputs do not need to be in memory at once:
+  the classifier runs on several batches in parallel inside the input
+  pipeline, and its outputs are prefetched while the consumer, e.g. a
+  streaming metric, handles the previous ones.
+
+  Args:
+    dataset: A `tf.data.Dataset` of classifier input batches.
+    classifier_fn: A function that takes a batch of inputs and returns the
+      outputs of the classifier.
+    num_parallel_calls: The number of batches to run the classifier on at the
+      same time. Defaults to `tf.data.experimental.AUTOTUNE`.
+    prefetch_buffer_size: The number of output batches to prefetch. Defaults to
+      `tf.data.experimental.AUTOTUNE`.
+
+  Returns:
+    A `tf.data.Dataset` of classifier outputs, in the order of `dataset`.
+  """
+  if num_parallel_calls is None:
+    num_parallel_calls = tf.data.experimental.AUTOTUNE
+  if prefetch_buffer_size is None:
+    prefetch_buffer_size = tf.data.experimental.AUTOTUNE
+  return dataset.map(
+      classifier_fn, num_parallel_calls=num_parallel_calls).prefetch(
+          prefetch_buffer_size)
+
+
 def sample_and_run_classifier_fn(sample_fn,
                                  sample_inputs,
                                  classifier_fn,
@@ -142,14 +244,9 @@ def sample_and_run_classifier_fn(sample_fn,
     tensor = sample_fn(x)
     return classifier_fn(tensor)
   if len(sample_inputs) > 1:
-    classifier_outputs = tf.map_fn(
-        fn=_fn,
-        elems=tf.stack(sample_inputs),
-        parallel_iterations=1,
-        back_prop=False,
-        swap_memory=True,
-        dtype=dtypes,
-        name=name)
+    classifier_outputs = _map_classifier_fn(
+        _fn, tf.stack(sample_inputs), dtype=dtypes, name=name,
+        static_batch_shape=False)
     classifier_outputs = tf.nest.map_structure(
         lambda x: tf.concat(tf.unstack(x), 0), classifier_outputs)
   else:
@@ -242,15 +339,10 @@ def _classifier_score_helper(input_tensor,
                              streaming=False):
   """A helper function for evaluating the classifier score."""
   if num_batches > 1:
-    # Compute the classifier splits using the memory-efficient `map_fn`.
+    # Compute the classifier splits using `map_fn`, see
+    # `configure_classifier_execution`.
     input_list = tf.split(input_tensor, num_or_size_splits=num_batches)
-    logits = tf.map_fn(
-        fn=classifier_fn,
-        elems=tf.stack(input_list),
-        parallel_iterations=1,
-        back_prop=False,
-        swap_memory=True,
-        name='RunClassifier')
+    logits = _map_classifier_fn(classifier_fn, tf.stack(input_list))
     logits = tf.concat(tf.unstack(logits), 0)
   else:
     logits = classifier_fn(input_tensor)
@@ -443,11 +535,139 @@ def classifier_score_from_logits_streaming(logits):
   return _classifier_score_from_logits_helper(logits, streaming=True)
 
 
-def batch_trace_sqrt_product(sigma, sigma_v):
-  """...
-  """
+def classwise_classifier_metrics_streaming(logits, labels, nclass,
+                                           label_offset=None,
+                                           discriminator_logits=None,
+                                           updates_collections=None,
+                                           name=None):
+  """Per-class classifier score and accuracies from a single set of sums.
 
-  # Note sqrt_sigma is called "A" in the proof above
+  Replaces separate `classifier_score_from_logits_streaming` and
+  `accuracy_score_from_logits_streaming` metrics over the same logits with one
+  update that adds, per generated label, the number of samples, the sum of the
+  classifier's softmax outputs (the class marginal), the sum of their negative
+  entropies, and the number of top-1 and top-5 hits of the classifier and of
+  top-1 hits of the discriminator. Every metric below is a function of these
+  sums, so a class whose marginal is peaked on another class, or whose score
+  is close to 1, stands out in the per-class values.
+
+  Keeps an internal state that continuously tracks the sums. This internal
+  state should be initialized with tf.initializers.local_variables().
+
+  Args:
+    logits: 2D Tensor of classifier logits of the generated samples, e.g.
+      Inception logits. Shape is [batch_size, num_logits].
+    labels: 1D integer Tensor of the labels the samples were generated with.
+    nclass: The number of generated classes.
+    label_offset: If not None, label `c` is classifier output
+      `c + label_offset`, and the top-1 and top-5 classifier accuracies are
+      tracked, e.g. 1 for ImageNet and the 1008 Inception logits.
+    discriminator_logits: If not None, the 2D Tensor of the discriminator's
+      class logits of the same samples, whose top-1 accuracy is tracked.
+    updates_collections: An optional list of collections that the update ops
+      should be added to.
+    name: An optional variable_scope name.
+
+  Returns:
+    A dict of `(value, update_op)` tuples, as returned by the other streaming
+    metrics, with the keys:
+      'inception_score': The classifier score of all samples.
+      'class_counts': The number of samples of each class, shape [nclass].
+      'class_marginals': The mean classifier output of each class, shape
+        [nclass, num_logits].
+      'class_inception_score': The classifier score within each class, shape
+        [nclass].
+    and if `label_offset` is not None, 'top1_accuracy', 'top5_accuracy',
+    'class_top1_accuracy' and 'class_top5_accuracy', and if
+    `discriminator_logits` is not None, 'discriminator_accuracy' and
+    'class_discriminator_accuracy'. Per-class values are NaN for classes
+    without samples.
+  """
+  logits = tf.convert_to_tensor(value=logits)
+  logits.shape.assert_has_rank(2)
+  logits_dtype = logits.dtype
+  labels = tf.cast(labels, tf.int32)
+
+  with tf.compat.v1.variable_scope(
+      name, 'classwise_classifier_metrics_streaming', (logits, labels)):
+    one_hot = tf.one_hot(labels, nclass, dtype=tf.float64)
+    log_p = tf.nn.log_softmax(tf.cast(logits, tf.float64))
+    p = tf.exp(log_p)
+    # Per-sample values, summed per class below.
+    per_sample = {
+        'counts': tf.ones_like(log_p[:, 0]),
+        'plogp': tf.reduce_sum(input_tensor=p * log_p, axis=1),
+    }
+    if label_offset is not None:
+      targets = labels + label_offset
+      for k in (1, 5):
+        per_sample['top%i' % k] = tf.cast(
+            tf.math.in_top_k(
+                targets=targets, predictions=tf.cast(logits, tf.float32),
+                k=k), tf.float64)
+    if discriminator_logits is not None:
+      per_sample['discriminator'] = tf.cast(
+          tf.equal(tf.argmax(input=discriminator_logits, axis=1,
+                             output_type=tf.int32), labels), tf.float64)
+
+    names = sorted(per_sample)
+    sums = {'p': eval_utils._get_streaming_variable(  # pylint: disable=protected-access
+        name='p', shape=[nclass, logits.shape[1]])}
+    update_sums = {'p': tf.compat.v1.assign_add(
+        sums['p'], tf.matmul(one_hot, p, transpose_a=True))}
+    for key in names:
+      sums[key] = eval_utils._get_streaming_variable(  # pylint: disable=protected-access
+          name=key, shape=[nclass])
+      update_sums[key] = tf.compat.v1.assign_add(
+          sums[key], tf.linalg.matvec(one_hot, per_sample[key],
+                                      transpose_a=True))
+
+    def _metrics(sums):
+      counts = sums['counts']
+      nan = tf.fill([nclass], tf.constant(float('nan'), dtype=tf.float64))
+      def _class_mean(x):
+        return tf.compat.v1.where(
+            counts > 0, tf.compat.v1.div_no_nan(x, counts), nan)
+      def _total_mean(x):
+        return tf.compat.v1.div_no_nan(
+            tf.reduce_sum(input_tensor=x), tf.reduce_sum(input_tensor=counts))
+
+      q = tf.compat.v1.div_no_nan(sums['p'], counts[:, None])
+      class_score = tf.exp(
+          _class_mean(sums['plogp']) -
+          tf.reduce_sum(input_tensor=tf.math.xlogy(q, q), axis=1))
+      total_q = tf.compat.v1.div_no_nan(
+          tf.reduce_sum(input_tensor=sums['p'], axis=0),
+          tf.reduce_sum(input_tensor=counts))
+      result = {
+          'inception_score': tf.exp(
+              _total_mean(sums['plogp']) -
+              tf.reduce_sum(input_tensor=tf.math.xlogy(total_q, total_q))),
+          'class_counts': counts,
+          'class_marginals': q,
+          'class_inception_score': class_score,
+      }
+      for key, metric in (('top1', 'top1_accuracy'),
+                          ('top5', 'top5_accuracy'),
+                          ('discriminator', 'discriminator_accuracy')):
+        if key in sums:
+          result[metric] = _total_mean(sums[key])
+          result['class_' + metric] = _class_mean(sums[key])
+      if logits_dtype != tf.float64:
+        result = {k: tf.cast(v, logits_dtype) for k, v in result.items()}
+      return result
+
+    values = _metrics(sums)
+    update_ops = _metrics(update_sums)
+    if updates_collections:
+      for update_op in update_ops.values():
+        tf.compat.v1.add_to_collections(updates_collections, update_op)
+
+  return {k: (values[k], update_ops[k]) for k in values}
+
+
+def _batch_trace_sqrt_product_svd(sigma, sigma_v):
+  # Note sqrt_sigma is called "A" in the proof of `trace_sqrt_product`
   sqrt_sigma = _batch_symmetric_matrix_square_root(sigma)
 
   # This is sqrt(A sigma_v A) above
@@ -455,7 +675,91 @@ def batch_trace_sqrt_product(sigma, sigma_v):
 
   return tf.linalg.trace(_batch_symmetric_matrix_square_root(sqrt_a_sigmav_a))
 
-def trace_sqrt_product(sigma, sigma_v):
+
+def _batch_trace_sqrt_product_eigh(sigma, sigma_v):
+  """Finds Tr(sqrt(sigma sigma_v)) with one full eigendecomposition.
+
+  With sigma = V diag(e) V^T and B = V diag(sqrt(e)), sigma = B B^T, so
+  sigma sigma_v has the same eigenvalues as the symmetric B^T sigma_v B. Only
+  the eigenvalues of the latter are needed, which is much cheaper than a
+  second full decomposition. Works on single matrices and on batches.
+  """
+  e, v = tf.linalg.eigh(sigma)
+  b = v * tf.expand_dims(tf.sqrt(tf.maximum(e, 0.)), -2)
+  b_sigmav_b = tf.matmul(b, tf.matmul(sigma_v, b), transpose_a=True)
+  # Symmetrize away rounding errors before the symmetric eigensolver.
+  b_sigmav_b = (b_sigmav_b + tf.linalg.matrix_transpose(b_sigmav_b)) / 2.
+  eigenvalues = tf.linalg.eigvalsh(b_sigmav_b)
+  return tf.reduce_sum(
+      input_tensor=tf.sqrt(tf.maximum(eigenvalues, 0.)), axis=-1)
+
+
+_TRACE_SQRT_PRODUCT_METHODS = {
+    'svd': _batch_trace_sqrt_product_svd,
+    'eigh': _batch_trace_sqrt_product_eigh,
+}
+
+
+def batch_trace_sqrt_product(sigma, sigma_v, method='svd', precision=None,
+                             chunk_size=None):
+  """Batched `trace_sqrt_product` over a leading dimension of classes.
+
+  Args:
+    sigma: A Tensor of shape [batch, d, d] of square, symmetric, real, positive
+      semi-definite covariance matrices.
+    sigma_v: Same as sigma.
+    method: 'svd' takes two symmetric matrix square roots by SVD, as
+      `trace_sqrt_product`. 'eigh' needs one symmetric eigendecomposition and
+      the eigenvalues of one more symmetric matrix, see
+      `_batch_trace_sqrt_product_eigh`, and is several times faster.
+    precision: The dtype to compute in, tf.float32 or tf.float64. Defaults to
+      the dtype of `sigma`. The result is cast back to the dtype of `sigma`.
+    chunk_size: If set, process the batch `chunk_size` matrices at a time, one
+      chunk after the other, to bound the memory of the decompositions.
+
+  Returns:
+    A Tensor of shape [batch] with the trace of the positive square root of
+    each sigma*sigma_v.
+
+  Raises:
+    ValueError: If `method` is unknown.
+  """
+  if method not in _TRACE_SQRT_PRODUCT_METHODS:
+    raise ValueError('Unknown trace sqrt product method: %s, expected one of '
+                     '%s.' % (method, sorted(_TRACE_SQRT_PRODUCT_METHODS)))
+  fn = _TRACE_SQRT_PRODUCT_METHODS[method]
+  sigma = tf.convert_to_tensor(value=sigma)
+  sigma_v = tf.convert_to_tensor(value=sigma_v)
+  output_dtype = sigma.dtype
+  if precision is not None:
+    sigma = tf.cast(sigma, precision)
+    sigma_v = tf.cast(sigma_v, precision)
+
+  if chunk_size is None:
+    result = fn(sigma, sigma_v)
+  else:
+    batch_size = tf.shape(input=sigma)[0]
+    num_chunks = (batch_size + chunk_size - 1) // chunk_size
+    chunks = tf.TensorArray(sigma.dtype, size=num_chunks, infer_shape=False)
+
+    def _body(i, chunks):
+      begin = i * chunk_size
+      return i + 1, chunks.write(i, fn(sigma[begin:begin + chunk_size],
+                                       sigma_v[begin:begin + chunk_size]))
+
+    _, chunks = tf.while_loop(
+        cond=lambda i, _: i < num_chunks,
+        body=_body,
+        loop_vars=[tf.constant(0), chunks],
+        parallel_iterations=1)
+    result = chunks.concat()
+
+  if result.dtype != output_dtype:
+    result = tf.cast(result, output_dtype)
+  return result
+
+
+def trace_sqrt_product(sigma, sigma_v, method='svd', precision=None):
   """Find the trace of the positive sqrt of product of covariance matrices.
 
   '_symmetric_matrix_square_root' only works for symmetric matrices, so we
@@ -482,10 +786,16 @@ def trace_sqrt_product(sigma, sigma_v):
   Args:
     sigma: a square, symmetric, real, positive semi-definite covariance matrix
     sigma_v: same as sigma
+    method: 'svd' or 'eigh', see `batch_trace_sqrt_product`.
+    precision: The dtype to compute in, see `batch_trace_sqrt_product`.
 
   Returns:
     The trace of the positive square root of sigma*sigma_v
   """
+  if method != 'svd' or precision is not None:
+    return batch_trace_sqrt_product(
+        tf.expand_dims(sigma, 0), tf.expand_dims(sigma_v, 0), method=method,
+        precision=precision)[0]
 
   # Note sqrt_sigma is called "A" in the proof above
   sqrt_sigma = _symmetric_matrix_square_root(sigma)
@@ -508,15 +818,10 @@ def _frechet_classifier_distance_helper(input_tensor1,
   stack1 = tf.stack(input_list1)
   stack2 = tf.stack(input_list2)
 
-  # Compute the activations using the memory-efficient `map_fn`.
+  # Compute the activations using `map_fn`, see
+  # `configure_classifier_execution`.
   def compute_activations(elems):
-    return tf.map_fn(
-        fn=classifier_fn,
-        elems=elems,
-        parallel_iterations=1,
-        back_prop=False,
-        swap_memory=True,
-        name='RunClassifier')
+    return _map_classifier_fn(classifier_fn, elems)
 
   activations1 = compute_activations(stack1)
   activations2 = compute_activations(stack2)
@@ -745,7 +1050,8 @@ def diagonal_only_frechet_classifier_distance_from_activations(
 
 import pdb
 def _intra_class_frechet_classifier_distance_from_activations_helper(
-  activations1, activations2, labels1, labels2, nclass, streaming=True):
+  activations1, activations2, labels1, labels2, nclass, streaming=True,
+  accumulator_dtype=tf.float64):
   """..."""
   activations1 = tf.convert_to_tensor(value=activations1)
   activations1.shape.assert_has_rank(2)
@@ -753,20 +1059,22 @@ def _intra_class_frechet_classifier_distance_from_activations_helper(
   activations2.shape.assert_has_rank(2)
 
   activations_dtype = activations1.dtype
-  if activations_dtype != tf.float64:
-    activations1 = tf.cast(activations1, tf.float64)
-    activations2 = tf.cast(activations2, tf.float64)
+  if activations_dtype != accumulator_dtype:
+    activations1 = tf.cast(activations1, accumulator_dtype)
+    activations2 = tf.cast(activations2, accumulator_dtype)
   if streaming:
-    # now we keep track of nfeat x nclass
-    m = eval_utils.streaming_classwise_mean_feature_tensor_float64(activations1, labels1, nclass)
-    m_w = eval_utils.streaming_classwise_mean_feature_tensor_float64(activations2, labels2, nclass)
-    
-    sigma = eval_utils.streaming_classwise_autocovariance(activations1, labels1, nclass)
-    sigma_w = eval_utils.streaming_classwise_autocovariance(activations1, labels1, nclass)
+    # now we keep track of nclass x nfeat means and nclass x nfeat x nfeat
+    # covariances
+    m, sigma = eval_utils.streaming_classwise_mean_and_covariance(
+        activations1, labels1, nclass, accumulator_dtype=accumulator_dtype)
+    m_w, sigma_w = eval_utils.streaming_classwise_mean_and_covariance(
+        activations2, labels2, nclass, accumulator_dtype=accumulator_dtype)
   
   
   def _calculate_intra_fid(m, m_w, sigma, sigma_w):
     """Returns the Frechet distance given the sample mean and covariance."""
+    m, m_w, sigma, sigma_w = [
+        tf.cast(value, tf.float64) for value in (m, m_w, sigma, sigma_w)]
     # Find the Tr(sqrt(sigma sigma_w)) component of FID
     sqrt_trace_component = batch_trace_sqrt_product(sigma, sigma_w)
 
@@ -777,7 +1085,7 @@ def _intra_class_frechet_classifier_distance_from_activations_helper(
     trace = tf.linalg.trace(sigma + sigma_w) - 2.0 * sqrt_trace_component
 
     # Next the distance between means.
-    mean = tf.reduce_sum(input_tensor=tf.math.squared_difference( m, m_w), axis=0)  # Equivalent to L2 but more stable.
+    mean = tf.reduce_sum(input_tensor=tf.math.squared_difference( m, m_w), axis=1)  # Equivalent to L2 but more stable.
     fid = trace + mean
     if activations_dtype != tf.float64:
       fid = tf.cast(fid, activations_dtype)
@@ -793,7 +1101,7 @@ def _intra_class_frechet_classifier_distance_from_activations_helper(
     return result[0]
 
 def _frechet_classifier_distance_from_activations_helper(
-    activations1, activations2, streaming=False):
+    activations1, activations2, streaming=False, accumulator_dtype=tf.float64):
   """A helper function evaluating the frechet classifier distance."""
   activations1 = tf.convert_to_tensor(value=activations1)
   activations1.shape.assert_has_rank(2)
@@ -801,18 +1109,23 @@ def _frechet_classifier_distance_from_activations_helper(
   activations2.shape.assert_has_rank(2)
 
   activations_dtype = activations1.dtype
-  if activations_dtype != tf.float64:
-    activations1 = tf.cast(activations1, tf.float64)
-    activations2 = tf.cast(activations2, tf.float64)
+  compute_dtype = accumulator_dtype if streaming else tf.float64
+  if activations_dtype != compute_dtype:
+    activations1 = tf.cast(activations1, compute_dtype)
+    activations2 = tf.cast(activations2, compute_dtype)
 
   # Compute mean and covariance matrices of activations.
   if streaming:
     m = eval_utils.streaming_mean_tensor_float64(
-        tf.reduce_mean(input_tensor=activations1, axis=0))
+        tf.reduce_mean(input_tensor=activations1, axis=0),
+        accumulator_dtype=accumulator_dtype)
     m_w = eval_utils.streaming_mean_tensor_float64(
-        tf.reduce_mean(input_tensor=activations2, axis=0))
-    sigma = eval_utils.streaming_covariance(activations1)
-    sigma_w = eval_utils.streaming_covariance(activations2)
+        tf.reduce_mean(input_tensor=activations2, axis=0),
+        accumulator_dtype=accumulator_dtype)
+    sigma = eval_utils.streaming_covariance(
+        activations1, accumulator_dtype=accumulator_dtype)
+    sigma_w = eval_utils.streaming_covariance(
+        activations2, accumulator_dtype=accumulator_dtype)
   else:
     m = (tf.reduce_mean(input_tensor=activations1, axis=0),)
     m_w = (tf.reduce_mean(input_tensor=activations2, axis=0),)
@@ -829,28 +1142,8 @@ def _frechet_classifier_distance_from_activations_helper(
   # element will be used to calculate the score value and the second will be
   # used to create the update_op. We apply the same operation on the two
   # elements to make sure their value is consistent.
-
-  def _calculate_fid(m, m_w, sigma, sigma_w):
-    """Returns the Frechet distance given the sample mean and covariance."""
-    # Find the Tr(sqrt(sigma sigma_w)) component of FID
-    sqrt_trace_component = trace_sqrt_product(sigma, sigma_w)
-
-    # Compute the two components of FID.
-
-    # First the covariance component.
-    # Here, note that trace(A + B) = trace(A) + trace(B)
-    trace = tf.linalg.trace(sigma + sigma_w) - 2.0 * sqrt_trace_component
-
-    # Next the distance between means.
-    mean = tf.reduce_sum(input_tensor=tf.math.squared_difference(
-        m, m_w))  # Equivalent to L2 but more stable.
-    fid = trace + mean
-    if activations_dtype != tf.float64:
-      fid = tf.cast(fid, activations_dtype)
-    return fid
-
   result = tuple(
-      _calculate_fid(m_val, m_w_val, sigma_val, sigma_w_val)
+      _calculate_fid(m_val, m_w_val, sigma_val, sigma_w_val, activations_dtype)
       for m_val, m_w_val, sigma_val, sigma_w_val in zip(m, m_w, sigma, sigma_w))
   if streaming:
     return result
@@ -858,6 +1151,30 @@ def _frechet_classifier_distance_from_activations_helper(
     return result[0]
 
 
+def _calculate_fid(m, m_w, sigma, sigma_w, activations_dtype):
+  """Returns the Frechet distance given the sample mean and covariance."""
+  # The moments may come from float32 accumulators. The square roots only run
+  # once per evaluation and need the precision, so they are always float64.
+  m, m_w, sigma, sigma_w = [
+      tf.cast(value, tf.float64) for value in (m, m_w, sigma, sigma_w)]
+  # Find the Tr(sqrt(sigma sigma_w)) component of FID
+  sqrt_trace_component = trace_sqrt_product(sigma, sigma_w)
+
+  # Compute the two components of FID.
+
+  # First the covariance component.
+  # Here, note that trace(A + B) = trace(A) + trace(B)
+  trace = tf.linalg.trace(sigma + sigma_w) - 2.0 * sqrt_trace_component
+
+  # Next the distance between means.
+  mean = tf.reduce_sum(input_tensor=tf.math.squared_difference(
+      m, m_w))  # Equivalent to L2 but more stable.
+  fid = trace + mean
+  if activations_dtype != tf.float64:
+    fid = tf.cast(fid, activations_dtype)
+  return fid
+
+
 def frechet_classifier_distance_from_activations(activations1, activations2):
   """Classifier distance for evaluating a generative model.
 
@@ -899,12 +1216,14 @@ def frechet_classifier_distance_from_activations(activations1, activations2):
       activations1, activations2, streaming=False)
 
 def intra_class_frechet_classifier_distance_from_activations_streaming(
-  activations1, activations2, labels1, labels2, nclass):
+  activations1, activations2, labels1, labels2, nclass,
+  accumulator_dtype=tf.float64):
   return _intra_class_frechet_classifier_distance_from_activations_helper(
-    activations1, activations2, labels1, labels2, nclass, streaming=True)
+    activations1, activations2, labels1, labels2, nclass, streaming=True,
+    accumulator_dtype=accumulator_dtype)
 
 def frechet_classifier_distance_from_activations_streaming(
-    activations1, activations2):
+    activations1, activations2, accumulator_dtype=tf.float64):
   """A streaming version of frechet_classifier_distance_from_activations.
 
   Keeps an internal state that continuously tracks the score. This internal
@@ -915,6 +1234,11 @@ def frechet_classifier_distance_from_activations_streaming(
       [batch_size, activation_size].
     activations2: 2D Tensor containing activations. Shape is
       [batch_size, activation_size].
+    accumulator_dtype: The dtype of the running means and covariances,
+      tf.float64 or tf.float32. float32 halves their memory and avoids float64
+      ops while accumulating, with compensated sums whose error does not grow
+      with the number of batches, see `eval_utils._accumulate`. The distance
+      itself is always computed in float64.
 
   Returns:
    A tuple containing the classifier score and a tf.Operation. The tf.Operation
@@ -922,7 +1246,109 @@ def frechet_classifier_distance_from_activations_streaming(
    updating the internal state with the given tensors.
   """
   return _frechet_classifier_distance_from_activations_helper(
-      activations1, activations2, streaming=True)
+      activations1, activations2, streaming=True,
+      accumulator_dtype=accumulator_dtype)
+
+
+def frechet_classifier_distance_from_statistics_streaming(
+    mean1, covariance1, activations2, accumulator_dtype=tf.float64):
+  """A streaming FID against a distribution given by precomputed moments.
+
+  This is `frechet_classifier_distance_from_activations_streaming` for the
+  common case where the first distribution, usually the real data, never
+  changes between evaluations. Its mean and covariance are computed once, e.g.
+  with a single pass over the dataset, and only the second activations are
+  accumulated.
+
+  Keeps an internal state that continuously tracks the score. This internal
+  state should be initialized with tf.initializers.local_variables().
+
+  Args:
+    mean1: 1D Tensor of shape [activation_size], the mean of the first
+      distribution.
+    covariance1: 2D Tensor of shape [activation_size, activation_size], the
+      unbiased covariance of the first distribution.
+    activations2: 2D Tensor containing activations. Shape is
+      [batch_size, activation_size].
+    accumulator_dtype: The dtype of the running moments of `activations2`,
+      see `frechet_classifier_distance_from_activations_streaming`.
+
+  Returns:
+   A tuple containing the classifier score and a tf.Operation. The tf.Operation
+   has the same value as the score, and has an additional side effect of
+   updating the internal state with the given tensors.
+  """
+  activations2 = tf.convert_to_tensor(value=activations2)
+  activations2.shape.assert_has_rank(2)
+  mean1 = tf.cast(mean1, tf.float64)
+  covariance1 = tf.cast(covariance1, tf.float64)
+  mean1.shape.assert_has_rank(1)
+  covariance1.shape.assert_has_rank(2)
+
+  activations_dtype = activations2.dtype
+  if activations_dtype != accumulator_dtype:
+    activations2 = tf.cast(activations2, accumulator_dtype)
+
+  m_w = eval_utils.streaming_mean_tensor_float64(
+      tf.reduce_mean(input_tensor=activations2, axis=0),
+      accumulator_dtype=accumulator_dtype)
+  sigma_w = eval_utils.streaming_covariance(
+      activations2, accumulator_dtype=accumulator_dtype)
+  return tuple(
+      _calculate_fid(mean1, m_w_val, covariance1, sigma_w_val,
+                     activations_dtype)
+      for m_w_val, sigma_w_val in zip(m_w, sigma_w))
+
+
+def intra_class_frechet_classifier_distance_from_statistics(
+    class_means1, class_covariances1, class_means2, class_covariances2,
+    trace_sqrt_method='svd', trace_sqrt_precision=None, chunk_size=None):
+  """Per-class Frechet distances between two sets of class-conditional moments.
+
+  The moments are usually accumulated in a single pass over a dataset that
+  routes every activation to the statistics of its class. The matrix square
+  roots of all classes are then computed as one batch, so callers should pass
+  as many classes at a time as fit in memory.
+
+  Args:
+    class_means1: 2D Tensor of shape [num_classes, activation_size].
+    class_covariances1: 3D Tensor of shape
+      [num_classes, activation_size, activation_size] with the unbiased
+      covariance of each class.
+    class_means2: Same as `class_means1`, for the second distribution.
+    class_covariances2: Same as `class_covariances1`, for the second
+      distribution.
+    trace_sqrt_method: 'svd' or 'eigh', see `batch_trace_sqrt_product`.
+    trace_sqrt_precision: The dtype of the matrix square roots, see
+      `batch_trace_sqrt_product`. Defaults to float64.
+    chunk_size: If set, the square roots are computed `chunk_size` classes at
+      a time.
+
+  Returns:
+    A 1D Tensor of shape [num_classes] with the Frechet distance of each class,
+    of the same type as `class_means1`.
+  """
+  class_means1 = tf.convert_to_tensor(value=class_means1)
+  class_means1.shape.assert_has_rank(2)
+  class_covariances1 = tf.convert_to_tensor(value=class_covariances1)
+  class_covariances1.shape.assert_has_rank(3)
+
+  activations_dtype = class_means1.dtype
+  m = tf.cast(class_means1, tf.float64)
+  m_w = tf.cast(class_means2, tf.float64)
+  sigma = tf.cast(class_covariances1, tf.float64)
+  sigma_w = tf.cast(class_covariances2, tf.float64)
+
+  sqrt_trace_component = batch_trace_sqrt_product(
+      sigma, sigma_w, method=trace_sqrt_method,
+      precision=trace_sqrt_precision, chunk_size=chunk_size)
+  trace = tf.linalg.trace(sigma + sigma_w) - 2.0 * sqrt_trace_component
+  mean = tf.reduce_sum(
+      input_tensor=tf.math.squared_difference(m, m_w), axis=1)
+  fid = trace + mean
+  if activations_dtype != tf.float64:
+    fid = tf.cast(fid, activations_dtype)
+  return fid
 
 
 def kernel_classifier_distance(input_tensor1,
@@ -1064,15 +1490,10 @@ def kernel_classifier_distance_and_std(input_tensor1,
   stack1 = tf.stack(input_list1)
   stack2 = tf.stack(input_list2)
 
-  # Compute the activations using the memory-efficient `map_fn`.
+  # Compute the activations using `map_fn`, see
+  # `configure_classifier_execution`.
   def compute_activations(elems):
-    return tf.map_fn(
-        fn=classifier_fn,
-        elems=elems,
-        parallel_iterations=1,
-        back_prop=False,
-        swap_memory=True,
-        name='RunClassifier')
+    return _map_classifier_fn(classifier_fn, elems)
 
   acts1 = compute_activations(stack1)
   acts2 = compute_activations(stack2)
@@ -1278,3 +1699,104 @@ def kernel_classifier_distance_and_std_from_activations(activations1,
           n_blocks_ - 1))
 
   return mn, tf.sqrt(var / n_blocks_)
+
+
+def _kid_block_estimate(r, g, dtype):
+  """The unbiased KID estimate of a single block of activations."""
+  dim = tf.cast(tf.shape(input=r)[1], dtype)
+  m = tf.cast(tf.shape(input=r)[0], dtype)
+  n = tf.cast(tf.shape(input=g)[0], dtype)
+  k_rr = (tf.matmul(r, r, transpose_b=True) / dim + 1)**3
+  k_rg = (tf.matmul(r, g, transpose_b=True) / dim + 1)**3
+  k_gg = (tf.matmul(g, g, transpose_b=True) / dim + 1)**3
+  return (-2 * tf.reduce_mean(input_tensor=k_rg) +
+          (tf.reduce_sum(input_tensor=k_rr) - tf.linalg.trace(k_rr)) /
+          (m * (m - 1)) +
+          (tf.reduce_sum(input_tensor=k_gg) - tf.linalg.trace(k_gg)) /
+          (n * (n - 1)))
+
+
+def kernel_classifier_distance_and_std_from_activations_streaming(
+    activations1, activations2, dtype=None, updates_collections=None,
+    name=None):
+  """A streaming version of kernel_classifier_distance_and_std_from_activations.
+
+  Every call of the update op treats its pair of activation batches as one
+  block of the block estimator, and only adds the block's estimate and its
+  square to running sums. The distance and its standard error are the mean and
+  the standard error of the block estimates, as in the non-streaming version
+  with `max_block_size` equal to the batch size, but without holding all
+  activations in memory.
+
+  As with the non-streaming version, the batches should be in random order, and
+  every batch needs at least two rows of each activations.
+
+  Keeps an internal state that continuously tracks the score. This internal
+  state should be initialized with tf.initializers.local_variables().
+
+  Args:
+    activations1: 2D Tensor containing activations. Shape is
+      [batch_size, activation_size].
+    activations2: 2D Tensor containing activations. Shape is
+      [batch_size, activation_size].
+    dtype: If not None, coerce activations to this dtype before computing the
+      kernels. The running sums are always float64.
+    updates_collections: An optional list of collections that the update ops
+      should be added to.
+    name: An optional variable_scope name.
+
+  Returns:
+    Two tuples `(kid, kid_update_op), (std, std_update_op)`. `kid` is the
+    Kernel Inception Distance and `std` the estimate of its standard error, NaN
+    until two blocks have been seen. The update ops have the same values, and
+    the side effect of adding the given batches as a new block.
+  """
+  activations1 = tf.convert_to_tensor(value=activations1)
+  activations2 = tf.convert_to_tensor(value=activations2)
+  activations1.shape.assert_has_rank(2)
+  activations2.shape.assert_has_rank(2)
+  activations1.shape[1:2].assert_is_compatible_with(activations2.shape[1:2])
+
+  if dtype is None:
+    dtype = activations1.dtype
+    assert activations2.dtype == dtype
+  else:
+    activations1 = tf.cast(activations1, dtype)
+    activations2 = tf.cast(activations2, dtype)
+  output_dtype = dtype
+
+  with tf.compat.v1.variable_scope(
+      name, 'kernel_classifier_distance_streaming',
+      (activations1, activations2)):
+    num_blocks = eval_utils._get_streaming_variable(  # pylint: disable=protected-access
+        name='num_blocks', shape=[])
+    total = eval_utils._get_streaming_variable(  # pylint: disable=protected-access
+        name='total', shape=[])
+    total_squares = eval_utils._get_streaming_variable(  # pylint: disable=protected-access
+        name='total_squares', shape=[])
+
+    estimate = tf.cast(
+        _kid_block_estimate(activations1, activations2, dtype), tf.float64)
+    update_total = tf.compat.v1.assign_add(total, estimate)
+    update_total_squares = tf.compat.v1.assign_add(total_squares,
+                                                   tf.square(estimate))
+    with tf.control_dependencies([update_total, update_total_squares]):
+      update_num_blocks = tf.compat.v1.assign_add(num_blocks, 1.)
+
+    def _kid_and_std(n, s, ss):
+      mean = tf.compat.v1.div_no_nan(s, n)
+      # The Bessel corrected variance of the block estimates.
+      var = tf.maximum(ss - n * tf.square(mean), 0.) / tf.maximum(n - 1, 1.)
+      std = tf.compat.v1.where(
+          n > 1, tf.sqrt(var / tf.maximum(n, 1.)),
+          tf.constant(float('nan'), dtype=tf.float64))
+      return (tf.cast(mean, output_dtype), tf.cast(std, output_dtype))
+
+    kid, std = _kid_and_std(num_blocks, total, total_squares)
+    kid_update_op, std_update_op = _kid_and_std(
+        update_num_blocks, update_total, update_total_squares)
+    if updates_collections:
+      tf.compat.v1.add_to_collections(updates_collections, kid_update_op)
+      tf.compat.v1.add_to_collections(updates_collections, std_update_op)
+
+  return (kid, kid_update_op), (std, std_update_op)
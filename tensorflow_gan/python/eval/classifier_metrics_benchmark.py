@@ -0,0 +1,104 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks for the trace sqrt product engines in classifier_metrics.
+
+Compares the speed of `batch_trace_sqrt_product` with the SVD and the
+eigendecomposition engines, in float32 and float64, on a batch of 2048x2048
+covariances. The absolute error against the float64 SVD engine is reported
+in the benchmark extras.
+
+Run with:
+  python -m tensorflow_gan.python.eval.classifier_metrics_benchmark \
+    --benchmarks=.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_gan.python.eval import classifier_metrics
+
+_DIM = 2048
+_NUM_CLASSES = 4
+# Like intra FID on ImageNet, fewer samples per class than dimensions.
+_NUM_SAMPLES = 1024
+
+
+def _random_covariances(rs):
+  return np.stack([
+      np.cov(rs.gamma(0.5, size=[_NUM_SAMPLES, _DIM]), rowvar=False)
+      for _ in range(_NUM_CLASSES)])
+
+
+class TraceSqrtProductBenchmark(tf.test.Benchmark):
+
+  def __init__(self):
+    super(TraceSqrtProductBenchmark, self).__init__()
+    rs = np.random.RandomState(0)
+    self._sigma = _random_covariances(rs)
+    self._sigma_v = _random_covariances(rs)
+    self._reference = None
+
+  def _evaluate(self, method, precision, chunk_size=None):
+    with tf.Graph().as_default():
+      sigma = tf.constant(self._sigma)
+      sigma_v = tf.constant(self._sigma_v)
+      result = classifier_metrics.batch_trace_sqrt_product(
+          sigma, sigma_v, method=method, precision=precision,
+          chunk_size=chunk_size)
+      with tf.compat.v1.Session() as sess:
+        value = sess.run(result)
+        timing = self.run_op_benchmark(
+            sess, result, burn_iters=1, min_iters=3, store_memory_usage=True,
+            name='%s_%s_chunk_%s' % (method, precision.name, chunk_size))
+    return value, timing
+
+  def _benchmark(self, method, precision, chunk_size=None):
+    if self._reference is None:
+      self._reference, _ = self._evaluate('svd', tf.float64)
+    value, _ = self._evaluate(method, precision, chunk_size)
+    self.report_benchmark(
+        name='%s_%s_chunk_%s_error' % (method, precision.name, chunk_size),
+        iters=1,
+        extras={
+            'max_abs_error_vs_svd_float64':
+                float(np.max(np.abs(value - self._reference))),
+            'max_rel_error_vs_svd_float64':
+                float(np.max(np.abs(value - self._reference) /
+                             np.abs(self._reference))),
+        })
+
+  def benchmark_svd_float64(self):
+    self._benchmark('svd', tf.float64)
+
+  def benchmark_svd_float32(self):
+    self._benchmark('svd', tf.float32)
+
+  def benchmark_eigh_float64(self):
+    self._benchmark('eigh', tf.float64)
+
+  def benchmark_eigh_float32(self):
+    self._benchmark('eigh', tf.float32)
+
+  def benchmark_eigh_float64_chunked(self):
+    self._benchmark('eigh', tf.float64, chunk_size=1)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -674,6 +674,205 @@ class UtilsTest(tf.test.TestCase, parameterized.TestCase):
 
     self.assertAllClose(actual_tsp, expected_tsp, 0.01)
 
+  @parameterized.parameters(
+      {'method': 'svd', 'precision': None, 'chunk_size': 1},
+      {'method': 'eigh', 'precision': None, 'chunk_size': None},
+      {'method': 'eigh', 'precision': tf.float64, 'chunk_size': 2},
+      {'method': 'eigh', 'precision': tf.float32, 'chunk_size': 1},
+  )
+  def test_batch_trace_sqrt_product_methods(self, method, precision,
+                                            chunk_size):
+    from tensorflow_gan.python.eval.classifier_metrics import batch_trace_sqrt_product
+    """Test the `batch_trace_sqrt_product` engines against scipy."""
+    np.random.seed(0)
+
+    test_pool_real_a = np.random.randn(3, 512, 64)
+    test_pool_gen_a = np.random.randn(3, 512, 64)
+    cov_real = np.stack(
+        [np.cov(pool, rowvar=False) for pool in test_pool_real_a])
+    cov_gen = np.stack(
+        [np.cov(pool, rowvar=False) for pool in test_pool_gen_a])
+
+    trace_sqrt_prod_op = batch_trace_sqrt_product(
+        cov_real, cov_gen, method=method, precision=precision,
+        chunk_size=chunk_size)
+
+    with self.cached_session() as sess:
+      actual_tsp = sess.run(trace_sqrt_prod_op)
+
+    expected_tsp = np.stack([
+        _expected_trace_sqrt_product(cov_real[i], cov_gen[i])
+        for i in range(3)])
+
+    self.assertEqual(np.float64, actual_tsp.dtype)
+    self.assertAllClose(actual_tsp, expected_tsp, 0.001)
+
+  def test_frechet_classifier_distance_from_statistics_streaming(self):
+    from tensorflow_gan.python.eval.classifier_metrics import frechet_classifier_distance_from_statistics_streaming
+    """Test FID against precomputed moments of the first distribution."""
+    np.random.seed(0)
+
+    num_streaming_calls = 4
+    test_pool_real_a = np.float32(np.random.randn(2048, 256))
+    test_pool_gen_a = np.float32(
+        np.random.randn(num_streaming_calls * 512, 256))
+
+    mean_real = np.mean(test_pool_real_a, axis=0)
+    cov_real = np.cov(test_pool_real_a, rowvar=False)
+    gen_placeholder = tf.compat.v1.placeholder(tf.float32, shape=[512, 256])
+    fid_value, fid_update_op = (
+        frechet_classifier_distance_from_statistics_streaming(
+            mean_real, cov_real, gen_placeholder))
+
+    with self.cached_session() as sess:
+      sess.run(tf.compat.v1.local_variables_initializer())
+      for i in range(num_streaming_calls):
+        sess.run(fid_update_op, feed_dict={
+            gen_placeholder: test_pool_gen_a[(512 * i):(512 * (i + 1))]})
+      actual_fid = sess.run(fid_value)
+
+    expected_fid = _expected_fid(test_pool_real_a, test_pool_gen_a)
+
+    self.assertAllClose(expected_fid, actual_fid, 0.0001)
+
+  def test_kernel_classifier_distance_and_std_streaming(self):
+    from tensorflow_gan.python.eval.classifier_metrics import kernel_classifier_distance_and_std_from_activations
+    from tensorflow_gan.python.eval.classifier_metrics import kernel_classifier_distance_and_std_from_activations_streaming
+    """Test that streaming batches as blocks matches the block estimator."""
+    np.random.seed(0)
+
+    num_streaming_calls = 4
+    batch_size = 64
+    test_pool_real_a = np.random.randn(num_streaming_calls * batch_size, 32)
+    test_pool_gen_a = np.random.randn(num_streaming_calls * batch_size, 32) + .1
+
+    real_placeholder = tf.compat.v1.placeholder(tf.float64, [batch_size, 32])
+    gen_placeholder = tf.compat.v1.placeholder(tf.float64, [batch_size, 32])
+    (kid, kid_update_op), (std, std_update_op) = (
+        kernel_classifier_distance_and_std_from_activations_streaming(
+            real_placeholder, gen_placeholder))
+    expected_kid, expected_std = (
+        kernel_classifier_distance_and_std_from_activations(
+            tf.constant(test_pool_real_a), tf.constant(test_pool_gen_a),
+            max_block_size=batch_size))
+
+    with self.cached_session() as sess:
+      sess.run(tf.compat.v1.local_variables_initializer())
+      for i in range(num_streaming_calls):
+        sl = slice(batch_size * i, batch_size * (i + 1))
+        sess.run([kid_update_op, std_update_op], feed_dict={
+            real_placeholder: test_pool_real_a[sl],
+            gen_placeholder: test_pool_gen_a[sl]})
+      actual_kid, actual_std = sess.run([kid, std])
+      expected_kid, expected_std = sess.run([expected_kid, expected_std])
+
+    self.assertAllClose(expected_kid, actual_kid)
+    self.assertAllClose(expected_std, actual_std)
+
+  @parameterized.parameters(True, False)
+  def test_frechet_classifier_distance_float32_accumulators(
+      self, from_statistics):
+    from tensorflow_gan.python.eval.classifier_metrics import frechet_classifier_distance_from_activations_streaming
+    from tensorflow_gan.python.eval.classifier_metrics import frechet_classifier_distance_from_statistics_streaming
+    """Test compensated float32 accumulators against the float64 path."""
+    np.random.seed(0)
+
+    num_streaming_calls = 20
+    batch_size = 64
+    dim = 32
+    # Non-negative activations with a large mean, like pool_3, so that the
+    # running sums are much larger than the covariances.
+    test_pool_real_a = np.float32(np.abs(
+        np.random.randn(num_streaming_calls * batch_size, dim) + 4))
+    test_pool_gen_a = np.float32(np.abs(
+        np.random.randn(num_streaming_calls * batch_size, dim) * 1.2 + 4.1))
+
+    real_placeholder = tf.compat.v1.placeholder(tf.float32, [batch_size, dim])
+    gen_placeholder = tf.compat.v1.placeholder(tf.float32, [batch_size, dim])
+    fids = {}
+    for dtype in (tf.float64, tf.float32):
+      if from_statistics:
+        fids[dtype] = frechet_classifier_distance_from_statistics_streaming(
+            np.mean(test_pool_real_a, axis=0),
+            np.cov(test_pool_real_a, rowvar=False), gen_placeholder,
+            accumulator_dtype=dtype)
+      else:
+        fids[dtype] = frechet_classifier_distance_from_activations_streaming(
+            real_placeholder, gen_placeholder, accumulator_dtype=dtype)
+
+    with self.cached_session() as sess:
+      sess.run(tf.compat.v1.local_variables_initializer())
+      for i in range(num_streaming_calls):
+        sl = slice(batch_size * i, batch_size * (i + 1))
+        sess.run([update for _, update in fids.values()], feed_dict={
+            real_placeholder: test_pool_real_a[sl],
+            gen_placeholder: test_pool_gen_a[sl]})
+      actual = sess.run({dtype: value for dtype, (value, _) in fids.items()})
+
+    expected_fid = _expected_fid(test_pool_real_a, test_pool_gen_a)
+    self.assertAllClose(expected_fid, actual[tf.float64], rtol=1e-4)
+    self.assertAllClose(actual[tf.float64], actual[tf.float32], rtol=1e-3)
+
+  def test_classwise_classifier_metrics_streaming(self):
+    from tensorflow_gan.python.eval.classifier_metrics import classwise_classifier_metrics_streaming
+    """Test the fused per-class metrics against NumPy on all batches."""
+    np.random.seed(0)
+
+    num_streaming_calls = 3
+    batch_size = 40
+    nclass = 5
+    n = num_streaming_calls * batch_size
+    logits = np.random.randn(n, 2 * nclass) * 3
+    # Class 3 is never generated.
+    labels = np.random.randint(0, nclass - 1, size=[n])
+    disc_logits = np.random.randn(n, nclass)
+
+    logits_placeholder = tf.compat.v1.placeholder(
+        tf.float64, [batch_size, 2 * nclass])
+    labels_placeholder = tf.compat.v1.placeholder(tf.int64, [batch_size])
+    disc_placeholder = tf.compat.v1.placeholder(tf.float64, [batch_size, nclass])
+    metrics = classwise_classifier_metrics_streaming(
+        logits_placeholder, labels_placeholder, nclass, label_offset=1,
+        discriminator_logits=disc_placeholder)
+    update_op = tf.group([update for _, update in metrics.values()])
+
+    with self.cached_session() as sess:
+      sess.run(tf.compat.v1.local_variables_initializer())
+      for i in range(num_streaming_calls):
+        sl = slice(batch_size * i, batch_size * (i + 1))
+        sess.run(update_op, feed_dict={
+            logits_placeholder: logits[sl],
+            labels_placeholder: labels[sl],
+            disc_placeholder: disc_logits[sl]})
+      actual = sess.run({k: value for k, (value, _) in metrics.items()})
+
+    top1 = np.argmax(logits, axis=1) == labels + 1
+    top5 = np.sum(logits > logits[np.arange(n), labels + 1][:, None],
+                  axis=1) < 5
+    disc = np.argmax(disc_logits, axis=1) == labels
+
+    self.assertAllClose(_expected_inception_score(logits),
+                        actual['inception_score'])
+    self.assertAllClose(np.mean(top1), actual['top1_accuracy'])
+    self.assertAllClose(np.mean(top5), actual['top5_accuracy'])
+    self.assertAllClose(np.mean(disc), actual['discriminator_accuracy'])
+    for c in range(nclass - 1):
+      mask = labels == c
+      self.assertEqual(np.sum(mask), actual['class_counts'][c])
+      self.assertAllClose(_expected_inception_score(logits[mask]),
+                          actual['class_inception_score'][c])
+      self.assertAllClose(np.mean(top1[mask]),
+                          actual['class_top1_accuracy'][c])
+      self.assertAllClose(np.mean(top5[mask]),
+                          actual['class_top5_accuracy'][c])
+      self.assertAllClose(np.mean(disc[mask]),
+                          actual['class_discriminator_accuracy'][c])
+    self.assertEqual(0, actual['class_counts'][nclass - 1])
+    self.assertTrue(np.isnan(actual['class_inception_score'][nclass - 1]))
+    self.assertTrue(np.isnan(actual['class_top1_accuracy'][nclass - 1]))
+    self.assertAllClose(np.ones([nclass - 1]),
+                        np.sum(actual['class_marginals'][:nclass - 1], axis=1))
+
   # def test_invalid_input(self):
   #   """Test that functions properly fail on invalid input."""
   #   p = tf.zeros([8, 10])
@@ -698,5 +897,58 @@ class UtilsTest(tf.test.TestCase, parameterized.TestCase):
   #     kl_divergence(p, p_logits, tf.zeros([10, 8]))
 
 
+
+class ClassifierExecutionTest(tf.test.TestCase, parameterized.TestCase):
+
+  def tearDown(self):
+    from tensorflow_gan.python.eval import classifier_metrics
+    classifier_metrics.configure_classifier_execution()
+    super(ClassifierExecutionTest, self).tearDown()
+
+  @parameterized.parameters(
+      {'parallel_iterations': 1, 'memory_budget_bytes': None},
+      {'parallel_iterations': 4, 'memory_budget_bytes': None},
+      {'parallel_iterations': 4, 'memory_budget_bytes': 1},
+  )
+  def test_run_classifier_fn_parallel(self, parallel_iterations,
+                                      memory_budget_bytes):
+    from tensorflow_gan.python.eval import classifier_metrics
+    classifier_metrics.configure_classifier_execution(
+        parallel_iterations=parallel_iterations,
+        memory_budget_bytes=memory_budget_bytes)
+    img = np.random.randn(8, 4, 4, 2).astype(np.float32)
+    results = classifier_metrics.run_classifier_fn(
+        tf.constant(img), lambda x: {'2x': 2 * x}, num_batches=4,
+        dtypes={'2x': tf.float32})
+    with self.cached_session() as sess:
+      self.assertAllClose(2 * img, sess.run(results)['2x'])
+
+  def test_memory_budget_caps_parallel_iterations(self):
+    from tensorflow_gan.python.eval import classifier_metrics
+    # Each batch of 2x4x4x2 float32 is 256 bytes.
+    elems = tf.zeros([4, 2, 4, 4, 2])
+    classifier_metrics.configure_classifier_execution(
+        parallel_iterations=8, memory_budget_bytes=600)
+    self.assertEqual(
+        2, classifier_metrics._classifier_parallel_iterations(elems))
+    classifier_metrics.configure_classifier_execution(
+        parallel_iterations=8, memory_budget_bytes=1)
+    self.assertEqual(
+        1, classifier_metrics._classifier_parallel_iterations(elems))
+    classifier_metrics.configure_classifier_execution(parallel_iterations=8)
+    self.assertEqual(
+        8, classifier_metrics._classifier_parallel_iterations(elems))
+
+  def test_run_classifier_fn_on_dataset(self):
+    from tensorflow_gan.python.eval import classifier_metrics
+    img = np.random.randn(6, 4, 4, 2).astype(np.float32)
+    ds = tf.data.Dataset.from_tensor_slices(img).batch(2)
+    outputs = classifier_metrics.run_classifier_fn_on_dataset(
+        ds, lambda x: 2 * x, num_parallel_calls=3)
+    next_output = tf.compat.v1.data.make_one_shot_iterator(outputs).get_next()
+    with self.cached_session() as sess:
+      actual = np.concatenate([sess.run(next_output) for _ in range(3)])
+    self.assertAllClose(2 * img, actual)
+
 if __name__ == '__main__':
   tf.test.main()
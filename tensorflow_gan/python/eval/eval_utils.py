@@ -172,11 +172,11 @@ def image_reshaper(images, num_cols=None):
   return tf.expand_dims(img, 0)
 
 
-def _get_streaming_variable(name, shape):
+def _get_streaming_variable(name, shape, dtype=tf.float64):
   return tf.compat.v1.get_variable(
       name=name,
       shape=shape,
-      dtype=tf.float64,
+      dtype=dtype,
       initializer=tf.compat.v1.initializers.zeros(),
       trainable=False,
       collections=[
@@ -185,7 +185,74 @@ def _get_streaming_variable(name, shape):
       ])
 
 
-def streaming_mean_tensor_float64(values, updates_collections=None, name=None):
+# Streaming metrics accumulate their sums in one of these dtypes. float32 sums
+# are compensated, see `_accumulate`.
+_ACCUMULATOR_DTYPES = (tf.float64, tf.float32)
+
+
+def _check_accumulator_dtype(accumulator_dtype):
+  if accumulator_dtype not in _ACCUMULATOR_DTYPES:
+    raise ValueError("accumulator_dtype must be one of %s, got %s." % (
+        [dtype.name for dtype in _ACCUMULATOR_DTYPES], accumulator_dtype))
+
+
+def _get_streaming_accumulator(name, shape, dtype):
+  """Returns the variable of a running sum and its compensation, or `None`."""
+  total = _get_streaming_variable(name=name, shape=shape, dtype=dtype)
+  if dtype == tf.float64:
+    return total, None
+  return total, _get_streaming_variable(
+      name=name + "_compensation", shape=shape, dtype=dtype)
+
+
+def _accumulate(accumulator, values):
+  """Adds `values` to an accumulator and returns the updated sum.
+
+  float64 sums are plain `assign_add`s. float32 sums use Kahan summation: the
+  compensation variable keeps the low-order bits that were lost when adding
+  the previous update and subtracts them from the next one. The error of the
+  sum of n updates u_i is then bounded by (2 eps + O(n eps^2)) sum |u_i|,
+  with eps = 2^-24, instead of (n - 1) eps sum |u_i| for a plain float32 sum,
+  so it does not grow with the number of eval batches.
+
+  Args:
+    accumulator: A tuple of the sum variable and its compensation variable, or
+      `None`, from `_get_streaming_accumulator`.
+    values: The `Tensor` to add.
+
+  Returns:
+    A `Tensor` with the value of the sum after the update.
+  """
+  total, compensation = accumulator
+  if compensation is None:
+    return tf.compat.v1.assign_add(total, values)
+  old_total = total.read_value()
+  compensated = values - compensation.read_value()
+  new_total = old_total + compensated
+  update_compensation = tf.compat.v1.assign(
+      compensation, (new_total - old_total) - compensated)
+  update_total = tf.compat.v1.assign(total, new_total)
+  with tf.control_dependencies([update_compensation]):
+    return tf.identity(update_total)
+
+
+def _accumulate_rows(accumulator, indices, updates):
+  """Like `_accumulate`, for the rows `indices` of the sum, which are unique."""
+  total, compensation = accumulator
+  if compensation is None:
+    return tf.compat.v1.scatter_add(total, indices, updates)
+  old_rows = tf.gather(total, indices)
+  compensated = updates - tf.gather(compensation, indices)
+  new_rows = old_rows + compensated
+  update_compensation = tf.compat.v1.scatter_update(
+      compensation, indices, (new_rows - old_rows) - compensated)
+  update_total = tf.compat.v1.scatter_update(total, indices, new_rows)
+  with tf.control_dependencies([update_compensation]):
+    return tf.identity(update_total)
+
+
+def streaming_mean_tensor_float64(values, updates_collections=None, name=None,
+                                  accumulator_dtype=tf.float64):
   """A version of tf.metrics.mean_tensor that handles float64 values.
 
   Unlike tf.metrics.mean_tensor, current implementation does not support
@@ -196,37 +263,41 @@ def streaming_mean_tensor_float64(values, updates_collections=None, name=None):
     updates_collections: An optional list of collections that `update_op` should
       be added to.
     name: An optional variable_scope name.
+    accumulator_dtype: tf.float64, or tf.float32 for compensated float32 sums
+      with half the memory and no float64 ops, see `_accumulate`.
 
   Returns:
-    mean: A float64 `Tensor` representing the current mean, the value of `total`
-      divided by `count`.
+    mean: A `Tensor` of `accumulator_dtype` representing the current mean, the
+      value of `total` divided by `count`.
     update_op: An operation that increments the `total` and `count` variables
       appropriately and whose value matches `mean_value`.
 
   Raises:
-    ValueError: If `updates_collections` is not a list or tuple.
+    ValueError: If `updates_collections` is not a list or tuple, or
+      `accumulator_dtype` is not supported.
     RuntimeError: If eager execution is enabled.
   """
   # Code below copied from the implementation of tf.metrics.mean_tensor.
   if tf.executing_eagerly():
     raise RuntimeError("streaming_mean_tensor_float64 is not supported when "
                        "eager execution is enabled.")
-  if values.dtype != tf.float64:
-    values = tf.cast(values, tf.float64)
+  _check_accumulator_dtype(accumulator_dtype)
+  if values.dtype != accumulator_dtype:
+    values = tf.cast(values, accumulator_dtype)
 
   with tf.compat.v1.variable_scope(name, "streaming_mean_tensor_float64",
                                    (values,)):
-    total = _get_streaming_variable(
-        name="total_tensor", shape=values.get_shape())
-    count = _get_streaming_variable(
-        name="count_tensor", shape=values.get_shape())
+    total = _get_streaming_accumulator(
+        "total_tensor", values.get_shape(), accumulator_dtype)
+    count = _get_streaming_accumulator(
+        "count_tensor", values.get_shape(), accumulator_dtype)
 
     num_values = tf.ones_like(values)
-    update_total_op = tf.compat.v1.assign_add(total, values)
+    update_total_op = _accumulate(total, values)
     with tf.control_dependencies([values]):
-      update_count_op = tf.compat.v1.assign_add(count, num_values)
+      update_count_op = _accumulate(count, num_values)
 
-    mean_t = tf.compat.v1.div_no_nan(total, count)
+    mean_t = tf.compat.v1.div_no_nan(total[0], count[0])
     update_op = tf.compat.v1.div_no_nan(
         update_total_op, tf.maximum(update_count_op, 0), name="update_op")
     if updates_collections:
@@ -288,12 +359,18 @@ def streaming_classwise_mean_feature_tensor_float64(x, labels, nclass, updates_c
     return mean_t, update_op
 
 
-def streaming_covariance(x, y=None, updates_collections=None, name=None):
+def streaming_covariance(x, y=None, updates_collections=None, name=None,
+                         accumulator_dtype=tf.float64):
   """A streaming an unbiased version of tfp.stats.covariance.
 
   Implementation based on
   https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Online.
 
+  The running means are centred before the outer products are summed, so the
+  float32 accumulators are not subject to the cancellation of E[xy] - E[x]E[y].
+  Each batch's product is itself a float32 matmul whose error is on the order
+  of batch_size * eps relative to the sum of |x - mean| |y - mean|.
+
   Args:
     x: A 2D numeric `Tensor` holding samples.
     y: Optional Tensor with same dtype and shape as `x`. Default value: `None`
@@ -301,24 +378,28 @@ def streaming_covariance(x, y=None, updates_collections=None, name=None):
     updates_collections: An optional list of collections that `update_op` should
       be added to.
     name: An optional variable_scope name.
-
+    accumulator_dtype: tf.float64, or tf.float32 for compensated float32 sums
+      with half the memory and no float64 ops, see `_accumulate`.
 
   Returns:
-    covariance: A float64 `Tensor` holding the sample covariance matrix.
+    covariance: A `Tensor` of `accumulator_dtype` holding the sample covariance
+      matrix.
     update_op: An operation that updates the internal variables appropriately
       and whose value matches `covariance`.
 
   Raises:
-    ValueError: If `updates_collections` is not a list or tuple.
+    ValueError: If `updates_collections` is not a list or tuple, or
+      `accumulator_dtype` is not supported.
     RuntimeError: If eager execution is enabled.
   """
   if tf.executing_eagerly():
     raise RuntimeError("streaming_covariance is not supported when "
                        "eager execution is enabled.")
-  if x.dtype != tf.float64:
-    x = tf.cast(x, tf.float64)
-  if y is not None and y.dtype != tf.float64:
-    y = tf.cast(y, tf.float64)
+  _check_accumulator_dtype(accumulator_dtype)
+  if x.dtype != accumulator_dtype:
+    x = tf.cast(x, accumulator_dtype)
+  if y is not None and y.dtype != accumulator_dtype:
+    y = tf.cast(y, accumulator_dtype)
 
   if y is None:
     y = x
@@ -329,30 +410,36 @@ def streaming_covariance(x, y=None, updates_collections=None, name=None):
   y_event_shape = y.get_shape()[1:]
 
   with tf.compat.v1.variable_scope(name, "streaming_covariance", (x, y)):
-    n = _get_streaming_variable(name="n", shape=[])
-    meanx = _get_streaming_variable(name="meanx", shape=x_event_shape)
-    meany = _get_streaming_variable(name="meany", shape=y_event_shape)
-    cov_matrix = _get_streaming_variable(
-        name="cov_matrix",
-        shape=x_event_shape.as_list() + y_event_shape.as_list())
-
-  num_values = tf.cast(tf.shape(input=x)[0], dtype=tf.float64)
+    n_accumulator = _get_streaming_accumulator("n", [], accumulator_dtype)
+    meanx_accumulator = _get_streaming_accumulator(
+        "meanx", x_event_shape, accumulator_dtype)
+    meany_accumulator = _get_streaming_accumulator(
+        "meany", y_event_shape, accumulator_dtype)
+    cov_matrix_accumulator = _get_streaming_accumulator(
+        "cov_matrix", x_event_shape.as_list() + y_event_shape.as_list(),
+        accumulator_dtype)
+  n = n_accumulator[0]
+  meanx = meanx_accumulator[0]
+  meany = meany_accumulator[0]
+  cov_matrix = cov_matrix_accumulator[0]
+
+  num_values = tf.cast(tf.shape(input=x)[0], dtype=accumulator_dtype)
   dx = tf.reduce_mean(input_tensor=x, axis=0) - meanx
   dy = tf.reduce_mean(input_tensor=y, axis=0) - meany
   # (x_1 + ... + x_n + x_{n+1} + ... + x_{n+m}) / (n + m)
   # = (x_1 + ... + x_n) / n
   #   + m * ((x_{n+1} + ... + x_{n+m}) / m - (x_1 + ... + x_n) / n) / (n + m).
-  meany_update_op = tf.compat.v1.assign_add(meany, (num_values /
-                                                    (n + num_values)) * dy)
+  meany_update_op = _accumulate(meany_accumulator,
+                                (num_values / (n + num_values)) * dy)
   with tf.control_dependencies([meany_update_op]):
-    cov_matrix_update_op = tf.compat.v1.assign_add(
-        cov_matrix,
+    cov_matrix_update_op = _accumulate(
+        cov_matrix_accumulator,
         tf.matmul(a=x - meanx, b=y - meany_update_op, transpose_a=True))
   with tf.control_dependencies([cov_matrix_update_op]):
-    meanx_update_op = tf.compat.v1.assign_add(meanx, (num_values /
-                                                      (n + num_values)) * dx)
+    meanx_update_op = _accumulate(meanx_accumulator,
+                                  (num_values / (n + num_values)) * dx)
   with tf.control_dependencies([meanx_update_op, meany_update_op]):
-    update_n_op = tf.compat.v1.assign_add(n, num_values)
+    update_n_op = _accumulate(n_accumulator, num_values)
 
   result = tf.compat.v1.div_no_nan(cov_matrix, n - 1.)
   update_op = tf.compat.v1.div_no_nan(
@@ -433,3 +520,117 @@ def streaming_classwise_autocovariance(x, labels, nclass, updates_collections=No
     tf.compat.v1.add_to_collections(updates_collections, update_op)
 
   return result, update_op
+
+
+def streaming_classwise_mean_and_covariance(x, labels, nclass,
+                                            updates_collections=None,
+                                            name=None,
+                                            accumulator_dtype=tf.float64):
+  """Streaming per-class means and unbiased covariances, e.g. for intra FID.
+
+  Unlike `streaming_classwise_autocovariance`, which tiles the whole batch
+  `nclass` times, this accumulates per-class sufficient statistics (count, sum
+  and sum of outer products) with scatter updates. Only the classes present in
+  a batch are touched, one [d, d] outer product at a time, so temporaries are
+  proportional to the batch and not to batch x nclass. By default everything
+  is kept in float64, where the cancellation in E[xx^T] - E[x]E[x]^T is
+  negligible for classifier activations.
+
+  With float32 accumulators, which halve the [nclass, d, d] buffers, the sums
+  are compensated as in `_accumulate`, so their error does not grow with the
+  number of batches. The cancellation then bounds the relative error of a
+  covariance entry by about eps (|mean_i mean_j| + |E[x_i x_j]|) /
+  |cov_ij|, with eps = 2^-24. For pool_3 activations, whose means and standard
+  deviations are of the same order, this is around 1e-6.
+
+  Args:
+    x: A 2D numeric `Tensor` of shape [batch_size, d] holding samples.
+    labels: A 1D integer `Tensor` of shape [batch_size] with the class of each
+      sample, in [0, nclass).
+    nclass: The number of classes, a python int.
+    updates_collections: An optional list of collections that the update ops
+      should be added to.
+    name: An optional variable_scope name.
+    accumulator_dtype: tf.float64, or tf.float32 for compensated float32 sums
+      with half the memory and no float64 ops.
+
+  Returns:
+    mean: A tuple of a `Tensor` of `accumulator_dtype` and shape [nclass, d]
+      holding the per-class means, and its update op.
+    covariance: A tuple of a `Tensor` of `accumulator_dtype` and shape
+      [nclass, d, d] holding the per-class sample covariance matrices, and its
+      update op. Classes with fewer than two samples have zero covariance.
+
+  Raises:
+    ValueError: If `updates_collections` is not a list or tuple, or
+      `accumulator_dtype` is not supported.
+    RuntimeError: If eager execution is enabled.
+  """
+  if tf.executing_eagerly():
+    raise RuntimeError("streaming_classwise_mean_and_covariance is not "
+                       "supported when eager execution is enabled.")
+  _check_accumulator_dtype(accumulator_dtype)
+  if x.dtype != accumulator_dtype:
+    x = tf.cast(x, accumulator_dtype)
+  x.shape.assert_has_rank(2)
+  feature_shape = x.get_shape()[1:].as_list()
+  labels = tf.cast(tf.reshape(labels, [-1]), tf.int32)
+
+  with tf.compat.v1.variable_scope(
+      name, "streaming_classwise_mean_and_covariance", [x, labels]):
+    count_accumulator = _get_streaming_accumulator(
+        "count", [nclass], accumulator_dtype)
+    total_accumulator = _get_streaming_accumulator(
+        "total", [nclass] + feature_shape, accumulator_dtype)
+    total_outer_accumulator = _get_streaming_accumulator(
+        "total_outer", [nclass] + feature_shape + feature_shape,
+        accumulator_dtype)
+  count = count_accumulator[0]
+  total = total_accumulator[0]
+  total_outer = total_outer_accumulator[0]
+
+  # Sum the batch per class first, so that every class row is updated once.
+  classes, class_index = tf.unique(labels)
+  num_classes_in_batch = tf.size(input=classes)
+  update_count_op = _accumulate_rows(
+      count_accumulator, classes,
+      tf.math.unsorted_segment_sum(
+          tf.ones_like(labels, dtype=accumulator_dtype), class_index,
+          num_classes_in_batch))
+  update_total_op = _accumulate_rows(
+      total_accumulator, classes,
+      tf.math.unsorted_segment_sum(x, class_index, num_classes_in_batch))
+
+  def _add_class_outer_product(i):
+    in_class = tf.boolean_mask(tensor=x, mask=tf.equal(labels, classes[i]))
+    outer = tf.matmul(a=in_class, b=in_class, transpose_a=True)
+    update = _accumulate_rows(
+        total_outer_accumulator, classes[i:i + 1], tf.expand_dims(outer, 0))
+    with tf.control_dependencies([update]):
+      return i + 1
+
+  update_outer_op = tf.while_loop(
+      cond=lambda i: i < num_classes_in_batch,
+      body=_add_class_outer_product,
+      loop_vars=[tf.constant(0)],
+      parallel_iterations=1)
+
+  def _mean_and_covariance(count, total, total_outer):
+    n = tf.expand_dims(count, 1)
+    mean = tf.compat.v1.div_no_nan(total, n)
+    scatter = total_outer - tf.expand_dims(n, 2) * tf.matmul(
+        tf.expand_dims(mean, 2), tf.expand_dims(mean, 1))
+    covariance = tf.compat.v1.div_no_nan(
+        scatter, tf.expand_dims(tf.maximum(n - 1., 0.), 2))
+    return mean, covariance
+
+  mean, covariance = _mean_and_covariance(count, total, total_outer)
+  with tf.control_dependencies(
+      [update_count_op, update_total_op, update_outer_op]):
+    mean_update_op, covariance_update_op = _mean_and_covariance(
+        count.read_value(), total.read_value(), total_outer.read_value())
+  if updates_collections:
+    tf.compat.v1.add_to_collections(updates_collections, mean_update_op)
+    tf.compat.v1.add_to_collections(updates_collections, covariance_update_op)
+
+  return (mean, mean_update_op), (covariance, covariance_update_op)
@@ -0,0 +1,92 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks for the classwise streaming covariances in eval_utils.
+
+Compares the step time and peak allocator memory of one update of
+`streaming_classwise_autocovariance` (which tiles the batch once per class)
+with `streaming_classwise_mean_and_covariance` (which scatters per-class
+sufficient statistics), for Inception pool_3 sized features.
+
+Run with:
+  python -m tensorflow_gan.python.eval.eval_utils_benchmark --benchmarks=.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_gan.python.eval import eval_utils
+
+_DIM = 2048
+_BATCH_SIZE = 64
+
+
+class ClasswiseCovarianceBenchmark(tf.test.Benchmark):
+
+  def _run(self, fn, nclass, name):
+    with tf.Graph().as_default():
+      x = tf.constant(
+          np.random.randn(_BATCH_SIZE, _DIM).astype(np.float32))
+      labels = tf.constant(
+          np.random.randint(0, nclass, size=[_BATCH_SIZE]).astype(np.int32))
+      update_op = fn(x, labels, nclass)
+      with tf.compat.v1.Session() as sess:
+        sess.run(tf.compat.v1.initializers.local_variables())
+        self.run_op_benchmark(
+            sess,
+            update_op,
+            burn_iters=2,
+            min_iters=10,
+            store_memory_usage=True,
+            name='%s_nclass_%i' % (name, nclass),
+            extras={'nclass': nclass, 'batch_size': _BATCH_SIZE, 'dim': _DIM})
+
+  def _benchmark_tiled(self, nclass):
+    def fn(x, labels, nclass):
+      return eval_utils.streaming_classwise_autocovariance(x, labels, nclass)[1]
+    self._run(fn, nclass, 'tiled_autocovariance')
+
+  def _benchmark_scattered(self, nclass):
+    def fn(x, labels, nclass):
+      mean, covariance = eval_utils.streaming_classwise_mean_and_covariance(
+          x, labels, nclass)
+      return tf.group(mean[1], covariance[1])
+    self._run(fn, nclass, 'scattered_mean_and_covariance')
+
+  def benchmark_tiled_autocovariance_10_classes(self):
+    self._benchmark_tiled(10)
+
+  def benchmark_scattered_mean_and_covariance_10_classes(self):
+    self._benchmark_scattered(10)
+
+  def benchmark_tiled_autocovariance_50_classes(self):
+    self._benchmark_tiled(50)
+
+  def benchmark_scattered_mean_and_covariance_50_classes(self):
+    self._benchmark_scattered(50)
+
+  def benchmark_tiled_autocovariance_100_classes(self):
+    self._benchmark_tiled(100)
+
+  def benchmark_scattered_mean_and_covariance_100_classes(self):
+    self._benchmark_scattered(100)
+
+
+if __name__ == '__main__':
+  tf.test.main()
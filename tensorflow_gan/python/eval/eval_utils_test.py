@@ -19,6 +19,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf
 from tensorflow.python.framework.ops import disable_eager_execution
@@ -73,7 +74,7 @@ flags.DEFINE_integer( 'tpu_gan_estimator_g_step', 1, '...')
 #     images.shape.assert_is_compatible_with([1, 13 * 32, 2 * 32, 3])
 
 
-class StreamingUtilsTest(tf.test.TestCase):
+class StreamingUtilsTest(tf.test.TestCase, parameterized.TestCase):
 
   def test_mean_correctness(self):
     from tensorflow_gan.python.eval import eval_utils
@@ -570,6 +571,55 @@ class StreamingUtilsTest(tf.test.TestCase):
       result = sess.run(value)
       self.assertAllClose(expected_result, result, rtol=1e-15, atol=1e-15)
 
+  @parameterized.parameters(tf.float64, tf.float32)
+  def test_classwise_mean_and_covariance_random_batches(
+      self, accumulator_dtype):
+    from tensorflow_gan.python.eval import eval_utils
+    """Checks streaming_classwise_mean_and_covariance against numpy."""
+    if tf.executing_eagerly():
+      # tf.placeholder() is not compatible with eager execution.
+      return
+    np.random.seed(0)
+
+    nclass = 4
+    batch_size = 6
+    num_batches = 5
+    data = np.random.randn(num_batches * batch_size, 3)
+    # Class 3 never appears and class 2 only once.
+    labels = np.random.randint(0, 2, size=[num_batches * batch_size])
+    labels[7] = 2
+
+    placeholder = tf.compat.v1.placeholder(
+        dtype=tf.float32, shape=(batch_size, 3))
+    placeholder_labs = tf.compat.v1.placeholder(
+        dtype=tf.int32, shape=(batch_size,))
+    (mean, mean_update_op), (cov, cov_update_op) = (
+        eval_utils.streaming_classwise_mean_and_covariance(
+            x=placeholder, labels=placeholder_labs, nclass=nclass,
+            accumulator_dtype=accumulator_dtype))
+    self.assertEqual(accumulator_dtype, cov.dtype)
+
+    expected_mean = np.zeros([nclass, 3])
+    expected_cov = np.zeros([nclass, 3, 3])
+    for c in range(2):
+      expected_mean[c] = np.mean(data[labels == c], axis=0)
+      expected_cov[c] = np.cov(data[labels == c], rowvar=False)
+    expected_mean[2] = data[7]
+    with self.cached_session() as sess:
+      sess.run(tf.compat.v1.initializers.local_variables())
+      for i in range(num_batches):
+        batch = slice(i * batch_size, (i + 1) * batch_size)
+        mean_update_result, cov_update_result = sess.run(
+            [mean_update_op, cov_update_op],
+            feed_dict={placeholder: data[batch],
+                       placeholder_labs: labels[batch]})
+        mean_result, cov_result = sess.run([mean, cov])
+        self.assertAllClose(mean_update_result, mean_result)
+        self.assertAllClose(cov_update_result, cov_result)
+      # overall
+      self.assertAllClose(expected_mean, mean_result, rtol=1e-5)
+      self.assertAllClose(expected_cov, cov_result, rtol=1e-5)
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -46,7 +46,7 @@ import six
 
 import tensorflow as tf
 from tensorflow_gan.python.eval import classifier_metrics
-import tensorflow_hub as tfhub
+from tensorflow_gan.python.eval import tfhub_modules
 
 
 __all__ = [
@@ -78,6 +78,8 @@ def classifier_fn_from_tfhub(tfhub_module, output_fields, return_tensor=False):
 
   Wrapping the TF-Hub module in another function defers loading the module until
   use, which is useful for mocking and not computing heavy default arguments.
+  The module is loaded through `load_tfhub_module`, so it is loaded once per
+  graph and shared by every classifier function of the same handle.
 
   Args:
     tfhub_module: A string handle for a TF-Hub module.
@@ -91,7 +93,7 @@ def classifier_fn_from_tfhub(tfhub_module, output_fields, return_tensor=False):
   if isinstance(output_fields, six.string_types):
     output_fields = [output_fields]
   def _classifier_fn(images):
-    output = tfhub.load(tfhub_module)(images)
+    output = tfhub_modules.load_tfhub_module(tfhub_module)(images)
     if output_fields is not None:
       output = {x: output[x] for x in output_fields}
     if return_tensor:
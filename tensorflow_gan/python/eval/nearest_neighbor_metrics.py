@@ -0,0 +1,303 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""k-nearest-neighbour precision, recall, density and coverage.
+
+Precision and recall come from https://arxiv.org/abs/1904.06991, density and
+coverage from https://arxiv.org/abs/2002.09797. All four compare classifier
+activations (e.g. Inception pool_3) of real and generated images through balls
+around each sample whose radius is the distance to its k-th nearest neighbour.
+Unlike FID they separate fidelity (precision, density) from diversity (recall,
+coverage), so high-fidelity, low-diversity generators stand out.
+
+Distances are computed in NumPy on CPU, one [block_size, block_size] tile at a
+time, so the full pairwise distance matrix of 50k x 50k samples is never held
+in memory. The k-NN radii of the real activations only depend on the real data
+and can be computed once in a `NearestNeighborIndex` and reused for every
+checkpoint. An index can be saved as `.npy` files and memory-mapped by later
+runs, with the activations written block by block, so real sets of ImageNet
+size need neither be held in memory nor have their real-real distances
+recomputed.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+__all__ = [
+    'NearestNeighborIndex',
+    'nearest_neighbor_radii',
+    'nearest_neighbor_distances',
+    'precision_recall_density_coverage',
+    'write_nearest_neighbor_activations',
+]
+
+_ACTIVATIONS_FILE = 'activations.npy'
+
+
+def _radii_file(k):
+  return 'radii_k%i.npy' % k
+
+
+def _squared_norms(x):
+  return np.einsum('ij,ij->i', x, x)
+
+
+def _squared_distance_tiles(x, y, block_size):
+  """Yields (row_start, col_start, tile) of squared distances of x and y.
+
+  Args:
+    x: An array of shape [n, dim].
+    y: An array of shape [m, dim].
+    block_size: The number of rows and columns of each tile.
+
+  Yields:
+    The tiles of the float64 [n, m] matrix of squared Euclidean distances, in
+    row-major order.
+  """
+  y_norms = None
+  for i in range(0, x.shape[0], block_size):
+    x_block = np.asarray(x[i:i + block_size], dtype=np.float64)
+    x_norms = _squared_norms(x_block)
+    if y_norms is None:
+      y_norms = [
+          _squared_norms(np.asarray(y[j:j + block_size], dtype=np.float64))
+          for j in range(0, y.shape[0], block_size)
+      ]
+    for b, j in enumerate(range(0, y.shape[0], block_size)):
+      y_block = np.asarray(y[j:j + block_size], dtype=np.float64)
+      tile = x_norms[:, None] + y_norms[b][None, :]
+      tile -= 2 * np.dot(x_block, y_block.T)
+      np.maximum(tile, 0, out=tile)
+      yield i, j, tile
+
+
+def nearest_neighbor_radii(activations, k, block_size=4096):
+  """Returns the distance of every sample to its k-th nearest neighbour.
+
+  Args:
+    activations: An array of shape [n, dim], e.g. a memory-mapped `.npy` file.
+    k: The neighbour whose distance is the radius, not counting the sample
+      itself.
+    block_size: The number of rows and columns of each distance tile.
+
+  Returns:
+    A float64 array of shape [n].
+
+  Raises:
+    ValueError: If there are not more than `k` samples.
+  """
+  n = activations.shape[0]
+  if n <= k:
+    raise ValueError('Need more than k=%i samples, got %i.' % (k, n))
+  radii = np.zeros([n], dtype=np.float64)
+  nearest = None
+  for i, j, tile in _squared_distance_tiles(activations, activations,
+                                            block_size):
+    # Keep the k + 1 smallest squared distances of each row, which include the
+    # distance of 0 to the sample itself.
+    nearest = tile if j == 0 else np.concatenate([nearest, tile], axis=1)
+    if nearest.shape[1] > k + 1:
+      nearest = np.partition(nearest, k, axis=1)[:, :k + 1]
+    if j + block_size >= n:
+      radii[i:i + tile.shape[0]] = np.sqrt(
+          np.partition(nearest, k, axis=1)[:, k])
+  return radii
+
+
+class NearestNeighborIndex(object):
+  """Activations with the radius of their k-nearest-neighbour balls.
+
+  Build one for the real activations once and pass it to
+  `precision_recall_density_coverage` for every checkpoint.
+  """
+
+  def __init__(self, activations, k=5, block_size=4096, radii=None):
+    """Computes the k-NN radii of `activations` unless `radii` are given.
+
+    Args:
+      activations: An array of shape [n, dim].
+      k: The number of nearest neighbours defining each ball.
+      block_size: The number of rows and columns of each distance tile.
+      radii: Precomputed radii of shape [n], e.g. from an earlier index.
+    """
+    self.activations = activations
+    self.k = k
+    if radii is None:
+      radii = nearest_neighbor_radii(activations, k, block_size)
+    self.radii = np.asarray(radii, dtype=np.float64)
+
+  def save(self, prefix):
+    """Writes the activations and the k-NN radii of the index to `prefix`.
+
+    The files are `{prefix}activations.npy` and `{prefix}radii_k<k>.npy`. The
+    activations are stored as float32. They are not rewritten if they are
+    already memory-mapped from that file.
+
+    Args:
+      prefix: A local path prefix, e.g. a directory ending in '/'.
+    """
+    activations_path = prefix + _ACTIVATIONS_FILE
+    if not (isinstance(self.activations, np.memmap) and
+            os.path.abspath(self.activations.filename) ==
+            os.path.abspath(activations_path)):
+      np.save(activations_path,
+              np.asarray(self.activations, dtype=np.float32))
+    np.save(prefix + _radii_file(self.k), self.radii)
+
+  @classmethod
+  def load(cls, prefix, k, block_size=4096):
+    """Memory-maps an index written by `save`.
+
+    The activations may also come from `write_nearest_neighbor_activations`.
+    If there are no radii for `k` yet, they are computed once and saved, so an
+    index can be extended to new values of `k` incrementally.
+
+    Args:
+      prefix: The local path prefix the index was written with.
+      k: The number of nearest neighbours defining each ball.
+      block_size: The number of rows and columns of each distance tile, if the
+        radii need to be computed.
+
+    Returns:
+      A `NearestNeighborIndex` whose activations and radii are read-only
+      memory maps.
+    """
+    activations = np.load(prefix + _ACTIVATIONS_FILE, mmap_mode='r')
+    radii_path = prefix + _radii_file(k)
+    if os.path.exists(radii_path):
+      return cls(activations, k, radii=np.load(radii_path, mmap_mode='r'))
+    index = cls(activations, k, block_size)
+    np.save(radii_path, index.radii)
+    return index
+
+
+def write_nearest_neighbor_activations(prefix, activation_blocks, num_rows,
+                                       dim):
+  """Streams activations into the memory-mapped activations of an index.
+
+  Args:
+    prefix: A local path prefix, see `NearestNeighborIndex.load`.
+    activation_blocks: An iterable of arrays of shape [n, dim], e.g. the shards
+      written while computing real statistics.
+    num_rows: The total number of rows of all blocks.
+    dim: The number of columns of the activations.
+
+  Returns:
+    The path of the written `.npy` file.
+
+  Raises:
+    ValueError: If the blocks do not have `num_rows` rows in total.
+  """
+  path = prefix + _ACTIVATIONS_FILE
+  out = np.lib.format.open_memmap(
+      path, mode='w+', dtype=np.float32, shape=(num_rows, dim))
+  start = 0
+  for block in activation_blocks:
+    if start + block.shape[0] > num_rows:
+      raise ValueError('Got more than num_rows=%i activations.' % num_rows)
+    out[start:start + block.shape[0]] = block
+    start += block.shape[0]
+  if start != num_rows:
+    raise ValueError('Expected %i activations, got %i.' % (num_rows, start))
+  out.flush()
+  del out
+  return path
+
+
+def nearest_neighbor_distances(real, queries, block_size=4096):
+  """Returns the nearest real sample of every query, e.g. to find memorisation.
+
+  Args:
+    real: A `NearestNeighborIndex` or an array of shape [n, dim].
+    queries: An array of shape [m, dim], e.g. generated activations.
+    block_size: The number of rows and columns of each distance tile.
+
+  Returns:
+    A tuple of the float64 distances of shape [m] of each query to its nearest
+    real sample and the int64 indices of that sample. Queries whose distance is
+    far below the real radii are likely copies of training images.
+  """
+  if isinstance(real, NearestNeighborIndex):
+    real = real.activations
+  distances = np.full([queries.shape[0]], np.inf)
+  indices = np.zeros([queries.shape[0]], dtype=np.int64)
+  for i, j, tile in _squared_distance_tiles(queries, real, block_size):
+    rows = slice(i, i + tile.shape[0])
+    nearest = np.argmin(tile, axis=1)
+    nearest_distances = tile[np.arange(tile.shape[0]), nearest]
+    closer = nearest_distances < distances[rows]
+    distances[rows] = np.where(closer, nearest_distances, distances[rows])
+    indices[rows] = np.where(closer, nearest + j, indices[rows])
+  return np.sqrt(distances), indices
+
+
+def precision_recall_density_coverage(real, fake_activations, k=5,
+                                      block_size=4096):
+  """Computes the k-NN precision, recall, density and coverage.
+
+  Args:
+    real: A `NearestNeighborIndex` of the real activations, or the real
+      activations as an array of shape [n, dim].
+    fake_activations: The generated activations, an array of shape [m, dim].
+    k: The number of nearest neighbours, if `real` is an array. Otherwise the
+      `k` of the index is used.
+    block_size: The number of rows and columns of each distance tile.
+
+  Returns:
+    A dict of python floats:
+      'precision': The fraction of fake samples within the k-NN ball of some
+        real sample.
+      'recall': The fraction of real samples within the k-NN ball of some fake
+        sample.
+      'density': The average number of real k-NN balls containing a fake
+        sample, divided by k.
+      'coverage': The fraction of real samples whose k-NN ball contains some
+        fake sample.
+  """
+  if not isinstance(real, NearestNeighborIndex):
+    real = NearestNeighborIndex(real, k, block_size)
+  k = real.k
+  fake_radii = nearest_neighbor_radii(fake_activations, k, block_size)
+  real_squared_radii = np.square(real.radii)
+  fake_squared_radii = np.square(fake_radii)
+
+  num_real = real.activations.shape[0]
+  num_fake = fake_activations.shape[0]
+  fake_in_real_ball = np.zeros([num_fake], dtype=bool)
+  real_balls_per_fake = np.zeros([num_fake], dtype=np.int64)
+  real_covered = np.zeros([num_real], dtype=bool)
+  real_in_fake_ball = np.zeros([num_real], dtype=bool)
+  for i, j, tile in _squared_distance_tiles(real.activations,
+                                            fake_activations, block_size):
+    rows = slice(i, i + tile.shape[0])
+    cols = slice(j, j + tile.shape[1])
+    in_real_ball = tile <= real_squared_radii[rows, None]
+    fake_in_real_ball[cols] |= np.any(in_real_ball, axis=0)
+    real_balls_per_fake[cols] += np.sum(in_real_ball, axis=0)
+    real_covered[rows] |= np.any(in_real_ball, axis=1)
+    real_in_fake_ball[rows] |= np.any(
+        tile <= fake_squared_radii[None, cols], axis=1)
+
+  return {
+      'precision': float(np.mean(fake_in_real_ball)),
+      'recall': float(np.mean(real_in_fake_ball)),
+      'density': float(np.sum(real_balls_per_fake)) / (k * num_fake),
+      'coverage': float(np.mean(real_covered)),
+  }
@@ -0,0 +1,147 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for TF-GAN nearest_neighbor_metrics."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import parameterized
+import numpy as np
+from scipy.spatial import distance as scp_distance
+
+import tensorflow as tf
+
+from absl import flags
+
+flags.DEFINE_float('aux_cond_generator_weight', None,
+                  'How to scale generator ACGAN loss relative to WGAN loss, default is None. Try 0.1')
+flags.DEFINE_float('aux_cond_discriminator_weight', None,
+                  'How to scale the critic ACGAN loss relative to WGAN loss, default is None. Try 1.0')
+flags.DEFINE_float('aux_mhinge_cond_generator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('aux_mhinge_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_ssl_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_integer( 'tpu_gan_estimator_d_step', 1, '...')
+flags.DEFINE_integer( 'tpu_gan_estimator_g_step', 1, '...')
+
+from tensorflow_gan.python.eval import nearest_neighbor_metrics  # pylint: disable=g-import-not-at-top
+
+
+def _expected_prdc(real, fake, k):
+  """Brute-force precision, recall, density and coverage."""
+  def radii(x):
+    return np.sort(scp_distance.cdist(x, x), axis=1)[:, k]
+  real_radii = radii(real)
+  fake_radii = radii(fake)
+  d = scp_distance.cdist(real, fake)
+  in_real_ball = d <= real_radii[:, None]
+  return {
+      'precision': np.mean(np.any(in_real_ball, axis=0)),
+      'recall': np.mean(np.any(d <= fake_radii[None, :], axis=1)),
+      'density': np.sum(in_real_ball) / float(k * fake.shape[0]),
+      'coverage': np.mean(np.min(d, axis=1) <= real_radii),
+  }
+
+
+class NearestNeighborMetricsTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.parameters(7, 64, 1000)
+  def test_radii_match_brute_force(self, block_size):
+    rs = np.random.RandomState(0)
+    x = rs.normal(size=[150, 8])
+    expected = np.sort(scp_distance.cdist(x, x), axis=1)[:, 3]
+    actual = nearest_neighbor_metrics.nearest_neighbor_radii(
+        x, 3, block_size=block_size)
+    self.assertAllClose(expected, actual)
+
+  @parameterized.parameters(16, 1000)
+  def test_prdc_match_brute_force(self, block_size):
+    rs = np.random.RandomState(0)
+    real = rs.normal(size=[200, 8])
+    # Low diversity: the fake samples only cover part of the real support.
+    fake = rs.normal(scale=0.5, size=[120, 8]) + 0.3
+    expected = _expected_prdc(real, fake, 5)
+
+    index = nearest_neighbor_metrics.NearestNeighborIndex(
+        real, k=5, block_size=block_size)
+    actual = nearest_neighbor_metrics.precision_recall_density_coverage(
+        index, fake, block_size=block_size)
+    self.assertAllClose(expected, actual)
+    self.assertLess(actual['recall'], actual['precision'])
+
+    # Reusing the radii gives the same result.
+    reused = nearest_neighbor_metrics.NearestNeighborIndex(
+        real, k=5, radii=index.radii)
+    self.assertAllClose(
+        actual,
+        nearest_neighbor_metrics.precision_recall_density_coverage(
+            reused, fake, block_size=block_size))
+
+  def test_save_and_load(self):
+    rs = np.random.RandomState(0)
+    real = rs.normal(size=[100, 8]).astype(np.float32)
+    prefix = self.get_temp_dir() + '/index_'
+    nearest_neighbor_metrics.write_nearest_neighbor_activations(
+        prefix, np.split(real, [30, 70]), 100, 8)
+
+    # The radii are computed on the first load and reused afterwards.
+    index = nearest_neighbor_metrics.NearestNeighborIndex.load(
+        prefix, k=3, block_size=16)
+    self.assertIsInstance(index.activations, np.memmap)
+    self.assertAllClose(
+        nearest_neighbor_metrics.nearest_neighbor_radii(real, 3), index.radii)
+    loaded = nearest_neighbor_metrics.NearestNeighborIndex.load(prefix, k=3)
+    self.assertAllEqual(index.radii, loaded.radii)
+
+    # An index for another k shares the activations.
+    other = nearest_neighbor_metrics.NearestNeighborIndex(real, k=5)
+    other.save(prefix)
+    loaded = nearest_neighbor_metrics.NearestNeighborIndex.load(prefix, k=5)
+    self.assertAllEqual(real, loaded.activations)
+    self.assertAllClose(other.radii, loaded.radii)
+
+  def test_write_wrong_number_of_rows(self):
+    prefix = self.get_temp_dir() + '/short_'
+    with self.assertRaisesRegexp(ValueError, 'Expected 10'):
+      nearest_neighbor_metrics.write_nearest_neighbor_activations(
+          prefix, [np.zeros([4, 2])], 10, 2)
+
+  @parameterized.parameters(7, 1000)
+  def test_nearest_neighbor_distances(self, block_size):
+    rs = np.random.RandomState(0)
+    real = rs.normal(size=[80, 8])
+    queries = rs.normal(size=[50, 8])
+    queries[:5] = real[10:15]
+    d = scp_distance.cdist(queries, real)
+    distances, indices = nearest_neighbor_metrics.nearest_neighbor_distances(
+        nearest_neighbor_metrics.NearestNeighborIndex(real, k=3), queries,
+        block_size=block_size)
+    self.assertAllClose(np.min(d, axis=1), distances)
+    self.assertAllEqual(np.argmin(d, axis=1), indices)
+    self.assertAllEqual(np.arange(10, 15), indices[:5])
+
+  def test_too_few_samples(self):
+    with self.assertRaisesRegexp(ValueError, 'more than k'):
+      nearest_neighbor_metrics.nearest_neighbor_radii(np.zeros([3, 2]), 3)
+
+
+if __name__ == '__main__':
+  tf.test.main()
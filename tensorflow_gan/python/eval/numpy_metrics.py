@@ -0,0 +1,470 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pure NumPy classifier metrics computed from activations saved on disk.
+
+These mirror `frechet_classifier_distance_from_activations`,
+`kernel_classifier_distance_and_std_from_activations`,
+`classifier_score_from_logits` and the sliced Wasserstein distance
+numerically, but run on CPU without building a TF graph or session.
+Activations are read as memory-mapped `.npy` files, one file or a list of
+shards of shape [num_images, dim], and are streamed in blocks, so many
+checkpoints can be scored in parallel worker processes, e.g. with
+`multiprocessing.Pool.map` over a list of activation files.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+__all__ = [
+    'StreamingMoments',
+    'ClasswiseStreamingMoments',
+    'iterate_activation_blocks',
+    'moments_from_activation_files',
+    'frechet_distance_from_moments',
+    'frechet_classifier_distance_from_activation_files',
+    'kernel_classifier_distance_and_std_from_activation_files',
+    'classifier_score_from_logit_files',
+    'PatchReservoir',
+    'sliced_wasserstein_distance_from_samples',
+]
+
+
+def _merge_moments(count, mean, scatter, x):
+  """Merges the samples `x` into running moments, updating `scatter` in place.
+
+  Uses Chan's parallel update of Welford's algorithm.
+
+  Args:
+    count: The number of samples seen so far.
+    mean: The running mean of shape [dim].
+    scatter: The running sum of centered outer products, shape [dim, dim].
+    x: New samples of shape [n, dim].
+
+  Returns:
+    The new (count, mean).
+  """
+  n_b = x.shape[0]
+  if n_b == 0:
+    return count, mean
+  x = x.astype(np.float64)
+  mean_b = np.mean(x, axis=0)
+  centered = x - mean_b
+  new_count = count + n_b
+  delta = mean_b - mean
+  scatter += np.matmul(centered.T, centered)
+  scatter += np.outer(delta, delta) * (float(count) * n_b / new_count)
+  return new_count, mean + delta * (float(n_b) / new_count)
+
+
+class StreamingMoments(object):
+  """Accumulates the mean and covariance of activations in float64."""
+
+  def __init__(self, dim):
+    self.count = 0
+    self.mean = np.zeros([dim], dtype=np.float64)
+    self.scatter = np.zeros([dim, dim], dtype=np.float64)
+
+  def update(self, activations):
+    """Adds a block of activations of shape [n, dim]."""
+    self.count, self.mean = _merge_moments(
+        self.count, self.mean, self.scatter, np.asarray(activations))
+
+  @property
+  def covariance(self):
+    """The unbiased sample covariance, as `np.cov(..., rowvar=False)`."""
+    return self.scatter / max(self.count - 1, 1)
+
+
+class ClasswiseStreamingMoments(object):
+  """Accumulates global and per-class mean/covariance of activations.
+
+  Activations are buffered per class and merged `flush_size` at a time so that
+  every [dim, dim] scatter update is amortised over many samples. The
+  per-class scatter matrices can be memory-mapped, since for 1000 classes of
+  2048-d features they do not fit in RAM.
+  """
+
+  def __init__(self, num_classes, dim, flush_size=256, scatter_path=None):
+    self.num_classes = num_classes
+    self.flush_size = flush_size
+    self.counts = np.zeros([num_classes], dtype=np.int64)
+    self.means = np.zeros([num_classes, dim], dtype=np.float64)
+    if scatter_path is None:
+      self.scatters = np.zeros([num_classes, dim, dim], dtype=np.float64)
+    else:
+      self.scatters = np.lib.format.open_memmap(
+          scatter_path, mode='w+', dtype=np.float64,
+          shape=(num_classes, dim, dim))
+    self.global_moments = StreamingMoments(dim)
+    self._buffers = [[] for _ in range(num_classes)]
+    self._buffered = np.zeros([num_classes], dtype=np.int64)
+
+  def update(self, activations, labels):
+    """Adds a batch of activations with their integer labels."""
+    activations = np.asarray(activations, dtype=np.float32)
+    labels = np.asarray(labels).reshape([-1])
+    self.global_moments.update(activations)
+    for c in np.unique(labels):
+      in_class = labels == c
+      self._buffers[c].append(activations[in_class])
+      self._buffered[c] += np.sum(in_class)
+      if self._buffered[c] >= self.flush_size:
+        self._flush(c)
+
+  def _flush(self, c):
+    if not self._buffers[c]:
+      return
+    x = np.concatenate(self._buffers[c], axis=0)
+    self._buffers[c] = []
+    self._buffered[c] = 0
+    self.counts[c], self.means[c] = _merge_moments(
+        self.counts[c], self.means[c], self.scatters[c], x)
+
+  def finalize(self):
+    """Flushes all buffers and turns scatter matrices into covariances.
+
+    Returns:
+      A dict with the global `mean`, `covariance` and `num_examples`, and the
+      per-class `class_counts`, `class_means` ([num_classes, dim]) and
+      `class_covariances` ([num_classes, dim, dim]). Covariances are unbiased.
+    """
+    for c in range(self.num_classes):
+      self._flush(c)
+      self.scatters[c] /= max(self.counts[c] - 1, 1)
+    if isinstance(self.scatters, np.memmap):
+      self.scatters.flush()
+    return {
+        'mean': self.global_moments.mean,
+        'covariance': self.global_moments.covariance,
+        'num_examples': self.global_moments.count,
+        'class_counts': self.counts,
+        'class_means': self.means,
+        'class_covariances': self.scatters,
+    }
+
+
+class _ActivationFiles(object):
+  """Row access to activations stored in one or more `.npy` shards."""
+
+  def __init__(self, paths):
+    if isinstance(paths, str):
+      paths = [paths]
+    self.arrays = [np.load(path, mmap_mode='r') for path in paths]
+    if not self.arrays:
+      raise ValueError('No activation files given.')
+    for array in self.arrays:
+      if array.ndim != 2 or array.shape[1] != self.arrays[0].shape[1]:
+        raise ValueError('Activation shards must be 2D with the same number '
+                         'of columns, got %s.' % [a.shape for a in self.arrays])
+    self.offsets = np.cumsum([0] + [a.shape[0] for a in self.arrays])
+
+  @property
+  def num_rows(self):
+    return int(self.offsets[-1])
+
+  @property
+  def dim(self):
+    return self.arrays[0].shape[1]
+
+  def rows(self, start, end):
+    """Returns rows [start, end) across shards as a float64 array."""
+    parts = []
+    for array, offset in zip(self.arrays, self.offsets):
+      lo = max(start - offset, 0)
+      hi = min(end - offset, array.shape[0])
+      if lo < hi:
+        parts.append(np.asarray(array[lo:hi], dtype=np.float64))
+    if not parts:
+      return np.zeros([0, self.dim], dtype=np.float64)
+    return np.concatenate(parts, axis=0)
+
+
+def iterate_activation_blocks(paths, block_size=10000):
+  """Yields float64 blocks of at most `block_size` rows from `.npy` files.
+
+  Args:
+    paths: A `.npy` path or a list of paths of 2D arrays, read in order.
+    block_size: The maximum number of rows per block.
+
+  Yields:
+    Arrays of shape [n, dim] with n <= block_size.
+  """
+  files = _ActivationFiles(paths)
+  for start in range(0, files.num_rows, block_size):
+    yield files.rows(start, min(start + block_size, files.num_rows))
+
+
+def moments_from_activation_files(paths, block_size=10000):
+  """Streams `.npy` activations and returns their (mean, covariance).
+
+  Args:
+    paths: A `.npy` path or a list of paths of 2D arrays.
+    block_size: The number of rows held in memory at a time.
+
+  Returns:
+    A tuple of the float64 mean of shape [dim] and unbiased covariance of shape
+    [dim, dim].
+  """
+  moments = None
+  for block in iterate_activation_blocks(paths, block_size):
+    if moments is None:
+      moments = StreamingMoments(block.shape[1])
+    moments.update(block)
+  return moments.mean, moments.covariance
+
+
+def _symmetric_matrix_square_root(mat, eps=1e-10):
+  # Same as classifier_metrics._symmetric_matrix_square_root, but numpy's
+  # svd returns V^T rather than V.
+  u, s, vt = np.linalg.svd(mat)
+  si = np.where(s < eps, s, np.sqrt(s))
+  return np.matmul(u * si, vt)
+
+
+def _trace_sqrt_product(sigma, sigma_v, method='svd'):
+  """NumPy version of `classifier_metrics.trace_sqrt_product`."""
+  if method == 'svd':
+    sqrt_sigma = _symmetric_matrix_square_root(sigma)
+    sqrt_a_sigmav_a = np.matmul(sqrt_sigma, np.matmul(sigma_v, sqrt_sigma))
+    return np.trace(_symmetric_matrix_square_root(sqrt_a_sigmav_a))
+  elif method == 'eigh':
+    e, v = np.linalg.eigh(sigma)
+    b = v * np.sqrt(np.maximum(e, 0.))
+    b_sigmav_b = np.matmul(b.T, np.matmul(sigma_v, b))
+    eigenvalues = np.linalg.eigvalsh((b_sigmav_b + b_sigmav_b.T) / 2.)
+    return np.sum(np.sqrt(np.maximum(eigenvalues, 0.)))
+  raise ValueError('Unknown trace sqrt product method: %s.' % method)
+
+
+def frechet_distance_from_moments(mean1, covariance1, mean2, covariance2,
+                                  trace_sqrt_method='svd'):
+  """The Frechet distance between two Gaussians, computed in float64.
+
+  Args:
+    mean1: The mean of the first distribution, shape [dim].
+    covariance1: The covariance of the first distribution, shape [dim, dim].
+    mean2: The mean of the second distribution.
+    covariance2: The covariance of the second distribution.
+    trace_sqrt_method: 'svd' to mirror the TF computation exactly, or 'eigh'
+      for one eigendecomposition, see
+      `classifier_metrics.batch_trace_sqrt_product`.
+
+  Returns:
+    The Frechet distance as a python float.
+  """
+  mean1 = np.asarray(mean1, dtype=np.float64)
+  mean2 = np.asarray(mean2, dtype=np.float64)
+  covariance1 = np.asarray(covariance1, dtype=np.float64)
+  covariance2 = np.asarray(covariance2, dtype=np.float64)
+  sqrt_trace_component = _trace_sqrt_product(
+      covariance1, covariance2, method=trace_sqrt_method)
+  trace = np.trace(covariance1 + covariance2) - 2.0 * sqrt_trace_component
+  mean = np.sum(np.square(mean1 - mean2))
+  return float(trace + mean)
+
+
+def frechet_classifier_distance_from_activation_files(
+    paths1, paths2, block_size=10000, trace_sqrt_method='svd'):
+  """NumPy `frechet_classifier_distance_from_activations` on `.npy` files.
+
+  Args:
+    paths1: A `.npy` path or list of paths with the first activations, e.g.
+      of real images, of shape [num_images, dim].
+    paths2: The same for the second activations, e.g. of generated images.
+    block_size: The number of rows held in memory at a time.
+    trace_sqrt_method: 'svd' or 'eigh', see `frechet_distance_from_moments`.
+
+  Returns:
+    The Frechet classifier distance as a python float.
+  """
+  mean1, covariance1 = moments_from_activation_files(paths1, block_size)
+  mean2, covariance2 = moments_from_activation_files(paths2, block_size)
+  return frechet_distance_from_moments(
+      mean1, covariance1, mean2, covariance2,
+      trace_sqrt_method=trace_sqrt_method)
+
+
+def _block_boundaries(n, n_blocks):
+  """Boundaries of `n_blocks` blocks of n, the larger ones last, as in TF."""
+  v = n // n_blocks
+  n_plusone = n - v * n_blocks
+  sizes = [v] * (n_blocks - n_plusone) + [v + 1] * n_plusone
+  return np.concatenate([[0], np.cumsum(sizes)])
+
+
+def kernel_classifier_distance_and_std_from_activation_files(
+    paths1, paths2, max_block_size=1024):
+  """NumPy `kernel_classifier_distance_and_std_from_activations` on files.
+
+  Uses the same blocks and the same polynomial kernel as the TF version, and
+  only holds one block of each set of activations in memory at a time. As for
+  the TF version, the activations are assumed to be in random order.
+
+  Args:
+    paths1: A `.npy` path or list of paths with the first activations.
+    paths2: The same for the second activations.
+    max_block_size: The maximum number of rows of each input per block.
+
+  Returns:
+    A tuple of the Kernel Inception Distance and an estimate of its standard
+    error, as python floats. The standard error is NaN for a single block.
+  """
+  files1 = _ActivationFiles(paths1)
+  files2 = _ActivationFiles(paths2)
+  if files1.dim != files2.dim:
+    raise ValueError('Activations have different dimensions: %i and %i.' % (
+        files1.dim, files2.dim))
+  n_blocks = int(np.ceil(max(files1.num_rows, files2.num_rows) /
+                         float(max_block_size)))
+  inds_r = _block_boundaries(files1.num_rows, n_blocks)
+  inds_g = _block_boundaries(files2.num_rows, n_blocks)
+  dim = float(files1.dim)
+
+  ests = []
+  for i in range(n_blocks):
+    r = files1.rows(inds_r[i], inds_r[i + 1])
+    g = files2.rows(inds_g[i], inds_g[i + 1])
+    m = float(r.shape[0])
+    n = float(g.shape[0])
+    k_rr = (np.matmul(r, r.T) / dim + 1)**3
+    k_rg = (np.matmul(r, g.T) / dim + 1)**3
+    k_gg = (np.matmul(g, g.T) / dim + 1)**3
+    ests.append(-2 * np.mean(k_rg) +
+                (np.sum(k_rr) - np.trace(k_rr)) / (m * (m - 1)) +
+                (np.sum(k_gg) - np.trace(k_gg)) / (n * (n - 1)))
+
+  mn = np.mean(ests)
+  if n_blocks <= 1:
+    return float(mn), float('nan')
+  var = np.sum(np.square(np.array(ests) - mn)) / (n_blocks - 1)
+  return float(mn), float(np.sqrt(var / n_blocks))
+
+
+def classifier_score_from_logit_files(paths, block_size=10000):
+  """NumPy `classifier_score_from_logits` on logits saved in `.npy` files.
+
+  Args:
+    paths: A `.npy` path or list of paths with logits of shape
+      [num_images, num_classes].
+    block_size: The number of rows held in memory at a time.
+
+  Returns:
+    The classifier (e.g. Inception) score as a python float.
+  """
+  count = 0
+  sum_p = 0.
+  sum_plogp = 0.
+  for logits in iterate_activation_blocks(paths, block_size):
+    log_p = logits - np.max(logits, axis=1, keepdims=True)
+    log_p -= np.log(np.sum(np.exp(log_p), axis=1, keepdims=True))
+    p = np.exp(log_p)
+    sum_p += np.sum(p, axis=0)
+    sum_plogp += np.sum(p * log_p)
+    count += logits.shape[0]
+  q = sum_p / count
+  return float(np.exp(sum_plogp / count - np.sum(q * np.log(q))))
+
+
+class PatchReservoir(object):
+  """Keeps a uniform random sample of a fixed number of rows from a stream.
+
+  This is reservoir sampling (Vitter's Algorithm R), vectorised over the rows
+  of each update: the i-th row of the stream replaces a random slot with
+  probability `capacity / (i + 1)`. The sample can be memory-mapped, so that
+  e.g. the patches of 8192 images for the sliced Wasserstein distance do not
+  have to fit in RAM.
+  """
+
+  def __init__(self, capacity, dim, spill_path=None, seed=None):
+    self.capacity = capacity
+    self.seen = 0
+    self._rng = np.random.RandomState(seed)
+    if spill_path is None:
+      self._rows = np.zeros([capacity, dim], dtype=np.float32)
+    else:
+      self._rows = np.lib.format.open_memmap(
+          spill_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+
+  def update(self, rows):
+    """Offers a batch of rows of shape [n, dim] to the sample."""
+    rows = np.asarray(rows, dtype=np.float32)
+    num_fill = min(max(self.capacity - self.seen, 0), rows.shape[0])
+    self._rows[self.seen:self.seen + num_fill] = rows[:num_fill]
+    rest = rows[num_fill:]
+    if rest.shape[0]:
+      index = self.seen + num_fill + np.arange(rest.shape[0])
+      slots = np.floor(
+          self._rng.random_sample(rest.shape[0]) * (index + 1)).astype(np.int64)
+      kept = slots < self.capacity
+      # With repeated slots the last assignment wins, as if the rows had been
+      # offered one at a time.
+      self._rows[slots[kept]] = rest[kept]
+    self.seen += rows.shape[0]
+
+  @property
+  def samples(self):
+    """The sampled rows, at most `capacity` of them."""
+    return self._rows[:min(self.seen, self.capacity)]
+
+  def flush(self):
+    if isinstance(self._rows, np.memmap):
+      self._rows.flush()
+
+
+def sliced_wasserstein_distance_from_samples(a, b, random_sampling_count=1,
+                                             random_projection_dim=None,
+                                             projection_block_size=16,
+                                             seed=None):
+  """NumPy sliced Wasserstein distance between two sets of patches.
+
+  This is the distance `tfgan.eval.sliced_wasserstein_distance` computes for a
+  single Laplacian level, from e.g. the samples of two `PatchReservoir`s.
+
+  Args:
+    a: Samples of shape [n, dim], e.g. from
+      `tfgan.eval.sliced_wasserstein_patches`.
+    b: Samples of shape [m, dim]. If `n != m`, both are truncated to the smaller
+      size.
+    random_sampling_count: The number of random projections to average.
+    random_projection_dim: The dimension of each random projection, defaults
+      to `dim`.
+    projection_block_size: The number of projections sorted at a time, which
+      bounds the memory to `2 * n * projection_block_size` floats.
+    seed: An optional seed for the random projections.
+
+  Returns:
+    The approximate distance as a python float.
+  """
+  num_samples = min(a.shape[0], b.shape[0])
+  a = a[:num_samples]
+  b = b[:num_samples]
+  dim = a.shape[1]
+  if random_projection_dim is None:
+    random_projection_dim = dim
+  rng = np.random.RandomState(seed)
+  total = 0.
+  num_projections = random_sampling_count * random_projection_dim
+  for start in range(0, num_projections, projection_block_size):
+    size = min(projection_block_size, num_projections - start)
+    proj = rng.standard_normal([dim, size]).astype(np.float32)
+    proj /= np.sqrt(np.sum(np.square(proj), axis=0, keepdims=True))
+    proj_a = np.sort(np.dot(a, proj), axis=0)
+    proj_b = np.sort(np.dot(b, proj), axis=0)
+    total += np.sum(np.abs(proj_a - proj_b), dtype=np.float64)
+  return float(total / (num_samples * num_projections))
@@ -0,0 +1,174 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for TF-GAN numpy_metrics."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from absl.testing import parameterized
+import numpy as np
+
+import tensorflow as tf
+from tensorflow.python.framework.ops import disable_eager_execution
+
+disable_eager_execution()
+
+from absl import flags
+
+flags.DEFINE_float('aux_cond_generator_weight', None,
+                  'How to scale generator ACGAN loss relative to WGAN loss, default is None. Try 0.1')
+flags.DEFINE_float('aux_cond_discriminator_weight', None, 
+                  'How to scale the critic ACGAN loss relative to WGAN loss, default is None. Try 1.0')
+flags.DEFINE_float('aux_mhinge_cond_generator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('aux_mhinge_cond_discriminator_weight', None, 
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_cond_discriminator_weight', None, 
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_ssl_cond_discriminator_weight', None, 
+                  '..., default is None.')
+flags.DEFINE_integer( 'tpu_gan_estimator_d_step', 1, '...')
+flags.DEFINE_integer( 'tpu_gan_estimator_g_step', 1, '...')
+
+from tensorflow_gan.python.eval import classifier_metrics  # pylint: disable=g-import-not-at-top
+from tensorflow_gan.python.eval import numpy_metrics  # pylint: disable=g-import-not-at-top
+from tensorflow_gan.python.eval import sliced_wasserstein  # pylint: disable=g-import-not-at-top
+
+
+class NumpyMetricsTest(tf.test.TestCase, parameterized.TestCase):
+
+  def _save_shards(self, name, array, num_shards):
+    paths = []
+    for i, shard in enumerate(np.array_split(array, num_shards)):
+      path = os.path.join(self.get_temp_dir(), '%s_%i.npy' % (name, i))
+      np.save(path, shard)
+      paths.append(path)
+    return paths
+
+  def test_classwise_moments_match_numpy(self):
+    rs = np.random.RandomState(0)
+    activations = rs.normal(size=[50, 6]).astype(np.float32)
+    labels = rs.randint(0, 3, size=[50])
+    moments = numpy_metrics.ClasswiseStreamingMoments(3, 6, flush_size=7)
+    for start in range(0, 50, 8):
+      moments.update(activations[start:start + 8], labels[start:start + 8])
+    statistics = moments.finalize()
+
+    self.assertEqual(50, statistics['num_examples'])
+    self.assertAllClose(np.mean(activations, axis=0), statistics['mean'])
+    self.assertAllClose(np.cov(activations, rowvar=False),
+                        statistics['covariance'])
+    for c in range(3):
+      in_class = activations[labels == c]
+      self.assertEqual(in_class.shape[0], statistics['class_counts'][c])
+      self.assertAllClose(np.mean(in_class, axis=0),
+                          statistics['class_means'][c])
+      self.assertAllClose(np.cov(in_class, rowvar=False),
+                          statistics['class_covariances'][c])
+
+  @parameterized.parameters('svd', 'eigh')
+  def test_frechet_distance_matches_tf(self, trace_sqrt_method):
+    np.random.seed(0)
+    real = np.float32(np.random.randn(700, 64))
+    gen = np.float32(np.random.randn(600, 64) * 1.1 + 0.1)
+
+    actual_fid = (
+        numpy_metrics.frechet_classifier_distance_from_activation_files(
+            self._save_shards('real', real, 3),
+            self._save_shards('gen', gen, 1), block_size=128,
+            trace_sqrt_method=trace_sqrt_method))
+
+    fid_op = classifier_metrics.frechet_classifier_distance_from_activations(
+        tf.constant(np.float64(real)), tf.constant(np.float64(gen)))
+    with self.cached_session() as sess:
+      expected_fid = sess.run(fid_op)
+    self.assertAllClose(expected_fid, actual_fid, rtol=1e-6)
+
+  def test_kernel_distance_matches_tf(self):
+    np.random.seed(0)
+    real = np.random.randn(300, 16)
+    gen = np.random.randn(250, 16) + 0.1
+
+    actual_kid, actual_std = (
+        numpy_metrics.kernel_classifier_distance_and_std_from_activation_files(
+            self._save_shards('real', real, 2),
+            self._save_shards('gen', gen, 3), max_block_size=64))
+
+    kid_ops = (
+        classifier_metrics.kernel_classifier_distance_and_std_from_activations(
+            tf.constant(real), tf.constant(gen), max_block_size=64))
+    with self.cached_session() as sess:
+      expected_kid, expected_std = sess.run(kid_ops)
+    self.assertAllClose(expected_kid, actual_kid)
+    self.assertAllClose(expected_std, actual_std)
+
+  def test_classifier_score_matches_tf(self):
+    np.random.seed(0)
+    logits = np.random.randn(300, 10) * 3
+
+    actual_score = numpy_metrics.classifier_score_from_logit_files(
+        self._save_shards('logits', logits, 2), block_size=64)
+
+    score_op = classifier_metrics.classifier_score_from_logits(
+        tf.constant(logits))
+    with self.cached_session() as sess:
+      expected_score = sess.run(score_op)
+    self.assertAllClose(expected_score, actual_score)
+
+  @parameterized.parameters(False, True)
+  def test_patch_reservoir(self, spill):
+    spill_path = (os.path.join(self.get_temp_dir(), 'reservoir.npy')
+                  if spill else None)
+    reservoir = numpy_metrics.PatchReservoir(
+        1000, 2, spill_path=spill_path, seed=0)
+    stream = np.stack([np.arange(20000)] * 2, axis=1)
+    reservoir.update(stream[:600])
+    self.assertAllEqual(stream[:600], reservoir.samples)
+    for start in range(600, 20000, 700):
+      reservoir.update(stream[start:start + 700])
+    self.assertEqual(20000, reservoir.seen)
+    samples = reservoir.samples[:, 0]
+    self.assertLen(samples, 1000)
+    self.assertLen(np.unique(samples), 1000)
+    # A uniform sample of 0..19999 has mean 9999.5 and a standard error of
+    # about 183 for 1000 samples.
+    self.assertNear(9999.5, np.mean(samples), 4 * 183)
+
+  def test_sliced_wasserstein_distance_matches_tf(self):
+    np.random.seed(0)
+    a = np.random.randn(4096, 12).astype(np.float32)
+    # Every projection of `b` is twice as wide as that of `a`, so the distance
+    # is about E|x| = 0.8 whatever the projections.
+    b = (np.random.randn(4096, 12) * 2).astype(np.float32)
+
+    actual_swd = numpy_metrics.sliced_wasserstein_distance_from_samples(
+        a, b, random_sampling_count=8, seed=0)
+    self.assertEqual(
+        0., numpy_metrics.sliced_wasserstein_distance_from_samples(a, a))
+
+    swd_op = sliced_wasserstein._sliced_wasserstein(  # pylint: disable=protected-access
+        tf.constant(a), tf.constant(b), 8, 12)
+    with self.cached_session() as sess:
+      expected_swd = sess.run(swd_op)
+    # Both average over different random projections.
+    self.assertAllClose(expected_swd, actual_swd, rtol=0.05)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -32,7 +32,7 @@ import tensorflow as tf
 
 from tensorflow_gan.python import contrib_utils as contrib
 
-__all__ = ['sliced_wasserstein_distance']
+__all__ = ['sliced_wasserstein_distance', 'sliced_wasserstein_patches']
 
 _GAUSSIAN_FILTER = np.float32([[1, 4, 6, 4, 1], [4, 16, 24, 16, 4],
                                [6, 24, 36, 24, 6], [4, 16, 24, 16, 4],
@@ -158,31 +158,39 @@ def _sort_rows(matrix, num_rows):
 def _sliced_wasserstein(a, b, random_sampling_count, random_projection_dim):
   """Compute the approximate sliced Wasserstein distance.
 
+  All `random_sampling_count * random_projection_dim` projections are drawn as
+  one matrix and both distributions are projected with a single matmul. The
+  projections are laid out along the rows of the result, so the samples are
+  sorted along its last axis without a transpose.
+
   Args:
-      a: (matrix) Distribution "a" of samples (row, col).
-      b: (matrix) Distribution "b" of samples (row, col).
+      a: (tensor) Distribution "a" of samples (..., row, col). Leading
+        dimensions are independent pairs of distributions, each with its own
+        random projections.
+      b: (tensor) Distribution "b" of samples (..., row, col), with the same
+        shape as "a".
       random_sampling_count: (int) Number of random projections to average.
       random_projection_dim: (int) Dimension of the random projection space.
 
   Returns:
-      Float containing the approximate distance between "a" and "b".
+      Tensor (...) of the approximate distances between "a" and "b".
   """
-  s = tf.shape(input=a)
-  means = []
-  for _ in range(random_sampling_count):
-    # Random projection matrix.
-    proj = tf.random.normal([tf.shape(input=a)[1], random_projection_dim])
-    proj *= tf.math.rsqrt(
-        tf.reduce_sum(input_tensor=tf.square(proj), axis=0, keepdims=True))
-    # Project both distributions and sort them.
-    proj_a = tf.matmul(a, proj)
-    proj_b = tf.matmul(b, proj)
-    proj_a = _sort_rows(proj_a, s[0])
-    proj_b = _sort_rows(proj_b, s[0])
-    # Pairwise Wasserstein distance.
-    wdist = tf.reduce_mean(input_tensor=tf.abs(proj_a - proj_b))
-    means.append(wdist)
-  return tf.reduce_mean(input_tensor=means)
+  shape = tf.shape(input=a)
+  # Random projection matrices, one column per projection.
+  proj = tf.random.normal(tf.concat(
+      [shape[:-2], [shape[-1], random_sampling_count * random_projection_dim]],
+      0))
+  proj *= tf.math.rsqrt(
+      tf.reduce_sum(input_tensor=tf.square(proj), axis=-2, keepdims=True))
+  # Project both distributions at once to (..., projection, 2 * row), and sort
+  # each projection.
+  projected = tf.matmul(proj, tf.concat([a, b], -2), transpose_a=True,
+                        transpose_b=True)
+  proj_a, proj_b = tf.split(projected, 2, axis=-1)
+  proj_a = tf.sort(proj_a, axis=-1)
+  proj_b = tf.sort(proj_b, axis=-1)
+  # Pairwise Wasserstein distance, averaged over all projections.
+  return tf.reduce_mean(input_tensor=tf.abs(proj_a - proj_b), axis=[-2, -1])
 
 
 def _sliced_wasserstein_svd(a, b):
@@ -209,6 +217,56 @@ def _sliced_wasserstein_svd(a, b):
   return wdist
 
 
+def _laplacian_resolutions(height, resolution_min):
+  """Returns the resolutions of the Laplacian levels, from highest to lowest."""
+  # Select resolutions.
+  resolution_full = int(height)
+  resolution_min = min(resolution_min, resolution_full)
+  resolution_max = resolution_full
+  # Base loss of detail.
+  return [
+      2**i for i in range(
+          int(np.log2(resolution_max)),
+          int(np.log2(resolution_min)) - 1, -1)
+  ]
+
+
+def sliced_wasserstein_patches(images,
+                               resolution_min=16,
+                               patches_per_image=64,
+                               patch_size=7):
+  """Samples the normalized patches of each Laplacian level of some images.
+
+  These are the descriptors `sliced_wasserstein_distance` compares. Sampling
+  them batch by batch and keeping a fixed-size random subset of each level,
+  e.g. with `tfgan.eval.PatchReservoir`, gives the distance over many more
+  images than fit in one tensor.
+
+  Args:
+      images: (tensor) Images (batch, height, width, channels).
+      resolution_min: (int) Minimum resolution for the Laplacian pyramid.
+      patches_per_image: (int) Number of patches to extract per image per
+        Laplacian level.
+      patch_size: (int) Width of a square patch.
+
+  Returns:
+      List of tensors (batch * patches_per_image, patch_size**2 * channels) of
+      patches, for each level of the Laplacian pyramid from the highest
+      resolution to the lowest.
+  Raises:
+      ValueError: If the height and width of `images` are not known and equal,
+      or if the images are not RGB.
+  """
+  height = images.shape[1]
+  images.shape.assert_is_compatible_with([None, None, height, 3])
+  resolutions = _laplacian_resolutions(height, resolution_min)
+  return [
+      _normalize_patches(
+          [_batch_to_patches(level, patches_per_image, patch_size)])
+      for level in laplacian_pyramid(images, len(resolutions))
+  ]
+
+
 def sliced_wasserstein_distance(real_images,
                                 fake_images,
                                 resolution_min=16,
@@ -216,7 +274,8 @@ def sliced_wasserstein_distance(real_images,
                                 patch_size=7,
                                 random_sampling_count=1,
                                 random_projection_dim=7 * 7 * 3,
-                                use_svd=False):
+                                use_svd=False,
+                                fuse_levels=False):
   """Compute the Wasserstein distance between two distributions of images.
 
   Note that measure vary with the number of images. Use 8192 images to get
@@ -232,6 +291,11 @@ def sliced_wasserstein_distance(real_images,
       random_sampling_count: (int) Number of random projections to average.
       random_projection_dim: (int) Dimension of the random projection space.
       use_svd: experimental method to compute a more accurate distance.
+      fuse_levels: (bool) Compute the distances of all Laplacian levels with
+        one batched projection and sort, instead of one per level. Every level
+        has the same number and size of patches, so this only trades memory
+        for fewer, larger ops: the projections of all levels are held at once.
+        Ignored with `use_svd`.
 
   Returns:
       List of tuples (distance_real, distance_fake) for each level of the
@@ -249,16 +313,7 @@ def sliced_wasserstein_distance(real_images,
   real_images.shape.assert_is_compatible_with([None, None, height, 3])
   fake_images.shape.assert_is_compatible_with(real_images.shape)
 
-  # Select resolutions.
-  resolution_full = int(height)
-  resolution_min = min(resolution_min, resolution_full)
-  resolution_max = resolution_full
-  # Base loss of detail.
-  resolutions = [
-      2**i for i in range(
-          int(np.log2(resolution_max)),
-          int(np.log2(resolution_min)) - 1, -1)
-  ]
+  resolutions = _laplacian_resolutions(height, resolution_min)
 
   # Gather patches for each level of the Laplacian pyramids.
   patches_real, patches_fake, patches_test = (
@@ -278,16 +333,28 @@ def sliced_wasserstein_distance(real_images,
       patches[lod] = _normalize_patches(patches[lod])
 
   # Evaluate scores.
+  if use_svd:
+    return [(_sliced_wasserstein_svd(patches_real[lod], patches_test[lod]),
+             _sliced_wasserstein_svd(patches_real[lod], patches_fake[lod]))
+            for lod in range(len(resolutions))]
+
+  # The (real, test) and (real, fake) distances of a level are computed as a
+  # batch of two pairs, with independent projections.
+  def _pairs(lod):
+    return (tf.stack([patches_real[lod], patches_real[lod]]),
+            tf.stack([patches_test[lod], patches_fake[lod]]))
+
+  if fuse_levels:
+    a, b = zip(*[_pairs(lod) for lod in range(len(resolutions))])
+    distances = _sliced_wasserstein(tf.stack(a), tf.stack(b),
+                                    random_sampling_count,
+                                    random_projection_dim)
+    return [tuple(tf.unstack(d, 2)) for d in tf.unstack(distances,
+                                                        len(resolutions))]
   scores = []
   for lod in range(len(resolutions)):
-    if not use_svd:
-      scores.append(
-          (_sliced_wasserstein(patches_real[lod], patches_test[lod],
-                               random_sampling_count, random_projection_dim),
-           _sliced_wasserstein(patches_real[lod], patches_fake[lod],
-                               random_sampling_count, random_projection_dim)))
-    else:
-      scores.append(
-          (_sliced_wasserstein_svd(patches_real[lod], patches_test[lod]),
-           _sliced_wasserstein_svd(patches_real[lod], patches_fake[lod])))
+    distances = _sliced_wasserstein(*_pairs(lod),
+                                    random_sampling_count=random_sampling_count,
+                                    random_projection_dim=random_projection_dim)
+    scores.append(tuple(tf.unstack(distances, 2)))
   return scores
@@ -25,6 +25,7 @@ from scipy import ndimage
 import tensorflow as tf
 import tensorflow_gan as tfgan
 
+from tensorflow_gan.python.eval.sliced_wasserstein import _sliced_wasserstein
 from tensorflow_gan.python.eval.sliced_wasserstein import laplacian_pyramid
 
 
@@ -88,6 +89,34 @@ class ClassifierMetricsTest(tf.test.TestCase):
         np.array([x[1] for x in wscores], 'f'),
         rtol=0.15)
 
+  def test_sliced_wasserstein_distance_fused_levels(self):
+    """Test the distance with all levels in one batch."""
+    d1 = tf.random.uniform([256, 32, 32, 3])
+    d2 = tf.random.normal([256, 32, 32, 3])
+    wfunc = tfgan.eval.sliced_wasserstein_distance(
+        d1, d2, random_sampling_count=4, fuse_levels=True)
+    with self.cached_session() as sess:
+      wscores = sess.run(wfunc)
+    self.assertAllClose(
+        np.array([0.014, 0.014], 'f'),
+        np.array([x[0] for x in wscores], 'f'),
+        rtol=0.15)
+    self.assertAllClose(
+        np.array([0.014, 0.020], 'f'),
+        np.array([x[1] for x in wscores], 'f'),
+        rtol=0.15)
+
+  def test_sliced_wasserstein_batched_pairs(self):
+    """Test that identical pairs are at distance zero, others are not."""
+    a = np.random.normal(size=[2, 512, 12]).astype(np.float32)
+    b = np.stack([a[0], np.random.uniform(size=[512, 12])]).astype(np.float32)
+    distances = _sliced_wasserstein(tf.constant(a), tf.constant(b), 3, 12)
+    with self.cached_session() as sess:
+      distances = sess.run(distances)
+    self.assertEqual((2,), distances.shape)
+    self.assertAllClose(0., distances[0])
+    self.assertGreater(distances[1], 0.1)
+
   def test_sliced_wasserstein_distance_svd(self):
     """Test the distance with svd."""
     d1 = tf.random.uniform([256, 32, 32, 3])
@@ -0,0 +1,223 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A process-wide registry of TF-Hub classifier modules.
+
+`load_tfhub_module` loads each module once per graph (or once in eager mode)
+and shares it across calls, so building several eval graphs in the same
+`tf.Graph`, or running a classifier inside `tf.map_fn`, does not resolve and
+load the module again.
+
+If a cache directory is configured, modules are stored in it by the SHA-256 of
+their contents, next to an index from handle to digest:
+
+  <cache_dir>/modules/<content digest>/saved_model.pb ...
+  <cache_dir>/handles/<SHA-256 of the handle>
+
+A module copied there from a machine with network access can be loaded in
+offline mode, where any handle that is not in the cache is an error instead of
+a download.
+
+The cache directory and offline mode default to the `TFGAN_TFHUB_CACHE_DIR`
+and `TFGAN_TFHUB_OFFLINE` environment variables, and can be set with
+`configure_tfhub_module_cache`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+
+import tensorflow as tf
+import tensorflow_hub as tfhub
+
+
+__all__ = [
+    'configure_tfhub_module_cache',
+    'resolve_tfhub_module',
+    'load_tfhub_module',
+]
+
+_MODULES_DIR = 'modules'
+_HANDLES_DIR = 'handles'
+_READ_BLOCK_SIZE = 1 << 20
+
+_lock = threading.RLock()
+_config = {
+    'cache_dir': os.environ.get('TFGAN_TFHUB_CACHE_DIR') or None,
+    'offline': os.environ.get('TFGAN_TFHUB_OFFLINE', '').lower() in (
+        '1', 'true', 'yes'),
+}
+# Loaded modules of graph mode, by graph and then by handle. Graphs are weakly
+# referenced so that the modules are freed with their graph.
+_graph_modules = weakref.WeakKeyDictionary()
+# Loaded modules of eager mode, by handle.
+_eager_modules = {}
+
+
+def configure_tfhub_module_cache(cache_dir=None, offline=False):
+  """Sets the on-disk module cache and offline mode for this process.
+
+  Args:
+    cache_dir: A directory for the content-addressed module cache, or `None`
+      to load modules straight from TF-Hub.
+    offline: If `True`, only modules in `cache_dir` or local module
+      directories can be loaded.
+
+  Raises:
+    ValueError: If `offline` is `True` but `cache_dir` is `None`.
+  """
+  if offline and cache_dir is None:
+    raise ValueError('Offline mode needs a `cache_dir`.')
+  with _lock:
+    _config['cache_dir'] = cache_dir
+    _config['offline'] = offline
+
+
+def _sha256(value):
+  return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def _content_digest(module_dir):
+  """Returns the SHA-256 of the relative paths and contents of a directory."""
+  digest = hashlib.sha256()
+  files = []
+  for dirname, _, filenames in tf.io.gfile.walk(module_dir):
+    for filename in filenames:
+      files.append(os.path.join(dirname, filename))
+  for path in sorted(files):
+    digest.update(os.path.relpath(path, module_dir).encode('utf-8') + b'\0')
+    with tf.io.gfile.GFile(path, 'rb') as f:
+      while True:
+        block = f.read(_READ_BLOCK_SIZE)
+        if not block:
+          break
+        digest.update(block)
+  return digest.hexdigest()
+
+
+def _copy_tree(src, dst):
+  for dirname, _, filenames in tf.io.gfile.walk(src):
+    target_dir = os.path.join(dst, os.path.relpath(dirname, src))
+    tf.io.gfile.makedirs(target_dir)
+    for filename in filenames:
+      tf.io.gfile.copy(os.path.join(dirname, filename),
+                       os.path.join(target_dir, filename), overwrite=True)
+
+
+def _write_atomic(path, contents):
+  tmp_path = '%s.tmp-%s' % (path, uuid.uuid4().hex)
+  with tf.io.gfile.GFile(tmp_path, 'w') as f:
+    f.write(contents)
+  tf.io.gfile.rename(tmp_path, path, overwrite=True)
+
+
+def _add_to_cache(cache_dir, handle, module_dir):
+  """Copies `module_dir` into the cache and indexes it under `handle`."""
+  digest = _content_digest(module_dir)
+  cached_dir = os.path.join(cache_dir, _MODULES_DIR, digest)
+  if not tf.io.gfile.exists(cached_dir):
+    tmp_dir = '%s.tmp-%s' % (cached_dir, uuid.uuid4().hex)
+    _copy_tree(module_dir, tmp_dir)
+    try:
+      tf.io.gfile.rename(tmp_dir, cached_dir)
+    except tf.errors.OpError:
+      # Another process cached the same contents first.
+      if not tf.io.gfile.exists(cached_dir):
+        raise
+      tf.io.gfile.rmtree(tmp_dir)
+  tf.io.gfile.makedirs(os.path.join(cache_dir, _HANDLES_DIR))
+  _write_atomic(os.path.join(cache_dir, _HANDLES_DIR, _sha256(handle)), digest)
+  return cached_dir
+
+
+def _cached_module_dir(cache_dir, handle):
+  """Returns the cached directory of `handle`, or `None` if not cached."""
+  index_path = os.path.join(cache_dir, _HANDLES_DIR, _sha256(handle))
+  if not tf.io.gfile.exists(index_path):
+    return None
+  with tf.io.gfile.GFile(index_path, 'r') as f:
+    digest = f.read().strip()
+  cached_dir = os.path.join(cache_dir, _MODULES_DIR, digest)
+  if not tf.io.gfile.exists(cached_dir):
+    return None
+  return cached_dir
+
+
+def resolve_tfhub_module(handle):
+  """Returns a local directory with the contents of a TF-Hub module.
+
+  Local module directories are returned as they are. Other handles are looked
+  up in the module cache, and on a miss downloaded with `tfhub.resolve` and
+  added to the cache.
+
+  Args:
+    handle: A TF-Hub module handle or a local module directory.
+
+  Returns:
+    A module handle that `tfhub.load` can load without network access, or
+    `handle` itself if no cache is configured.
+
+  Raises:
+    IOError: In offline mode, if `handle` is not in the cache.
+  """
+  if tf.io.gfile.isdir(handle):
+    return handle
+  with _lock:
+    cache_dir = _config['cache_dir']
+    offline = _config['offline']
+    if cache_dir is None:
+      return handle
+    cached_dir = _cached_module_dir(cache_dir, handle)
+    if cached_dir is not None:
+      return cached_dir
+    if offline:
+      raise IOError(
+          'TF-Hub module %s is not in the cache at %s and offline mode is on. '
+          'Copy the cache from a machine that has loaded it.' % (
+              handle, cache_dir))
+    tf.compat.v1.logging.info('Caching TF-Hub module %s in %s.' % (
+        handle, cache_dir))
+    return _add_to_cache(cache_dir, handle, tfhub.resolve(handle))
+
+
+def load_tfhub_module(handle):
+  """Loads a TF-Hub module once per graph, or once in eager mode.
+
+  The module is loaded outside of any control flow or function being built,
+  so the same loaded module can be called from the body of a `tf.map_fn` and
+  from the rest of the graph.
+
+  Args:
+    handle: A TF-Hub module handle or a local module directory.
+
+  Returns:
+    The object returned by `tfhub.load`.
+  """
+  with tf.init_scope():
+    with _lock:
+      if tf.executing_eagerly():
+        modules = _eager_modules
+      else:
+        modules = _graph_modules.setdefault(
+            tf.compat.v1.get_default_graph(), {})
+      if handle not in modules:
+        modules[handle] = tfhub.load(resolve_tfhub_module(handle))
+      return modules[handle]
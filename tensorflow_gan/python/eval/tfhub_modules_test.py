@@ -0,0 +1,126 @@
+# coding=utf-8
+# Copyright 2020 The TensorFlow GAN Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for TF-GAN tfhub_modules."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import tensorflow as tf
+
+from absl import flags
+
+flags.DEFINE_float('aux_cond_generator_weight', None,
+                  'How to scale generator ACGAN loss relative to WGAN loss, default is None. Try 0.1')
+flags.DEFINE_float('aux_cond_discriminator_weight', None,
+                  'How to scale the critic ACGAN loss relative to WGAN loss, default is None. Try 1.0')
+flags.DEFINE_float('aux_mhinge_cond_generator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('aux_mhinge_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_float('kplusone_mhinge_ssl_cond_discriminator_weight', None,
+                  '..., default is None.')
+flags.DEFINE_integer( 'tpu_gan_estimator_d_step', 1, '...')
+flags.DEFINE_integer( 'tpu_gan_estimator_g_step', 1, '...')
+
+from tensorflow_gan.python.eval import tfhub_modules  # pylint: disable=g-import-not-at-top
+
+mock = tf.compat.v1.test.mock
+
+_HANDLE = 'https://tfhub.dev/tensorflow/tfgan/eval/fake/1'
+
+
+class FakeModule(tf.Module):
+
+  @tf.function(input_signature=[tf.TensorSpec(shape=None, dtype=tf.float32)])
+  def __call__(self, x):
+    return 2.0 * x
+
+
+class TfhubModulesTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(TfhubModulesTest, self).setUp()
+    self._config = dict(tfhub_modules._config)
+    self.export_path = os.path.join(self.get_temp_dir(), 'fake-module')
+    tf.saved_model.save(FakeModule(), self.export_path)
+    self.cache_dir = os.path.join(self.get_temp_dir(), 'cache_%s' % self.id())
+
+  def tearDown(self):
+    tfhub_modules._config.update(self._config)
+    super(TfhubModulesTest, self).tearDown()
+
+  def test_load_once_per_graph(self):
+    with tf.Graph().as_default():
+      module = tfhub_modules.load_tfhub_module(self.export_path)
+      self.assertIs(module, tfhub_modules.load_tfhub_module(self.export_path))
+    with tf.Graph().as_default():
+      self.assertIsNot(
+          module, tfhub_modules.load_tfhub_module(self.export_path))
+
+  def test_load_in_map_fn(self):
+    with tf.Graph().as_default():
+      x = tf.ones([3, 2])
+      y = tf.map_fn(
+          lambda v: tfhub_modules.load_tfhub_module(self.export_path)(v), x)
+      z = tfhub_modules.load_tfhub_module(self.export_path)(x)
+      with self.cached_session() as sess:
+        sess.run(tf.compat.v1.global_variables_initializer())
+        self.assertAllClose(2.0 * sess.run(x), sess.run(y))
+        self.assertAllClose(sess.run(y), sess.run(z))
+
+  def test_resolve_caches_by_content(self):
+    tfhub_modules.configure_tfhub_module_cache(self.cache_dir)
+    with mock.patch.object(
+        tfhub_modules.tfhub, 'resolve',
+        return_value=self.export_path) as mock_resolve:
+      cached_dir = tfhub_modules.resolve_tfhub_module(_HANDLE)
+      self.assertEqual(cached_dir, tfhub_modules.resolve_tfhub_module(_HANDLE))
+      # A second handle with the same contents shares the cached copy.
+      self.assertEqual(
+          cached_dir, tfhub_modules.resolve_tfhub_module(_HANDLE + '?v=2'))
+    self.assertEqual(2, mock_resolve.call_count)
+    self.assertEqual(
+        os.path.join(self.cache_dir, 'modules',
+                     tfhub_modules._content_digest(self.export_path)),
+        cached_dir)
+    self.assertTrue(
+        tf.io.gfile.exists(os.path.join(cached_dir, 'saved_model.pb')))
+
+  def test_offline(self):
+    tfhub_modules.configure_tfhub_module_cache(self.cache_dir)
+    with mock.patch.object(
+        tfhub_modules.tfhub, 'resolve', return_value=self.export_path):
+      cached_dir = tfhub_modules.resolve_tfhub_module(_HANDLE)
+
+    tfhub_modules.configure_tfhub_module_cache(self.cache_dir, offline=True)
+    with mock.patch.object(tfhub_modules.tfhub, 'resolve') as mock_resolve:
+      self.assertEqual(cached_dir, tfhub_modules.resolve_tfhub_module(_HANDLE))
+      with self.assertRaisesRegexp(IOError, 'offline'):
+        tfhub_modules.resolve_tfhub_module(_HANDLE + '/missing')
+    mock_resolve.assert_not_called()
+
+  def test_offline_needs_cache_dir(self):
+    with self.assertRaises(ValueError):
+      tfhub_modules.configure_tfhub_module_cache(None, offline=True)
+
+
+if __name__ == '__main__':
+  tf.test.main()